@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark parse throughput (lines/sec): the single-pass LineScanner vs the
+chained-regex RegexTokenizer the parser used before.
+
+Usage:
+  bench_parser.py [--tasks N] [--file path.md] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from bench_vault import write_tasks
+from mdql import MDQLParser
+from mdql_scan import LineScanner, RegexTokenizer
+
+
+TOKENIZERS = [('regex chain', RegexTokenizer), ('LineScanner', LineScanner)]
+
+
+def best_of(repeat: int, run) -> float:
+    """Fastest of several runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare line tokenizers on a large markdown file')
+    parser.add_argument('--tasks', type=int, default=500000, help='Tasks to generate (default: 500000)')
+    parser.add_argument('--file', help='Use an existing markdown file instead of generating one')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, best is kept (default: 3)')
+    args = parser.parse_args()
+
+    if args.file:
+        path = args.file
+        cleanup = False
+    else:
+        fd, path = tempfile.mkstemp(suffix='.md')
+        os.close(fd)
+        write_tasks(path, args.tasks)
+        cleanup = True
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        print(f"File: {path} ({os.path.getsize(path) / 1e6:.1f} MB, {len(lines)} lines)")
+        print(f"{'tokenizer':<12} {'scan only':>16} {'full parse':>16}")
+        baseline = None
+        for label, tokenizer_class in TOKENIZERS:
+            scan = tokenizer_class().scan
+            scan_time = best_of(args.repeat, lambda: [scan(line) for line in lines])
+            parse_time = best_of(args.repeat, lambda: MDQLParser(tokenizer_class()).parse_lines(lines))
+            note = f"  ({baseline / parse_time:.2f}x)" if baseline else ''
+            baseline = baseline or parse_time
+            print(f"{label:<12} {len(lines) / scan_time:>10,.0f} l/s {len(lines) / parse_time:>10,.0f} l/s{note}")
+    finally:
+        if cleanup:
+            os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
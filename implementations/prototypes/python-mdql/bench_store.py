@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory per task: MDQL (TaskItem objects) vs CompactMDQL (columnar store).
+
+Usage:
+  bench_store.py [--tasks N] [--file path.md]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_vault import write_tasks
+from mdql import MDQL
+from mdql_store import CompactMDQL
+
+
+def measure(label: str, loader, path: str) -> None:
+    """Load a file and report peak/retained memory per task."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    mdql = loader(path)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(mdql.tasks)
+    print(f"{label:<12} {count:>9} tasks  load {elapsed:6.2f}s  "
+          f"retained {retained / count:8.1f} B/task  peak {peak / count:8.1f} B/task")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory per task for MDQL and CompactMDQL')
+    parser.add_argument('--tasks', type=int, default=200000, help='Tasks to generate (default: 200000)')
+    parser.add_argument('--file', help='Use an existing markdown file instead of generating one')
+    args = parser.parse_args()
+
+    if args.file:
+        path = args.file
+        cleanup = False
+    else:
+        fd, path = tempfile.mkstemp(suffix='.md')
+        os.close(fd)
+        write_tasks(path, args.tasks)
+        cleanup = True
+
+    try:
+        print(f"File: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        measure('MDQL', MDQL, path)
+        measure('CompactMDQL', CompactMDQL, path)
+    finally:
+        if cleanup:
+            os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
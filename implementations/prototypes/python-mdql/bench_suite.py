@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: parsing, queries, edits and saves, section summaries and
+mdql-query.py end to end, on a generated vault (see bench_vault). Results
+can be written as JSON and compared with an earlier run to catch
+regressions between releases.
+
+Usage:
+  bench_suite.py [--preset small|medium|large] [--repeat N] [--only NAME ...]
+                 [--json results.json] [--compare baseline.json] [--threshold 1.20]
+
+Single-file benchmarks run on one file holding as many sections as the
+whole vault; folder benchmarks run on the vault itself.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from bench_vault import add_spec_arguments, describe, generate_vault, spec_from_args, write_file
+from mdql import MDQL, MDQLParser
+from mdql_cache import ParseCache
+from mdql_catalog import MDQLCatalog
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUERY_CLI = os.path.join(HERE, 'mdql-query.py')
+
+FORMAT_VERSION = 1
+
+# MDQL.query() filter combinations, from index lookups to full scans
+QUERY_FILTERS = {
+    'open': {'completed': False},
+    'section': {'section': None},       # the file's first section
+    'priority_open': {'priority': 'High', 'completed': False},
+    'top_level_notes': {'indent_level': 0, 'has_notes': True},
+    'status_done': {'status': 'Done', 'completed': True},
+    'text_contains': {'text_contains': 'invoice'},
+    'text_like_open': {'text_like': 'review%', 'completed': False},
+}
+
+# mdql-query.py runs (file queries use the single file, folder ones the vault)
+CLI_QUERIES = {
+    'select_open': ('file', "SELECT text FROM {name} WHERE completed = false"),
+    'priority_and': ('file', "SELECT text, section FROM {name} WHERE priority = 'High' AND completed = false"),
+    'group_by': ('file', "SELECT section, COUNT(*) AS n FROM {name} GROUP BY section ORDER BY n DESC LIMIT 5"),
+    'folder_open': ('folder', "SELECT source_file, text FROM '{name}' WHERE completed = false"),
+}
+
+# Edits per mutator benchmark
+EDITS = 200
+
+# Seconds a timed sample should last at least
+MIN_SAMPLE = 0.05
+
+
+class Suite:
+    """Runs the benchmarks and collects their results."""
+
+    def __init__(self, workdir: str, repeat: int, only: Optional[List[str]] = None):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.only = only
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def measure(self, name: str, run: Callable[..., Any], setup: Optional[Callable[[], Any]] = None,
+                ops: int = 1, unit: str = 'op', **info: Any) -> None:
+        """
+        Time run() `repeat` times and record the times. Calls too quick to
+        time on their own are looped for about MIN_SAMPLE seconds per sample
+        (the first call also serves as a warm-up). With setup, each run is
+        run(setup()), and setup is not timed.
+        """
+        if not self.wanted(name):
+            return
+        number = 1
+        if setup is None:
+            start = time.perf_counter()
+            run()
+            first = time.perf_counter() - start
+            number = max(1, int(MIN_SAMPLE / first)) if first else 1000
+
+        times = []
+        for _ in range(self.repeat):
+            args = (setup(),) if setup else ()
+            gc.collect()
+            start = time.perf_counter()
+            for _ in range(number):
+                run(*args)
+            times.append((time.perf_counter() - start) / number)
+        median = statistics.median(times)
+        self.results[name] = dict(info, **{
+            'runs': len(times),
+            'loops': number,
+            'min': round(min(times), 6),
+            'median': round(median, 6),
+            'mean': round(statistics.fmean(times), 6),
+            'max': round(max(times), 6),
+            'ops': ops,
+            'unit': unit,
+            'per_second': round(ops / median, 1) if median else None,
+        })
+        print(f"  {name:<32} {median * 1000:10.2f} ms  {ops / median if median else 0:>14,.0f} {unit}/s")
+
+    # -- benchmarks ---------------------------------------------------------
+
+    def parse(self, vault_files: List[str], single: str, counts: Dict[str, int]) -> None:
+        self.measure('parse.file', lambda: MDQLParser().parse_file(single),
+                     ops=counts['single_lines'], unit='line')
+        self.measure('parse.vault', lambda: [MDQLParser().parse_file(path) for path in vault_files],
+                     ops=counts['lines'], unit='line')
+        self.measure('load.mdql', lambda: MDQL(single), ops=counts['single_lines'], unit='line')
+
+        # A warm parse cache must beat parse.file / load.mdql to be worth having
+        cache = ParseCache(os.path.join(self.workdir, 'cache'))
+        cache.store(single, MDQLParser().parse_file(single))
+        entry_bytes = os.path.getsize(cache._entry_path(single))
+        self.measure('load.cache', lambda: cache.load(single), ops=counts['single_lines'], unit='line',
+                     entry_bytes=entry_bytes, source_bytes=os.path.getsize(single))
+        self.measure('load.mdql_cached', lambda: MDQL(single, cache=cache), ops=counts['single_lines'], unit='line')
+        self.measure('load.catalog', lambda: MDQLCatalog(os.path.dirname(os.path.dirname(vault_files[0]))),
+                     ops=counts['lines'], unit='line')
+
+    def queries(self, single: str) -> None:
+        mdql = MDQL(single)
+        first_section = next(iter(mdql.sections))
+        for label, filters in QUERY_FILTERS.items():
+            filters = {key: first_section if value is None else value for key, value in filters.items()}
+            matches = len(mdql.query(**filters))
+            self.measure(f"query.{label}", lambda: mdql.query(**filters), matches=matches)
+        self.measure('summary.sections', mdql.get_section_summary, sections=len(mdql.sections))
+
+    def mutations(self, single: str) -> None:
+        copy = os.path.join(self.workdir, 'edit.md')
+
+        def fresh() -> MDQL:
+            shutil.copyfile(single, copy)
+            return MDQL(copy)
+
+        def lines_of(mdql: MDQL, completed: bool) -> List[int]:
+            tasks = [task for task in mdql.tasks if task.completed == completed]
+            step = max(1, len(tasks) // EDITS)
+            return [task.line_number for task in tasks[::step][:EDITS]]
+
+        def toggle(mdql: MDQL) -> None:
+            for line in lines_of(mdql, False):
+                mdql.mark_complete(line)
+
+        def update(mdql: MDQL) -> None:
+            for i, line in enumerate(lines_of(mdql, True)):
+                mdql.update_text(line, f"Edited task {i}")
+
+        def add(mdql: MDQL) -> None:
+            sections = list(mdql.sections)
+            for i in range(EDITS):
+                mdql.add_task(sections[i % len(sections)], f"Added task {i}")
+
+        def delete(mdql: MDQL) -> None:
+            for line in sorted(lines_of(mdql, True), reverse=True):
+                mdql.delete(line)
+
+        # One query after the edits, since that is when their pending re-parses run
+        def then_query(edit: Callable[[MDQL], None]) -> Callable[[MDQL], None]:
+            def run(mdql: MDQL) -> None:
+                edit(mdql)
+                mdql.query(completed=False)
+            return run
+
+        self.measure('mutate.mark_complete', then_query(toggle), fresh, ops=EDITS, unit='edit')
+        self.measure('mutate.update_text', then_query(update), fresh, ops=EDITS, unit='edit')
+        self.measure('mutate.add_task', then_query(add), fresh, ops=EDITS, unit='edit')
+        self.measure('mutate.delete', then_query(delete), fresh, ops=EDITS, unit='edit')
+
+        def edited() -> MDQL:
+            mdql = fresh()
+            toggle(mdql)
+            return mdql
+        self.measure('save.after_edits', MDQL.save, edited)
+
+    def cli(self, single: str, vault: str) -> None:
+        """
+        Time mdql-query.py end to end, with the queried folders read-only.
+        A query that writes beside the files it reads (a lock or cache file)
+        fails the run instead of being timed.
+        """
+        folders = [os.path.dirname(single)] + [folder for folder, _, _ in os.walk(vault)]
+        before = {folder: set(os.listdir(folder)) for folder in folders}
+        modes = {folder: os.stat(folder).st_mode for folder in folders}
+        try:
+            for folder in folders:
+                os.chmod(folder, 0o555)
+            for label, (kind, query) in CLI_QUERIES.items():
+                target = single if kind == 'file' else vault
+                name = os.path.basename(target)
+                argv = [sys.executable, QUERY_CLI, name, query.format(name=name), '--format', 'count']
+                self.measure(f"cli.{label}", lambda argv=argv, cwd=os.path.dirname(target): _run_cli(argv, cwd))
+        finally:
+            for folder, mode in modes.items():
+                os.chmod(folder, mode)
+        for folder, names in before.items():
+            added = set(os.listdir(folder)) - names
+            if added:
+                raise RuntimeError(f"mdql-query.py wrote {', '.join(sorted(added))} in {folder}")
+
+
+def _run_cli(argv: List[str], cwd: str) -> None:
+    result = subprocess.run(argv, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv[1:])} failed: {result.stderr.strip()}")
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float, out=sys.stdout) -> int:
+    """
+    Print time ratios against a baseline; returns how many exceed the
+    threshold. The fastest run is compared, as the one least disturbed by
+    other load on the machine.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('spec') != results.get('spec'):
+        print("Note: the baseline was run on a different vault spec", file=out)
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (ratio = now / then, fastest run):", file=out)
+    for name, now in results['results'].items():
+        then = baseline.get('results', {}).get(name)
+        if not then or not then.get('min'):
+            print(f"  {name:<32} {'new':>8}", file=out)
+            continue
+        ratio = now['min'] / then['min']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f"  {name:<32} {ratio:8.2f}x{flag}", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the MDQL benchmark suite on a generated vault')
+    add_spec_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (default: 5)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='Only benchmarks whose names start with these (e.g. parse query.open cli)')
+    parser.add_argument('--json', metavar='PATH', help="Write results as JSON ('-' for stdout)")
+    parser.add_argument('--compare', metavar='PATH', help='Compare with the JSON of an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.20,
+                        help='Ratio above which --compare reports a regression and exits 1 (default: 1.20)')
+    parser.add_argument('--keep', metavar='DIR', help='Generate the vault in DIR and keep it')
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    workdir = args.keep or tempfile.mkdtemp(prefix='mdql-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    log = sys.stderr if args.json == '-' else sys.stdout
+    try:
+        vault = os.path.join(workdir, 'vault')
+        single = os.path.join(workdir, 'single.md')
+        start = time.perf_counter()
+        if os.path.isdir(vault):
+            shutil.rmtree(vault)
+        counts = generate_vault(vault, spec)
+        single_tasks = write_file(single, spec, index=spec.files, sections=spec.sections * spec.files)
+        single_counts = describe([single])
+        counts.update(single_lines=single_counts['lines'], single_tasks=single_tasks,
+                      single_bytes=single_counts['bytes'])
+        print(f"Vault: {counts['files']} files, {counts['tasks']} tasks, {counts['lines']} lines; "
+              f"single file: {single_tasks} tasks, {single_counts['lines']} lines "
+              f"(generated in {time.perf_counter() - start:.1f}s)", file=log)
+
+        vault_files = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(vault)
+                             for name in names)
+        suite = Suite(workdir, args.repeat, args.only)
+        stdout = sys.stdout
+        sys.stdout = log
+        try:
+            suite.parse(vault_files, single, counts)
+            suite.queries(single)
+            suite.mutations(single)
+            suite.cli(single, vault)
+        finally:
+            sys.stdout = stdout
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'format': FORMAT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'spec': asdict(spec),
+        'vault': counts,
+        'repeat': args.repeat,
+        'results': suite.results,
+    }
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Wrote {args.json}", file=log)
+
+    if args.compare and compare(results, args.compare, args.threshold, log):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
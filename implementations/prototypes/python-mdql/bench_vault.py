@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Deterministic generator of synthetic markdown vaults for benchmarks.
+
+The same VaultSpec and seed always produce byte-identical files, and each
+file only depends on its own index, so a vault of 10 files is the first 10
+files of a vault of 100.
+
+Usage:
+  bench_vault.py <dir> [--preset small|medium|large] [--files N] [--sections N]
+                 [--tasks N] [--depth N] [--notes P] [--metadata P] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Dict, List
+
+
+@dataclass(frozen=True)
+class VaultSpec:
+    """Shape of a generated vault."""
+    files: int = 20               # markdown files
+    sections: int = 10            # sections per file
+    tasks: int = 40               # tasks per section (on average)
+    depth: int = 3                # deepest subtask level
+    notes: float = 0.3            # chance of a note bullet under a task
+    metadata: float = 0.7         # chance of each metadata line under a heading
+    completed: float = 0.4        # share of completed tasks
+    files_per_folder: int = 25    # files are spread over folders of this size
+    seed: int = 42
+
+
+PRESETS: Dict[str, VaultSpec] = {
+    'small': VaultSpec(files=10, sections=8, tasks=25),
+    'medium': VaultSpec(files=100, sections=10, tasks=40),
+    'large': VaultSpec(files=400, sections=20, tasks=60),
+}
+
+PRIORITIES = ['High', 'Medium', 'Low']
+STATUSES = ['Active', 'Planning', 'Done', 'Blocked']
+WORDS = ('alpha beta gamma delta review draft call email budget design deploy fix '
+         'write test plan meet invoice report update camera venue contract ship '
+         'order refactor publish sync backup migrate audit schedule').split()
+
+
+def file_path(root: str, spec: VaultSpec, index: int) -> str:
+    """Where the index-th file of a vault goes."""
+    folder = f"area-{index // spec.files_per_folder:03d}"
+    return os.path.join(root, folder, f"note-{index:05d}.md")
+
+
+def write_file(path: str, spec: VaultSpec, index: int = 0, sections: int = 0) -> int:
+    """Write one generated file; returns its number of tasks."""
+    rng = random.Random(f"{spec.seed}:{index}")
+    written = 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# Notes {index}\n\nGenerated for benchmarks.\n\n")
+        for section in range(sections or spec.sections):
+            level = '###' if rng.random() < 0.2 else '##'
+            f.write(f"{level} Project {index}-{section} {rng.choice(WORDS).title()}\n")
+            if rng.random() < spec.metadata:
+                f.write(f"*Source: inbox-{rng.randrange(100)}.md (2024-{rng.randint(1, 12):02d}-"
+                        f"{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d})*\n")
+            if rng.random() < spec.metadata:
+                f.write(f"*Updated: log-{rng.randrange(100)}.md (2024-{rng.randint(1, 12):02d}-"
+                        f"{rng.randint(1, 28):02d})*\n")
+            if rng.random() < spec.metadata:
+                f.write(f"**Priority:** {rng.choice(PRIORITIES)}\n")
+            if rng.random() < spec.metadata:
+                f.write(f"**Status:** {rng.choice(STATUSES)}\n")
+            if rng.random() < spec.metadata / 2:
+                f.write(f"**Owner:** {rng.choice(['Ana', 'Bo', 'Cy', 'Dee'])}\n")
+            f.write("\n")
+
+            depth = 0
+            for _ in range(rng.randint(max(1, spec.tasks // 2), max(1, spec.tasks * 3 // 2))):
+                depth = max(0, min(depth + rng.choice([-1, 0, 0, 1]), spec.depth))
+                check = 'x' if rng.random() < spec.completed else ' '
+                words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+                f.write(f"{'  ' * depth}- [{check}] {words.capitalize()} #{index}-{written}\n")
+                if rng.random() < spec.notes:
+                    f.write(f"{'  ' * (depth + 1)}- Note: {' '.join(rng.choice(WORDS) for _ in range(4))}\n")
+                written += 1
+            f.write("\n")
+    return written
+
+
+def write_tasks(path: str, n_tasks: int, spec: VaultSpec = VaultSpec()) -> int:
+    """Write one generated file of roughly n_tasks tasks; returns its number of tasks."""
+    return write_file(path, spec, sections=max(1, n_tasks // max(1, spec.tasks)))
+
+
+def generate_vault(root: str, spec: VaultSpec) -> Dict[str, int]:
+    """Write every file of a vault under root; returns file, line, task and byte counts."""
+    paths: List[str] = []
+    tasks = 0
+    for index in range(spec.files):
+        path = file_path(root, spec, index)
+        tasks += write_file(path, spec, index)
+        paths.append(path)
+    return dict(describe(paths), tasks=tasks)
+
+
+def describe(paths: List[str]) -> Dict[str, int]:
+    """File, line and byte counts of some files."""
+    lines = size = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        lines += data.count(b'\n')
+        size += len(data)
+    return {'files': len(paths), 'lines': lines, 'bytes': size}
+
+
+def spec_from_args(args: argparse.Namespace) -> VaultSpec:
+    """A preset's spec with any fields given on the command line."""
+    spec = PRESETS[args.preset]
+    overrides = {f.name: getattr(args, f.name) for f in fields(VaultSpec)
+                 if getattr(args, f.name, None) is not None}
+    return replace(spec, **overrides)
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser, default_preset: str = 'small') -> None:
+    """Add --preset and an option per VaultSpec field (read back with spec_from_args)."""
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=default_preset,
+                        help=f'Vault size (default: {default_preset})')
+    parser.add_argument('--files', type=int, help='Markdown files')
+    parser.add_argument('--sections', type=int, help='Sections per file')
+    parser.add_argument('--tasks', type=int, help='Average tasks per section')
+    parser.add_argument('--depth', type=int, help='Deepest subtask level')
+    parser.add_argument('--notes', type=float, help='Chance of a note under each task (0-1)')
+    parser.add_argument('--metadata', type=float, help='Chance of each metadata line under a heading (0-1)')
+    parser.add_argument('--completed', type=float, help='Share of completed tasks (0-1)')
+    parser.add_argument('--seed', type=int, help='Random seed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic markdown vault')
+    parser.add_argument('root', help='Directory to write the vault into')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    counts = generate_vault(args.root, spec)
+    print(f"{args.root}: {counts['files']} files, {counts['tasks']} tasks, {counts['lines']} lines, "
+          f"{counts['bytes'] / 1e6:.1f} MB ({asdict(spec)})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
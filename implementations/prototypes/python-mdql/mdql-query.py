@@ -29,95 +29,45 @@ Examples:
 
   # Combined filters
   mdql-query.py todo.md "SELECT * FROM todo.md WHERE priority = 'High' AND indent_level = 0"
-"""
-
-import argparse
-import sys
-import os
-import re
-from typing import List, Any, Dict, Optional
-from mdql import MDQL, TaskItem
-
-
-def parse_mdql_query(query: str) -> Dict[str, Any]:
-    """Parse a simple MDQL SELECT query."""
-    query = query.strip()
-
-    # Pattern: SELECT <columns> FROM <file> [WHERE <conditions>]
-    select_pattern = r'SELECT\s+(.+?)\s+FROM\s+(.+?)(?:\s+WHERE\s+(.+))?$'
-    match = re.match(select_pattern, query, re.IGNORECASE | re.DOTALL)
-
-    if not match:
-        raise ValueError("Invalid MDQL query. Expected: SELECT ... FROM ... [WHERE ...]")
-
-    columns_str = match.group(1).strip()
-    from_str = match.group(2).strip()
-    where_str = match.group(3).strip() if match.group(3) else None
-
-    # Parse columns
-    if columns_str == '*':
-        columns = ['status', 'text', 'section', 'notes']
-    else:
-        columns = [c.strip() for c in columns_str.split(',')]
 
-    # Parse file (remove quotes and ::task_lists if present)
-    file_path = from_str.replace('"', '').replace("'", '').split('::')[0]
+  # Every file in a folder (adds a source_file column)
+  mdql-query.py notes/ "SELECT source_file, text FROM 'notes/' WHERE completed = false"
 
-    # Parse WHERE clause
-    filters = {}
-    if where_str:
-        filters = parse_where_clause(where_str)
+  # Join tasks to their section metadata
+  mdql-query.py todo.md "SELECT t.text, m.priority FROM todo.md t JOIN todo.md::section_metadata m ON t.section = m.section_name WHERE m.status = 'Active'"
 
-    return {
-        'columns': columns,
-        'file': file_path,
-        'filters': filters
-    }
-
-
-def parse_where_clause(where_str: str) -> Dict[str, Any]:
-    """Parse WHERE clause into filters."""
-    filters = {}
-
-    # Split by AND (simple parser, doesn't handle OR or complex expressions)
-    conditions = re.split(r'\s+AND\s+', where_str, flags=re.IGNORECASE)
+  # Materialized view, refreshed incrementally after edits
+  mdql-query.py todo.md "CREATE MATERIALIZED VIEW open_high AS SELECT text, line FROM todo.md WHERE priority = 'High' AND completed = false"
+  mdql-query.py todo.md "REFRESH MATERIALIZED VIEW open_high"
+  mdql-query.py todo.md "SELECT text FROM open_high"
 
-    for condition in conditions:
-        condition = condition.strip()
+  # Open and total tasks per section
+  mdql-query.py todo.md "SELECT section, COUNT(*) AS total, SUM(completed) AS done FROM todo.md GROUP BY section HAVING COUNT(*) > 5 ORDER BY total DESC"
 
-        # Handle LIKE
-        like_match = re.match(r"(\w+)\s+LIKE\s+['\"]%?(.+?)%?['\"]", condition, re.IGNORECASE)
-        if like_match:
-            field = like_match.group(1).lower()
-            value = like_match.group(2)
+  # Full-text search (uses the index kept in the parse cache)
+  mdql-query.py todo.md "SELECT * FROM todo.md WHERE text MATCH '\"final date\" confirm*'" --cache
 
-            if field == 'text':
-                filters['text_contains'] = value
-            elif field == 'notes':
-                filters['notes_contains'] = value
-            continue
+  # OR, NOT, IN, parentheses, ORDER BY and LIMIT
+  mdql-query.py todo.md "SELECT * FROM todo.md WHERE (priority IN ('High', 'Medium') OR has_notes) AND NOT completed ORDER BY section, line DESC LIMIT 10"
 
-        # Handle = comparison
-        eq_match = re.match(r"(\w+)\s*=\s*(.+)", condition, re.IGNORECASE)
-        if eq_match:
-            field = eq_match.group(1).strip().lower()
-            value = eq_match.group(2).strip().strip("'\"")
+  # Keep files parsed in a server process; query it with mdql_client.py
+  mdql-query.py serve todo.md
+  mdql_client.py todo.md "SELECT text FROM todo.md WHERE completed = false"
+"""
 
-            if field == 'completed':
-                filters['completed'] = value.lower() in ('true', '1', 'yes')
-            elif field == 'section':
-                filters['section'] = value
-            elif field == 'priority':
-                filters['priority'] = value
-            elif field == 'status':
-                filters['status'] = value
-            elif field in ('indent_level', 'indent'):
-                filters['indent_level'] = int(value)
-            elif field == 'has_notes':
-                filters['has_notes'] = value.lower() in ('true', '1', 'yes')
-            continue
+import argparse
+import sys
+import os
+from dataclasses import replace
+from typing import List, Any, Dict, Optional
+from itertools import islice
+from mdql import MDQL, MDQLStream, TaskItem
+from mdql_cache import ParseCache
+from mdql_sort import DEFAULT_SORT_BUFFER
+from mdql_sql import parse_mdql_query, execute_query, explain_query, stream_query
 
-    return filters
+# Folders, joins, aggregates, views, --mmap and the server each import their
+# module only when used: a plain query starts in a fraction of the time
 
 
 def format_table(data: List[Dict[str, Any]], columns: List[str]) -> str:
@@ -154,7 +104,7 @@ def format_table(data: List[Dict[str, Any]], columns: List[str]) -> str:
     return "\n".join([header, separator] + rows)
 
 
-def task_to_dict(task: TaskItem, mdql: MDQL) -> Dict[str, Any]:
+def task_to_dict(task: TaskItem, mdql: Any) -> Dict[str, Any]:
     """Convert a TaskItem to a dictionary for display."""
     row = {
         'status': '✓' if task.completed else '☐',
@@ -166,11 +116,14 @@ def task_to_dict(task: TaskItem, mdql: MDQL) -> Dict[str, Any]:
         'notes': len(task.notes) if task.notes else 0,
         'has_notes': 'yes' if task.notes else 'no',
         'priority': '',
+        'source_file': getattr(task, 'source_file', None) or '',
     }
+    row['file'] = row['source_file']
 
     # Add priority from section metadata if available
-    if task.section in mdql.sections:
-        section_meta = mdql.sections[task.section]
+    section_for = getattr(mdql, 'section_for', None)
+    section_meta = section_for(task) if section_for else mdql.sections.get(task.section)
+    if section_meta:
         if section_meta.priority:
             row['priority'] = section_meta.priority
         if section_meta.status:
@@ -186,7 +139,252 @@ def task_to_dict(task: TaskItem, mdql: MDQL) -> Dict[str, Any]:
     return row
 
 
+def table_rows(tasks: List[TaskItem], parsed, mdql: Any) -> List[Dict[str, Any]]:
+    """Convert tasks for display, adding a key for each 'column AS alias'."""
+    aliases = [(label, item.name) for label, item in zip(parsed.columns, parsed.items) if label != str(item)]
+    rows = []
+    for task in tasks:
+        row = task_to_dict(task, mdql)
+        for label, name in aliases:
+            row[label] = row.get(name, '')
+        rows.append(row)
+    return rows
+
+
+def format_value(value: Any) -> str:
+    """Render a joined or aggregated column value for display."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip('0').rstrip('.')
+    if isinstance(value, list):
+        return '; '.join(value)
+    return str(value)
+
+
+def run_join(parsed, args) -> int:
+    """Run a query with JOINs, loading each distinct source once."""
+    from mdql_join import JoinQuery
+    cache = ParseCache(args.cache_dir) if (args.cache or args.cache_dir) else None
+
+    def open_source(path: str):
+        if not os.path.exists(path):
+            # Paths in the query may be relative to the file argument
+            nearby = os.path.join(os.path.dirname(args.file), path)
+            path = nearby if os.path.exists(nearby) else args.file if path == parsed.source else path
+        if os.path.isdir(path):
+            from mdql_catalog import MDQLCatalog
+            return MDQLCatalog(path, workers=args.workers, cache_dir=args.cache_dir if cache else None)
+        return MDQL(path, cache=cache, text_index=cache is not None)
+
+    try:
+        join = JoinQuery(parsed, open_source)
+        if args.explain:
+            print(join.explain())
+            return 0
+        rows = join.execute()
+    except (OSError, ValueError) as e:
+        print(f"Error executing query: {e}", file=sys.stderr)
+        return 1
+
+    if args.limit:
+        rows = rows[:args.limit]
+
+    if args.format == 'count':
+        print(len(rows))
+        return 0
+
+    data = [{label: format_value(value) for label, value in join.project(row).items()} for row in rows]
+    if args.format == 'simple':
+        for row in data:
+            print(' | '.join(row.values()))
+        print(f"\n{len(rows)} result(s)")
+        return 0
+
+    print(format_table(data, [label for label, _ in join.columns]))
+    print(f"\n{len(rows)} result(s)")
+    return 0
+
+
+def run_aggregate(parsed, query_file: str, args) -> int:
+    """Run a GROUP BY / aggregate query, printing one row per group."""
+    from mdql_aggregate import aggregate_folder, aggregate_query
+    cache_dir = args.cache_dir if (args.cache or args.cache_dir) else None
+    try:
+        if os.path.isdir(query_file):
+            rows = aggregate_folder(parsed, query_file, workers=args.workers, cache_dir=cache_dir)
+        elif args.mmap:
+            from mdql_mmap import MappedTaskFile
+            rows = aggregate_query(parsed, MappedTaskFile(query_file))
+        elif args.compact:
+            from mdql_store import CompactMDQL
+            rows = aggregate_query(parsed, CompactMDQL(query_file))
+        elif args.stream:
+            rows = aggregate_query(parsed, MDQLStream(query_file))
+        else:
+            cache = ParseCache(cache_dir) if cache_dir else None
+            rows = aggregate_query(parsed, MDQL(query_file, cache=cache, text_index=cache is not None))
+    except (OSError, ValueError) as e:
+        print(f"Error executing query: {e}", file=sys.stderr)
+        return 1
+
+    if args.limit:
+        rows = rows[:args.limit]
+    if args.format == 'count':
+        print(len(rows))
+        return 0
+
+    data = [{label: format_value(value) for label, value in row.items()} for row in rows]
+    if args.format == 'simple':
+        for row in data:
+            print(' | '.join(row.values()))
+    else:
+        print(format_table(data, parsed.columns))
+    print(f"\n{len(rows)} group(s)")
+    return 0
+
+
+def run_view(statement, args) -> int:
+    """Create, refresh or drop a materialized view, printing its rows."""
+    from mdql_views import ViewStore
+    action, name, select = statement
+    store = ViewStore(args.cache_dir)
+    try:
+        if action == 'drop':
+            store.drop(name)
+            print(f"Dropped materialized view {name}")
+            return 0
+        if action == 'create':
+            source = parse_mdql_query(select).source
+            view = store.create(name, select, source if os.path.exists(source) else args.file)
+        else:
+            view, stats = store.refresh(name)
+            print(f"refresh: {stats}", file=sys.stderr)
+        rows = view.rows()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    columns = getattr(view, 'columns', None) or (list(rows[0]) if rows else [])
+    return print_view_rows(columns, rows, args)
+
+
+def run_view_select(store, name: str, args) -> int:
+    """Print a materialized view's stored rows (SELECT ... FROM <view>)."""
+    from mdql_views import file_fingerprint
+    try:
+        view = store.load(name)
+        columns, rows = view.select(args.query)
+        if view.fingerprint != file_fingerprint(view.filepath):
+            print(f"Note: {view.filepath} changed since view {name} was refreshed; "
+                  f"run REFRESH MATERIALIZED VIEW {name}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return print_view_rows(columns, rows, args)
+
+
+def print_view_rows(columns, rows, args) -> int:
+    """Print a view's rows in the requested format."""
+    if args.limit:
+        rows = rows[:args.limit]
+    if args.format == 'count':
+        print(len(rows))
+        return 0
+
+    data = [{label: format_value(value) for label, value in row.items()} for row in rows]
+    if args.format == 'simple':
+        for row in data:
+            print(' | '.join(row.values()))
+    else:
+        print(format_table(data, columns))
+    print(f"\n{len(rows)} result(s)")
+    return 0
+
+
+def run_catalog(parsed, folder: str, args) -> int:
+    """Run a query over every markdown file in a folder."""
+    from mdql_catalog import MDQLCatalog
+    cache_dir = args.cache_dir if (args.cache or args.cache_dir) else None
+    catalog = MDQLCatalog(folder, workers=args.workers, cache_dir=cache_dir)
+    return run_streaming(parsed, folder, args, source=catalog)
+
+
+def run_streaming(parsed, query_file: str, args, source=None) -> int:
+    """Run a query in one pass over a stream, mapped file, compact store or catalog."""
+    if source is not None:
+        stream = source
+    elif args.mmap:
+        from mdql_mmap import MappedTaskFile
+        stream = MappedTaskFile(query_file)
+    elif args.compact:
+        from mdql_store import CompactMDQL
+        stream = CompactMDQL(query_file)
+    else:
+        stream = MDQLStream(query_file)
+    try:
+        results = stream_query(parsed, stream, sort_buffer=args.sort_buffer)
+        if args.limit:
+            results = islice(results, args.limit)
+
+        if args.format == 'count':
+            print(sum(1 for _ in results))
+            return 0
+
+        if args.format == 'simple':
+            count = 0
+            for task in results:
+                status = '✓' if task.completed else '☐'
+                print(f"{status} {task.text}")
+                count += 1
+            print(f"\n{count} result(s)")
+            return 0
+
+        # The table needs every row to size its columns
+        rows = list(results)
+    except ValueError as e:
+        print(f"Error executing query: {e}", file=sys.stderr)
+        return 1
+
+    print(format_table(table_rows(rows, parsed, stream), parsed.columns))
+    print(f"\n{len(rows)} result(s)")
+    return 0
+
+
+def run_server(argv: List[str]) -> int:
+    """mdql-query.py serve: answer queries from memory until interrupted."""
+    from mdql_server import default_socket_path, serve
+    parser = argparse.ArgumentParser(
+        prog='mdql-query.py serve',
+        description='Keep markdown files parsed in memory and answer queries sent with mdql_client.py',
+    )
+    parser.add_argument('files', nargs='*', help='Files or folders to load up front (others load on first query)')
+    parser.add_argument('--socket', help=f'Unix socket to listen on (default: {default_socket_path()})')
+    parser.add_argument('--port', type=int, help='Listen on localhost TCP instead of a Unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP address to bind with --port')
+    parser.add_argument('--workers', type=int, help='Worker processes for folder queries (default: CPU count)')
+    parser.add_argument('--cache-dir', help='Parse cache directory, to start faster after a restart')
+    parser.add_argument('--watch', action='store_true',
+                        help='Refresh loaded files as soon as they change, instead of on the next query')
+    args = parser.parse_args(argv)
+
+    where = f"{args.host}:{args.port}" if args.port is not None else args.socket or default_socket_path()
+    print(f"mdql: serving on {where}", file=sys.stderr)
+    try:
+        serve(args.socket, args.port, args.host, args.cache_dir, args.workers, args.files, args.watch)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
 def main():
+    if sys.argv[1:2] == ['serve']:
+        return run_server(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         description='Query markdown files using MDQL (SQL-like) syntax',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -216,6 +414,18 @@ MDQL Query Examples:
 
   Top-level incomplete tasks:
     %(prog)s todo.md "SELECT * FROM todo.md WHERE completed = false AND indent_level = 0"
+
+  Tasks with their section metadata:
+    %(prog)s todo.md "SELECT t.text, m.priority, m.status FROM todo.md t JOIN todo.md::section_metadata m ON t.section = m.section_name"
+
+  Full-text search on words, "phrases" and prefix*:
+    %(prog)s todo.md "SELECT * FROM todo.md WHERE text MATCH 'camera'" --cache
+
+  Task counts per section:
+    %(prog)s todo.md "SELECT section, COUNT(*), SUM(completed) FROM todo.md GROUP BY section"
+
+  Either priority, newest lines first:
+    %(prog)s todo.md "SELECT * FROM todo.md WHERE priority IN ('High', 'Medium') ORDER BY line DESC LIMIT 5"
         """
     )
 
@@ -226,9 +436,34 @@ MDQL Query Examples:
     parser.add_argument('--format', choices=['table', 'simple', 'count'],
                         default='table',
                         help='Output format (default: table)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Parse lazily while querying (constant memory, stops early at LIMIT)')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Read the file through mmap, decoding task text only when shown')
+    parser.add_argument('--compact', action='store_true',
+                        help='Load tasks into the columnar store (mdql_store), using a fraction of the memory')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes for folder queries (default: CPU count)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Show the query plan instead of running the query')
+    parser.add_argument('--sort-buffer', type=int, default=DEFAULT_SORT_BUFFER,
+                        help='Rows an unlimited ORDER BY keeps in memory before spilling to temp files '
+                             '(--stream, --mmap and folders)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Reuse a cached parse when the file is unchanged')
+    parser.add_argument('--cache-dir',
+                        help='Parse cache directory (implies --cache)')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Print parse cache hit/miss counters to stderr')
 
     args = parser.parse_args()
 
+    if 'MATERIALIZED' in args.query.upper():
+        from mdql_views import parse_view_statement
+        statement = parse_view_statement(args.query)
+        if statement:
+            return run_view(statement, args)
+
     # Check file exists
     if not os.path.exists(args.file):
         print(f"Error: File not found: {args.file}", file=sys.stderr)
@@ -242,24 +477,60 @@ MDQL Query Examples:
         print("\nExpected format: SELECT <columns> FROM <file> [WHERE <conditions>]")
         return 1
 
+    # --limit becomes the query's LIMIT, so ORDER BY keeps a bounded heap
+    # instead of sorting every match
+    if args.limit and not (isinstance(parsed.limit, int) and parsed.limit <= args.limit):
+        if parsed.limit is None or isinstance(parsed.limit, int):
+            parsed = replace(parsed, limit=args.limit)
+
+    if parsed.joins:
+        return run_join(parsed, args)
+
+    if not os.path.exists(parsed.source):
+        # FROM may name a materialized view instead of a file
+        from mdql_views import ViewStore
+        store = ViewStore(args.cache_dir)
+        if parsed.source in store:
+            return run_view_select(store, parsed.source, args)
+
     # Load file (use file from query or argument)
-    query_file = parsed['file'] if parsed['file'] else args.file
+    query_file = parsed.source if parsed.source else args.file
     if not os.path.exists(query_file):
         # Try relative to args.file
         query_file = args.file
 
+    if parsed.is_aggregate:
+        return run_aggregate(parsed, query_file, args)
+
+    if os.path.isdir(query_file):
+        return run_catalog(parsed, query_file, args)
+
+    if args.stream or args.mmap or args.compact:
+        return run_streaming(parsed, query_file, args)
+
+    cache = ParseCache(args.cache_dir) if (args.cache or args.cache_dir) else None
+
     try:
-        mdql = MDQL(query_file)
+        # A one-off query scans faster than it can build the full-text index,
+        # so only use the index when it can be kept in the cache
+        mdql = MDQL(query_file, cache=cache, text_index=cache is not None)
     except Exception as e:
         print(f"Error loading file: {e}", file=sys.stderr)
         return 1
 
+    if cache and args.cache_stats:
+        stats = cache.stats()
+        print(f"cache: {stats['hits']} hit(s), {stats['misses']} miss(es)", file=sys.stderr)
+
     # Execute query
-    filters = parsed['filters']
-    if filters:
-        results = mdql.query(**filters)
-    else:
-        results = mdql.tasks
+    try:
+        if args.explain:
+            print(explain_query(parsed, mdql))
+            return 0
+        results = execute_query(parsed, mdql)
+    except ValueError as e:
+        print(f"Error executing query: {e}", file=sys.stderr)
+        return 1
 
     # Apply limit
     if args.limit:
@@ -278,10 +549,10 @@ MDQL Query Examples:
         return 0
 
     # Table format
-    columns = parsed['columns']
+    columns = parsed.columns
 
     # Convert tasks to dict format
-    data = [task_to_dict(task, mdql) for task in results]
+    data = table_rows(results, parsed, mdql)
 
     print(format_table(data, columns))
     print(f"\n{len(results)} result(s)")
@@ -3,11 +3,22 @@ MDQL (Markdown Query Language) Prototype
 A simple Python implementation for parsing and manipulating markdown task lists.
 """
 
+import bisect
+import os
 import re
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Iterable, Iterator, Set, Tuple, Union
 from datetime import datetime
 
+from mdql_concurrency import ConflictError, FileLock, FileVersion, file_version, merge3
+from mdql_scan import HEADING, NOTE, SOURCE, TASK, UPDATED, LineScanner
+from mdql_text import (
+    SEARCH_FIELDS, SEARCH_KINDS, TextIndex, TrigramIndex, parse_match, search_literals, value_matcher,
+)
+from mdql_wal import CHECKPOINT_INTERVAL, OPERATIONS, WriteAheadLog, content_digest
+
 
 @dataclass
 class SectionMetadata:
@@ -24,6 +35,7 @@ class SectionMetadata:
     priority: Optional[str] = None
     status: Optional[str] = None
     properties: Dict[str, str] = field(default_factory=dict)
+    file: Optional[str] = None  # Set when sections from several files are merged
 
 
 @dataclass
@@ -39,6 +51,7 @@ class TaskItem:
     has_children: bool = False
     children: List['TaskItem'] = field(default_factory=list)
     notes: List[str] = field(default_factory=list)  # Non-checkbox bullet points under this task
+    source_file: Optional[str] = None  # Set when tasks from several files are merged
 
     def __repr__(self):
         status = "✓" if self.completed else "☐"
@@ -47,10 +60,39 @@ class TaskItem:
         return f"{indent}{status} {self.text}{notes_str} (line {self.line_number})"
 
 
+@dataclass
+class SectionSpan:
+    """A run of lines from one heading up to the next, the unit of incremental re-parse."""
+    start_line: int
+    metadata: Optional[SectionMetadata] = None
+    tasks: List[TaskItem] = field(default_factory=list)
+
+
+@dataclass
+class SavedSpans:
+    """
+    What a save or checkpoint wrote, for state kept per section span (see
+    mdql_views): the file's version before and after the write, its number
+    of spans, and the lines now written for each span edited since the
+    previous write. changed is None when any span may differ (after a merge,
+    a rollback or a refresh from disk).
+    """
+    filepath: str
+    before: Optional[FileVersion]
+    after: Optional[FileVersion]
+    span_count: int
+    changed: Optional[Dict[int, List[str]]]
+
+
 class MDQLParser:
-    """Parser for markdown files with task lists."""
+    """
+    Parser for markdown files with task lists.
 
-    # Regular expressions
+    Lines are classified by a tokenizer (see mdql_scan): LineScanner unless
+    another is given.
+    """
+
+    # Regular expressions (LineScanner folds these into one per line)
     HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$')
     TASK_PATTERN = re.compile(r'^(\s*)- \[([ xX])\]\s+(.+)$')
     NOTE_PATTERN = re.compile(r'^(\s*)- (.+)$')  # Regular bullet without checkbox
@@ -58,7 +100,8 @@ class MDQLParser:
     UPDATED_PATTERN = re.compile(r'^\*Updated:\s*(.+?\.md)\s*\((.+?)\)\*$')
     PROPERTY_PATTERN = re.compile(r'^\*\*(.+?):\*\*\s+(.+)$')
 
-    def __init__(self):
+    def __init__(self, tokenizer: Optional[Any] = None):
+        self.tokenizer = tokenizer or LineScanner()
         self.tasks: List[TaskItem] = []
         self.sections: Dict[str, SectionMetadata] = {}
         self.current_section: Optional[str] = None
@@ -68,90 +111,95 @@ class MDQLParser:
     def parse_file(self, filepath: str) -> Dict[str, Any]:
         """Parse a markdown file and extract task lists and metadata."""
         with open(filepath, 'r', encoding='utf-8') as f:
-            self.lines = f.readlines()
+            return self.parse_lines(f.readlines())
 
-        self._parse_content()
+    def parse_lines(self, lines: List[Optional[str]]) -> Dict[str, Any]:
+        """Parse already-read lines (None entries are deleted lines) like parse_file."""
+        self.lines = lines
+        spans = self._parse_content()
 
         return {
             'tasks': self.tasks,
             'sections': self.sections,
-            'lines': self.lines
+            'lines': self.lines,
+            'spans': spans
         }
 
-    def _parse_content(self):
+    def _parse_content(self) -> List[SectionSpan]:
         """Parse the content line by line."""
-        parent_stack: List[tuple] = []  # Stack of (indent_level, task)
-        current_section_meta: Optional[SectionMetadata] = None
-        last_task: Optional[TaskItem] = None
-
-        for line_num, line in enumerate(self.lines, start=1):
-            line_stripped = line.rstrip('\n')
+        spans = self.parse_span(self.lines, 1, len(self.lines))
+        for span in spans:
+            self.tasks.extend(span.tasks)
+            if span.metadata:
+                self.sections[span.metadata.section_name] = span.metadata
+        return spans
+
+    def parse_span(self, lines: List[Optional[str]], start_line: int, end_line: int) -> List[SectionSpan]:
+        """
+        Parse lines[start_line..end_line] (1-based, inclusive) into section spans.
 
-            # Check for heading
-            heading_match = self.HEADING_PATTERN.match(line_stripped)
-            if heading_match:
-                level = len(heading_match.group(1))
-                section_name = heading_match.group(2)
-                self.current_section = section_name
-                self.current_section_level = level
+        Every heading starts a new span; lines before the first heading form a
+        span without metadata. Entries that are None (lines deleted by
+        MDQLWriter but not yet written) are skipped without renumbering.
+        """
+        span = SectionSpan(start_line=start_line)
+        spans = [span]
+        selected = (lines[i] for i in range(start_line - 1, end_line))
+
+        for item in self.iter_lines(selected, start_line):
+            if isinstance(item, TaskItem):
+                span.tasks.append(item)
+            elif item.line_number == span.start_line and span.metadata is None:
+                span.metadata = item
+            else:
+                span = SectionSpan(start_line=item.line_number, metadata=item)
+                spans.append(span)
 
-                current_section_meta = SectionMetadata(
-                    section_name=section_name,
-                    section_level=level,
-                    line_number=line_num
-                )
-                self.sections[section_name] = current_section_meta
-                parent_stack.clear()
-                last_task = None
-                continue
+        return spans
 
-            # Check for source metadata
-            if current_section_meta:
-                source_match = self.SOURCE_PATTERN.match(line_stripped)
-                if source_match:
-                    current_section_meta.source_file = source_match.group(1)
-                    date_time = source_match.group(2)
-                    self._parse_datetime(date_time, current_section_meta, 'source')
-                    continue
+    def iter_file(self, filepath: str) -> Iterator[Union[SectionMetadata, TaskItem]]:
+        """
+        Stream a markdown file, yielding section metadata and tasks lazily.
 
-                # Check for updated metadata
-                updated_match = self.UPDATED_PATTERN.match(line_stripped)
-                if updated_match:
-                    current_section_meta.updated_file = updated_match.group(1)
-                    date_time = updated_match.group(2)
-                    self._parse_datetime(date_time, current_section_meta, 'updated')
-                    continue
+        Only the open parent chain is kept, so memory does not grow with the
+        file. See iter_lines() for when each item is complete.
+        """
+        with open(filepath, 'r', encoding='utf-8') as f:
+            yield from self.iter_lines(f)
 
-                # Check for property metadata
-                prop_match = self.PROPERTY_PATTERN.match(line_stripped)
-                if prop_match:
-                    key = prop_match.group(1)
-                    value = prop_match.group(2)
-
-                    # Special handling for known properties
-                    if key == 'Priority':
-                        current_section_meta.priority = value
-                    elif key == 'Status':
-                        current_section_meta.status = value
-                    else:
-                        current_section_meta.properties[key] = value
-                    continue
+    def iter_lines(self, lines: Iterable[Optional[str]], start_line: int = 1) -> Iterator[Union[SectionMetadata, TaskItem]]:
+        """
+        Parse lines one at a time, yielding SectionMetadata and TaskItems in file order.
 
-            # Check for task item (checkbox)
-            task_match = self.TASK_PATTERN.match(line_stripped)
-            if task_match:
-                indent = task_match.group(1)
-                check = task_match.group(2)
-                text = task_match.group(3)
+        A SectionMetadata is yielded at its heading and its properties are
+        filled in from the lines that follow, before any of the section's
+        tasks are yielded. A TaskItem is yielded once the next task or heading
+        is read, so its text, notes and has_children are final; only its
+        children list keeps growing.
+        """
+        parent_stack: List[tuple] = []  # Stack of (indent_level, task)
+        current_section_meta: Optional[SectionMetadata] = None
+        last_task: Optional[TaskItem] = None
+        self.current_section = None
+        self.current_section_level = 0
 
-                indent_level = len(indent) // 2
-                completed = check.lower() == 'x'
+        section, section_level = "Untitled", 0
+        scan = self.tokenizer.scan
+        for line_num, line in enumerate(lines, start=start_line):
+            if line is None:
+                continue
+            token = scan(line)
+            if token is None:
+                continue
+            kind = token[0]
 
+            if kind == TASK:
+                _, indent_level, completed, text = token
                 task = TaskItem(
                     text=text,
                     completed=completed,
-                    section=self.current_section or "Untitled",
-                    section_level=self.current_section_level,
+                    section=section,
+                    section_level=section_level,
                     indent_level=indent_level,
                     line_number=line_num
                 )
@@ -167,22 +215,51 @@ class MDQLParser:
                     parent_task.children.append(task)
 
                 parent_stack.append((indent_level, task))
-                self.tasks.append(task)
+                if last_task:
+                    yield last_task
                 last_task = task
-                continue
-
-            # Check for note items (regular bullets without checkbox)
-            note_match = self.NOTE_PATTERN.match(line_stripped)
-            if note_match and last_task:
-                indent = note_match.group(1)
-                note_text = note_match.group(2)
-                note_indent_level = len(indent) // 2
 
+            elif kind == NOTE:
                 # Only add as note if it's indented more than the last task
                 # This ensures we're capturing sub-items, not unrelated bullets
-                if note_indent_level > last_task.indent_level:
+                _, note_indent_level, note_text = token
+                if last_task and note_indent_level > last_task.indent_level:
                     last_task.notes.append(note_text)
-                    continue
+
+            elif kind == HEADING:
+                _, level, section_name = token
+                self.current_section = section = section_name
+                self.current_section_level = section_level = level
+
+                current_section_meta = SectionMetadata(
+                    section_name=section_name,
+                    section_level=level,
+                    line_number=line_num
+                )
+                if last_task:
+                    yield last_task
+                yield current_section_meta
+                parent_stack.clear()
+                last_task = None
+
+            elif current_section_meta:
+                _, key, value = token
+                if kind == SOURCE:
+                    current_section_meta.source_file = key
+                    self._parse_datetime(value, current_section_meta, 'source')
+                elif kind == UPDATED:
+                    current_section_meta.updated_file = key
+                    self._parse_datetime(value, current_section_meta, 'updated')
+                # Special handling for known properties
+                elif key == 'Priority':
+                    current_section_meta.priority = value
+                elif key == 'Status':
+                    current_section_meta.status = value
+                else:
+                    current_section_meta.properties[key] = value
+
+        if last_task:
+            yield last_task
 
     def _parse_datetime(self, date_time_str: str, metadata: SectionMetadata, prefix: str):
         """Parse date and optional time from string."""
@@ -196,8 +273,8 @@ class MDQLParser:
 class MDQLWriter:
     """Writer for updating markdown files."""
 
-    def __init__(self, lines: List[str]):
-        self.lines = lines.copy()
+    def __init__(self, lines: List[str], copy: bool = True):
+        self.lines = lines.copy() if copy else lines
 
     def update_task_completion(self, line_number: int, completed: bool) -> None:
         """Toggle task completion status."""
@@ -234,33 +311,541 @@ class MDQLWriter:
         self.lines.insert(line_number - 1, new_line)
 
     def write_file(self, filepath: str) -> None:
-        """Write the modified content back to file."""
+        """Write the modified content back to file, replacing it atomically."""
         # Filter out deleted lines (marked as None)
-        output_lines = [line for line in self.lines if line is not None]
+        write_atomic(filepath, ''.join(line for line in self.lines if line is not None))
+
+
+def write_atomic(filepath: str, content: str) -> None:
+    """
+    Replace a file's contents so that a crash leaves either the old or the
+    new version, never a truncated one.
+
+    The content goes to a temp file in the same directory, which is fsynced
+    and renamed over the target; the directory is then fsynced so the rename
+    itself is durable. The file keeps its permission bits.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    tmp_path = os.path.join(directory, f".{os.path.basename(filepath)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(filepath).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class MDQLStream:
+    """
+    Single-pass, lazily parsed view of a markdown file.
+
+    Iterating yields tasks in file order without building the full task list;
+    section metadata seen so far is kept in `sections` (one entry per heading
+    name), so section-level columns such as priority can be evaluated on the fly.
+    """
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.writelines(output_lines)
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.sections: Dict[str, SectionMetadata] = {}
+
+    def __iter__(self) -> Iterator[TaskItem]:
+        for item in MDQLParser().iter_file(self.filepath):
+            if isinstance(item, TaskItem):
+                yield item
+            else:
+                self.sections[item.section_name] = item
+
+
+class LineOffsets:
+    """
+    Fenwick tree of pending line shifts, indexed by section span.
+
+    add(i, delta) shifts span i and every span after it; shift(i) returns the
+    accumulated shift for span i. Both are O(log n), so a batch of edits can
+    defer renumbering downstream tasks until the task list is next read.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        """Shift spans index.. by delta (0-based index)."""
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def shift(self, index: int) -> int:
+        """Get the accumulated shift of a span (0-based index)."""
+        i = index + 1
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def reset(self) -> None:
+        """Clear all pending shifts."""
+        self.tree = [0] * (self.size + 1)
+
+
+@dataclass
+class SectionCounts:
+    """Running task counts for one section name."""
+    total: int = 0
+    completed: int = 0
+    top_level: int = 0
+    top_level_completed: int = 0
+
+    def update(self, task: TaskItem, sign: int) -> None:
+        """Count a task in (sign=1) or out (sign=-1)."""
+        self.total += sign
+        if task.completed:
+            self.completed += sign
+        if task.indent_level == 0:
+            self.top_level += sign
+            if task.completed:
+                self.top_level_completed += sign
+
+
+class TaskIndex:
+    """
+    Secondary indexes over tasks.
+
+    Buckets are dicts keyed by id(task) so a task can be removed in O(1);
+    callers sort by line_number when file order matters. Per-section counts
+    are kept alongside so summaries never rescan the tasks.
+    """
+
+    def __init__(self, tasks: Optional[List[TaskItem]] = None):
+        self.by_line: Dict[int, TaskItem] = {}
+        self.by_section: Dict[str, Dict[int, TaskItem]] = {}
+        self.by_completed: Dict[bool, Dict[int, TaskItem]] = {True: {}, False: {}}
+        self.by_indent: Dict[int, Dict[int, TaskItem]] = {}
+        self.counts: Dict[str, SectionCounts] = {}
+        for task in tasks or []:
+            self.add(task)
+
+    def add(self, task: TaskItem, with_line: bool = True) -> None:
+        """Add a task to every index."""
+        key = id(task)
+        if with_line:
+            self.by_line[task.line_number] = task
+        self.by_section.setdefault(task.section, {})[key] = task
+        self.by_completed[task.completed][key] = task
+        self.by_indent.setdefault(task.indent_level, {})[key] = task
+        self.counts.setdefault(task.section, SectionCounts()).update(task, 1)
+
+    def remove(self, task: TaskItem, with_line: bool = True) -> None:
+        """Remove a task from every index."""
+        key = id(task)
+        if with_line and self.by_line.get(task.line_number) is task:
+            del self.by_line[task.line_number]
+        if self.by_section.get(task.section, {}).get(key) is task:
+            counts = self.counts[task.section]
+            counts.update(task, -1)
+            if not counts.total:
+                del self.counts[task.section]
+        self._discard(self.by_section, task.section, key)
+        self.by_completed[task.completed].pop(key, None)
+        self._discard(self.by_indent, task.indent_level, key)
+
+    def set_completed(self, task: TaskItem, completed: bool) -> None:
+        """Move a task between completion buckets and update it."""
+        key = id(task)
+        self.by_completed[task.completed].pop(key, None)
+        counts = self.counts.get(task.section)
+        if counts is not None:
+            counts.update(task, -1)
+        task.completed = completed
+        if counts is not None:
+            counts.update(task, 1)
+        self.by_completed[completed][key] = task
+
+    def rebuild_lines(self, tasks: List[TaskItem]) -> None:
+        """Rebuild the line-number index after tasks were renumbered."""
+        self.by_line = {task.line_number: task for task in tasks}
+
+    @staticmethod
+    def _discard(index: Dict[Any, Dict[int, TaskItem]], value: Any, key: int) -> None:
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del index[value]
+
+
+# Prepared statements kept per MDQL instance
+STATEMENT_CACHE_SIZE = 128
+
+# Guessed fraction of rows kept by filters that have no index
+RESIDUAL_SELECTIVITY = {
+    'text': 0.1,
+    'notes': 0.05,
+    'has_notes': 0.5,
+}
+
+
+@dataclass
+class PlanStep:
+    """A predicate applied after the driving index, with its estimated selectivity."""
+    name: str
+    selectivity: float
+    predicate: Callable[[TaskItem], bool]
+
+
+@dataclass
+class QueryPlan:
+    """How MDQL.query() will evaluate a set of filters."""
+    driver: str
+    driver_rows: int
+    total_rows: int
+    steps: List[PlanStep]
+    candidates: Callable[[], Iterable[TaskItem]]
+
+    @property
+    def estimated_rows(self) -> int:
+        """Estimated result size, assuming independent predicates."""
+        rows = float(self.driver_rows)
+        for step in self.steps:
+            rows *= step.selectivity
+        return round(rows)
+
+    def __str__(self):
+        if self.driver == 'scan':
+            lines = [f"Full scan ({self.total_rows} rows)"]
+        else:
+            lines = [f"Index lookup: {self.driver} ({self.driver_rows} of {self.total_rows} rows)"]
+        rows = float(self.driver_rows)
+        for step in self.steps:
+            rows *= step.selectivity
+            lines.append(f"  -> Filter: {step.name} (selectivity {step.selectivity:.2f}, ~{round(rows)} rows)")
+        lines.append(f"Estimated result: {self.estimated_rows} rows")
+        return "\n".join(lines)
 
 
 class MDQL:
     """Main MDQL interface for querying and manipulating markdown task lists."""
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, cache=None, text_index: bool = True, wal: bool = False,
+                 views=None):
+        """
+        Load a markdown file.
+
+        Args:
+            filepath: Path to the markdown file
+            cache: Optional ParseCache (see mdql_cache) used to skip
+                re-parsing when the file is unchanged
+            text_index: Answer text and notes searches from a full-text
+                index (see mdql_text), built on the first search
+            wal: Log edits to a write-ahead log (see mdql_wal) that a
+                background thread checkpoints into the file, instead of
+                rewriting the file on every save. Edits left in an existing
+                log are applied on load either way.
+            views: Optional ViewStore (see mdql_views) whose views over
+                this file are updated from the edited spans on every save
+                and checkpoint
+        """
         self.filepath = filepath
+        self.cache = cache
+        self.views = views
         self.parser = MDQLParser()
-        self.data = self.parser.parse_file(filepath)
-        self.writer = MDQLWriter(self.data['lines'])
+        self.use_text_index = text_index
+        self._statements = None
+        self._transaction: Optional[Dict[str, Any]] = None
+        self.wal: Optional[WriteAheadLog] = None
+        self._checkpointer: Optional[threading.Thread] = None
+
+        self._owner: Optional[FileLock] = None
+        if wal:
+            # One WAL writer per file, for as long as it stays open
+            self._owner = FileLock(filepath, timeout=0, name='wal-owner')
+            try:
+                self._owner.acquire()
+            except TimeoutError:
+                raise ConflictError(f"{filepath} is already open with wal=True in another process") from None
+
+        log = self._log = WriteAheadLog(filepath)
+        # The file and its log are read together, so a concurrent save or
+        # checkpoint cannot land between the two
+        with FileLock(filepath, shared=not wal):
+            data, records = self._read(repair=wal)
+        self._apply(data, records)
+        if wal:
+            log.open()
+            self.wal = log
+            self._checkpointer = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._checkpointer.start()
+
+    def _read(self, repair: bool = False) -> Tuple[Dict[str, Any], List[Any]]:
+        """
+        Parse the file and recover the edits left in its log, returning
+        (data, records to replay). The caller holds the file lock.
+        """
+        log = self._log
+        self._version = file_version(self.filepath)
+        self._log_version = file_version(log.path)
+        records, holes = log.recover(repair=repair) if log.exists() else ([], [])
+        if holes:
+            # Recreate the placeholders of lines deleted before the last
+            # checkpoint, which the logged line numbers still count
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                lines: List[Optional[str]] = f.readlines()
+            for line_number in holes:
+                lines.insert(line_number - 1, None)
+            return self.parser.parse_lines(lines), records
+        data = self.cache.load(self.filepath) if self.cache else None
+        if data is None:
+            data = self.parser.parse_file(self.filepath)
+            if self.cache:
+                self.cache.store(self.filepath, data)
+        return data, records
+
+    def _apply(self, data: Dict[str, Any], records: List[Any]) -> None:
+        """Load what _read returned and replay the logged edits."""
+        # The lines as saved on disk: the common base for merging with
+        # edits another process saved in the meantime
+        self._base = [line for line in data['lines'] if line is not None]
+        self._load(data)
+        for op, *args in records:
+            getattr(self, OPERATIONS[op])(*args)
+        # What the file and its log added up to, before any edit of ours
+        self._loaded = [line for line in self.writer.lines if line is not None] if records else self._base
+
+    def _load(self, data: Dict[str, Any], edited: bool = False) -> None:
+        """Set up the writer and indexes for freshly parsed data."""
+        self.data = data
+        # Prepared statements read the sections dict they were compiled against
+        self._statements = None
+        # The parsed lines are only used by the writer, so edit them in place
+        self.writer = MDQLWriter(data['lines'], copy=False)
+        self._spans: List[SectionSpan] = data['spans']
+        self._offsets = LineOffsets(len(self._spans))
+        self._shifted = False
+        self._dirty = False
+        # Spans re-parsed since the file was last read or written
+        self._changed_spans: Optional[Set[int]] = set()
+        self.index = TaskIndex(data['tasks'])
+        self._text_index = None
+        self._trigram_index = None
+        self._edited = edited
 
     @property
     def tasks(self) -> List[TaskItem]:
         """Get all tasks."""
+        self._sync()
         return self.data['tasks']
 
+    @property
+    def text_index(self) -> Optional[TextIndex]:
+        """
+        The word index (mdql_text.TextIndex), or None when disabled.
+
+        Built on first use, or loaded from the parse cache when the file is
+        unchanged and has not been edited in memory.
+        """
+        if self._text_index is None and self.use_text_index:
+            self._text_index = self._load_index('text', TextIndex)
+        return self._text_index
+
+    @property
+    def trigram_index(self) -> Optional[TrigramIndex]:
+        """The trigram index (mdql_text.TrigramIndex), built like text_index."""
+        if self._trigram_index is None and self.use_text_index:
+            self._trigram_index = self._load_index('trigram', TrigramIndex)
+        return self._trigram_index
+
+    def _load_index(self, kind: str, index_class):
+        """Load a text index from the parse cache, or build (and cache) it."""
+        tasks = self.tasks
+        fresh = self.cache is not None and not self._edited
+        state = self.cache.load(self.filepath, kind=kind) if fresh else None
+        index = index_class.from_state(state, tasks) if state else None
+        if index is None:
+            index = index_class(tasks)
+            if fresh:
+                self.cache.store(self.filepath, index.state(), kind=kind)
+        return index
+
+    def _text_indexes(self) -> List[Any]:
+        """The text indexes built so far, which edits must keep current."""
+        return [index for index in (self._text_index, self._trigram_index) if index is not None]
+
     @property
     def sections(self) -> Dict[str, SectionMetadata]:
         """Get all section metadata."""
+        self._sync()
         return self.data['sections']
 
+    def _sync(self) -> None:
+        """Apply pending line shifts and rebuild the task list after edits."""
+        if self._shifted:
+            for i, span in enumerate(self._spans):
+                delta = self._offsets.shift(i)
+                if delta:
+                    self._shift_span(span, delta)
+            self._offsets.reset()
+
+        if self._dirty:
+            self.data['tasks'] = [task for span in self._spans for task in span.tasks]
+            self._dirty = False
+
+        if self._shifted:
+            self.index.rebuild_lines(self.data['tasks'])
+            self._shifted = False
+
+    @staticmethod
+    def _shift_span(span: SectionSpan, delta: int) -> None:
+        """Renumber a span's heading and tasks by delta lines."""
+        span.start_line += delta
+        if span.metadata:
+            span.metadata.line_number += delta
+        for task in span.tasks:
+            task.line_number += delta
+            if task.parent_line is not None:
+                task.parent_line += delta
+
+    def _span_start(self, index: int) -> int:
+        """Current first line of a span, including pending shifts."""
+        return self._spans[index].start_line + self._offsets.shift(index)
+
+    def _span_index(self, line_number: int) -> int:
+        """Find the span containing a (current) line number."""
+        lo, hi = 0, len(self._spans) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._span_start(mid) <= line_number:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def _reparse(self, index: int, delta: int = 0) -> None:
+        """
+        Re-parse a single span after an edit that changed its length by delta.
+
+        Only the span's own lines are parsed again; spans after it are shifted
+        lazily through the offset tree.
+        """
+        span = self._spans[index]
+        pending = self._offsets.shift(index)
+        if pending:
+            self._shift_span(span, pending)
+            self._offsets.add(index, -pending)
+            if index + 1 < len(self._spans):
+                self._offsets.add(index + 1, pending)
+        if delta:
+            self._offsets.add(index + 1, delta)
+            self._shifted = True
+
+        if index + 1 < len(self._spans):
+            end_line = self._span_start(index + 1) - 1
+        else:
+            end_line = len(self.writer.lines)
+
+        new_spans = self.parser.parse_span(self.writer.lines, span.start_line, end_line)
+        if len(new_spans) > 1 or (new_spans[0].metadata is None) != (span.metadata is None):
+            self._restructure(index, end_line, merge=new_spans[0].metadata is None)
+            return
+        new_span = new_spans[0]
+        self._spans[index] = new_span
+        if self._changed_spans is not None:
+            self._changed_spans.add(index)
+
+        # While shifts are pending the line index is rebuilt on the next sync
+        with_line = not self._shifted
+        for task in span.tasks:
+            self.index.remove(task, with_line)
+        for task in new_span.tasks:
+            self.index.add(task, with_line)
+        for text_index in self._text_indexes():
+            for task in span.tasks:
+                text_index.remove(task)
+            for task in new_span.tasks:
+                text_index.add(task)
+        self._edited = True
+
+        sections = self.data['sections']
+        if span.metadata and sections.get(span.metadata.section_name) is span.metadata:
+            sections[span.metadata.section_name] = new_span.metadata
+        self._dirty = True
+
+    def _restructure(self, index: int, end_line: int, merge: bool) -> None:
+        """
+        Re-parse after an edit added or removed a heading in span index,
+        which changes the spans themselves: a span that lost its heading
+        joins the one before it, and a new heading splits its span.
+        """
+        self._sync()
+        first = index - 1 if merge and index > 0 else index
+        old_spans = self._spans[first:index + 1]
+        new_spans = self.parser.parse_span(self.writer.lines, old_spans[0].start_line, end_line)
+        self._spans[first:index + 1] = new_spans
+        self._offsets = LineOffsets(len(self._spans))
+        # Span numbers after this one have moved
+        self._changed_spans = None
+
+        for span in old_spans:
+            for task in span.tasks:
+                self.index.remove(task)
+                for text_index in self._text_indexes():
+                    text_index.remove(task)
+        for span in new_spans:
+            for task in span.tasks:
+                self.index.add(task)
+                for text_index in self._text_indexes():
+                    text_index.add(task)
+        self._edited = True
+
+        # The last heading with a name holds its metadata, as in a full parse
+        sections = self.data['sections']
+        sections.clear()
+        for span in self._spans:
+            if span.metadata:
+                sections[span.metadata.section_name] = span.metadata
+        self._dirty = True
+
+    def _reparse_line(self, line_number: int) -> None:
+        """Re-parse the span holding an edited (not inserted or removed) line."""
+        self._reparse(self._span_index(line_number))
+
+    def _changed_in_place(self, line_number: int) -> None:
+        """Record an edit that updated a line's task without re-parsing its span."""
+        if self._changed_spans is not None:
+            self._changed_spans.add(self._span_index(line_number))
+
+    def _task_at(self, line_number: int) -> Optional[TaskItem]:
+        """Look up a task by its current line number."""
+        if not self._shifted:
+            return self.index.by_line.get(line_number)
+
+        # Pending shifts: locate the span, then bisect its tasks
+        i = self._span_index(line_number)
+        tasks = self._spans[i].tasks
+        target = line_number - self._offsets.shift(i)
+        pos = bisect.bisect_left([t.line_number for t in tasks], target)
+        if pos < len(tasks) and tasks[pos].line_number == target:
+            return tasks[pos]
+        return None
+
     def query(self, **filters) -> List[TaskItem]:
         """
         Query tasks with filters.
@@ -273,118 +858,554 @@ class MDQL:
         - indent_level: int
         - text_contains: str
         - notes_contains: str - Search in task notes/descriptions
+        - text_match: str - Full-text MATCH on task text (see mdql_text.parse_match)
+        - notes_match: str - Full-text MATCH on notes
+        - text_like / notes_like / section_like: str - SQL LIKE pattern
+        - text_regexp / notes_regexp / section_regexp: str - Regex searched
+          anywhere in the value, ignoring case
+        - section_contains / section_match: str
         - has_notes: bool - Filter tasks with/without notes
         """
-        results = self.tasks
+        plan = self._plan(filters)
+        predicates = [step.predicate for step in plan.steps]
+
+        results = [
+            t for t in plan.candidates()
+            if all(predicate(t) for predicate in predicates)
+        ]
+        if plan.driver != 'scan':
+            results.sort(key=lambda t: t.line_number)
+        return results
 
-        if 'completed' in filters:
-            results = [t for t in results if t.completed == filters['completed']]
+    def prepare(self, query: str):
+        """
+        Prepare an MDQL SELECT with '?' placeholders for repeated execution.
 
-        if 'section' in filters:
-            section_filter = filters['section']
-            results = [t for t in results if t.section == section_filter]
+        Statements are cached per instance (LRU, keyed by query text):
 
-        if 'indent_level' in filters:
-            results = [t for t in results if t.indent_level == filters['indent_level']]
+            stmt = mdql.prepare("SELECT * FROM todo.md WHERE priority = ? AND completed = ?")
+            tasks = stmt.execute('High', False)
+        """
+        from mdql_sql import StatementCache
+
+        if self._statements is None:
+            self._statements = StatementCache(STATEMENT_CACHE_SIZE)
+        return self._statements.get(query, self)
 
-        if 'text_contains' in filters:
-            text = filters['text_contains'].lower()
-            results = [t for t in results if text in t.text.lower()]
+    def explain(self, **filters) -> 'QueryPlan':
+        """Show the plan query() would use for these filters."""
+        return self._plan(filters)
+
+    def _search_candidates(self, name: str, kind: str, pattern: str) -> Optional[List[TaskItem]]:
+        """
+        Tasks that may satisfy a text or notes search, from the word or
+        trigram index, or None when neither can narrow it down.
 
-        if 'notes_contains' in filters:
-            search_text = filters['notes_contains'].lower()
-            results = [
-                t for t in results
-                if any(search_text in note.lower() for note in t.notes)
-            ]
+        MATCH results are exact; the others are a superset to recheck.
+        """
+        if kind == 'match':
+            text_index = self.text_index
+            return text_index.match(name, parse_match(pattern)) if text_index is not None else None
+
+        literals = search_literals(kind, pattern)
+        if any(len(literal) >= 3 for literal in literals):
+            trigram_index = self.trigram_index
+            if trigram_index is not None:
+                return trigram_index.candidates(name, literals)
+        if kind == 'contains' and self.text_index is not None:
+            # Too short for trigrams: the words that contain the needle
+            return self.text_index.contains(name, pattern)
+        return None
+
+    def _sections_where(self, attr: str, value: str) -> List[str]:
+        """Names of sections whose metadata attribute equals value."""
+        return [name for name, meta in self.data['sections'].items() if getattr(meta, attr) == value]
+
+    def _plan(self, filters: Dict[str, Any]) -> 'QueryPlan':
+        """
+        Choose the most selective index to drive the query and order the
+        remaining predicates by estimated selectivity.
+        """
+        self._sync()
+        total = len(self.data['tasks'])
+        index = self.index
 
+        # (name, buckets, predicate) for every filter we can answer from an index
+        indexed = []
+        if 'section' in filters:
+            section = filters['section']
+            indexed.append((f"section = {section!r}",
+                            [index.by_section.get(section, {})],
+                            lambda t: t.section == section))
+        if 'completed' in filters:
+            completed = bool(filters['completed'])
+            indexed.append((f"completed = {completed}",
+                            [index.by_completed[completed]],
+                            lambda t: t.completed == completed))
+        if 'indent_level' in filters:
+            indent_level = filters['indent_level']
+            indexed.append((f"indent_level = {indent_level}",
+                            [index.by_indent.get(indent_level, {})],
+                            lambda t: t.indent_level == indent_level))
+        for attr in ('priority', 'status'):
+            if attr in filters:
+                names = self._sections_where(attr, filters[attr])
+                name_set = frozenset(names)
+                indexed.append((f"{attr} = {filters[attr]!r}",
+                                [index.by_section.get(name, {}) for name in names],
+                                lambda t, name_set=name_set: t.section in name_set))
+
+        # Filters that need a scan, with a fixed selectivity guess
+        residual = []
+        # Index lookups that return a superset, so their predicate still runs
+        rechecked = set()
+
+        # Text searches (text_contains=, notes_like=, section_regexp=, ...)
+        for name in SEARCH_FIELDS:
+            for kind in SEARCH_KINDS:
+                pattern = filters.get(f"{name}_{kind}")
+                if pattern is None:
+                    continue
+                matcher = value_matcher(kind, pattern)
+                label = f"{name} {kind} {pattern!r}"
+                predicate = lambda t, name=name, matcher=matcher: matcher(getattr(t, name))
+                if name == 'section':
+                    # Few distinct names: test each one, then use the section index
+                    names = [section for section in index.by_section if matcher(section)]
+                    indexed.append((label, [index.by_section[section] for section in names], predicate))
+                    continue
+                candidates = self._search_candidates(name, kind, pattern)
+                if candidates is None or (kind != 'match' and len(candidates) > total // 2):
+                    # Checking most of the tasks anyway: a plain scan is cheaper
+                    residual.append((label, predicate))
+                elif kind == 'match':
+                    bucket = {id(t): t for t in candidates}
+                    indexed.append((label, [bucket], lambda t, ids=frozenset(bucket): id(t) in ids))
+                else:
+                    indexed.append((label, [{id(t): t for t in candidates}], predicate))
+                    rechecked.add(label)
         if 'has_notes' in filters:
-            has_notes = filters['has_notes']
-            if has_notes:
-                results = [t for t in results if t.notes]
+            has_notes = bool(filters['has_notes'])
+            residual.append((f"has_notes = {has_notes}",
+                             lambda t: bool(t.notes) == has_notes))
+
+        steps = [
+            PlanStep(name, sum(len(b) for b in buckets) / total if total else 0.0, predicate)
+            for name, buckets, predicate in indexed
+        ]
+        steps += [
+            PlanStep(name, RESIDUAL_SELECTIVITY.get(name.split()[0], 0.5), predicate)
+            for name, predicate in residual
+        ]
+
+        if not indexed:
+            steps.sort(key=lambda step: step.selectivity)
+            tasks = self.data['tasks']
+            return QueryPlan('scan', total, total, steps, lambda: tasks)
+
+        best = min(range(len(indexed)), key=lambda i: sum(len(b) for b in indexed[i][1]))
+        driver_name, buckets, driver_predicate = indexed[best]
+        driver_rows = sum(len(b) for b in buckets)
+        del steps[best]
+        steps.sort(key=lambda step: step.selectivity)
+        if driver_name in rechecked:
+            steps.append(PlanStep(f"{driver_name} (recheck)", 1.0, driver_predicate))
+
+        def candidates():
+            for bucket in buckets:
+                yield from bucket.values()
+
+        return QueryPlan(driver_name, driver_rows, total, steps, candidates)
+
+    @contextmanager
+    def _edit(self, *record):
+        """Apply an edit and, in WAL mode, log it as one atomic step."""
+        if self.wal is None:
+            yield
+            return
+        with self.wal.lock:
+            yield
+            if self._transaction is not None:
+                self._transaction['records'].append(list(record))
             else:
-                results = [t for t in results if not t.notes]
-
-        if 'priority' in filters:
-            priority = filters['priority']
-            results = [
-                t for t in results
-                if t.section in self.sections and self.sections[t.section].priority == priority
-            ]
-
-        if 'status' in filters:
-            status = filters['status']
-            results = [
-                t for t in results
-                if t.section in self.sections and self.sections[t.section].status == status
-            ]
-
-        return results
+                self.wal.append([list(record)])
 
     def mark_complete(self, line_number: int) -> None:
         """Mark a task as complete."""
-        self.writer.update_task_completion(line_number, True)
-        # Update in-memory task
-        for task in self.tasks:
-            if task.line_number == line_number:
-                task.completed = True
-                break
+        with self._edit('x', line_number):
+            self.writer.update_task_completion(line_number, True)
+            self._changed_in_place(line_number)
+            task = self._task_at(line_number)
+            if task:
+                self.index.set_completed(task, True)
 
     def mark_incomplete(self, line_number: int) -> None:
         """Mark a task as incomplete."""
-        self.writer.update_task_completion(line_number, False)
-        # Update in-memory task
-        for task in self.tasks:
-            if task.line_number == line_number:
-                task.completed = False
-                break
+        with self._edit('o', line_number):
+            self.writer.update_task_completion(line_number, False)
+            self._changed_in_place(line_number)
+            task = self._task_at(line_number)
+            if task:
+                self.index.set_completed(task, False)
 
     def update_text(self, line_number: int, new_text: str) -> None:
         """Update task text."""
-        self.writer.update_task_text(line_number, new_text)
-        # Update in-memory task
-        for task in self.tasks:
-            if task.line_number == line_number:
+        with self._edit('t', line_number, new_text):
+            self.writer.update_task_text(line_number, new_text)
+            self._changed_in_place(line_number)
+            task = self._task_at(line_number)
+            if task:
+                text_indexes = self._text_indexes()
+                for text_index in text_indexes:
+                    text_index.remove(task)
                 task.text = new_text
-                break
+                for text_index in text_indexes:
+                    text_index.add(task)
+            self._edited = True
 
     def delete(self, line_number: int) -> None:
         """Delete a task."""
-        self.writer.delete_task(line_number)
-        # Remove from in-memory tasks
-        self.data['tasks'] = [t for t in self.tasks if t.line_number != line_number]
+        # Deleted lines stay as placeholders until save, so nothing shifts
+        with self._edit('d', line_number):
+            self.writer.delete_task(line_number)
+            self._reparse_line(line_number)
 
     def add_task(self, section: str, text: str, indent_level: int = 0, completed: bool = False) -> None:
-        """Add a new task to a section."""
-        # Find the section and insert after it
-        section_meta = self.sections.get(section)
+        """Add a new task to the end of a section."""
+        section_meta = self.data['sections'].get(section)
         if not section_meta:
             raise ValueError(f"Section '{section}' not found")
 
-        # Find the next section or end of current section
-        insert_line = section_meta.line_number + 1
-        for line_num in range(section_meta.line_number + 1, len(self.writer.lines) + 1):
-            line = self.writer.lines[line_num - 1] if line_num <= len(self.writer.lines) else ""
-            # Stop at next heading of same or higher level
-            if re.match(r'^#{1,' + str(section_meta.section_level) + r'}\s+', line):
-                break
-            insert_line = line_num + 1
+        with self._edit('a', section, text, indent_level, completed):
+            index = next(i for i, span in enumerate(self._spans) if span.metadata is section_meta)
+
+            # Insert just before the next heading (or at the end of the file)
+            if index + 1 < len(self._spans):
+                insert_line = self._span_start(index + 1)
+            else:
+                insert_line = len(self.writer.lines) + 1
 
-        self.writer.insert_task(insert_line, text, indent_level, completed)
+            self.writer.insert_task(insert_line, text, indent_level, completed)
+            self._reparse(index, delta=1)
 
     def save(self, filepath: Optional[str] = None) -> None:
-        """Save changes to file."""
+        """
+        Save changes to file (atomically, see write_atomic).
+
+        Inside a transaction, saving to the loaded file is deferred to the
+        transaction's commit. In WAL mode, saving to the loaded file only
+        forces the log to disk; the file itself is written by checkpoints.
+        """
         output_path = filepath or self.filepath
-        self.writer.write_file(output_path)
+        if output_path == self.filepath:
+            if self._transaction is not None:
+                return
+            if self.wal is not None:
+                self.wal.sync()
+                return
+        if output_path != self.filepath:
+            self.writer.write_file(output_path)
+            return
+
+        lines = [line for line in self.writer.lines if line is not None]
+        changed = self._span_changes()
+        with FileLock(self.filepath), self._claim_log() as owned:
+            before = self._version
+            merged = self._merge_concurrent(lines)
+            write_atomic(self.filepath, ''.join(merged or lines))
+            self._version = file_version(self.filepath)
+            if owned:
+                # Edits replayed from a log are now in the file
+                self._log.remove()
+            self._log_version = file_version(self._log.path)
+        if self.cache:
+            self.cache.invalidate(self.filepath)
+        if merged:
+            self._reload(merged)
+        self._base = self._loaded = merged or lines
+        self._changed_spans = set()
+        self._notify_views(before, None if merged else changed)
+
+    @contextmanager
+    def _claim_log(self) -> Iterator[bool]:
+        """
+        Decide, before save() replaces the file, whether it may delete the
+        file's log: yields True while holding the log's owner lock. A log
+        another process has open with wal=True is left to it (its next
+        checkpoint merges with the saved file, as it would with any other
+        writer's save). A log no one owns that has changed since it was
+        replayed here holds edits this instance lacks: ConflictError.
+        """
+        if not self._log.exists():
+            yield False
+            return
+        owner = FileLock(self.filepath, timeout=0, name='wal-owner')
+        try:
+            owner.acquire()
+        except TimeoutError:
+            yield False
+            return
+        try:
+            if file_version(self._log.path) != self._log_version:
+                raise ConflictError(f"{self._log.path} has edits this instance has not loaded; "
+                                    f"call refresh() and save again")
+            yield True
+        finally:
+            owner.release()
+
+    def _span_changes(self) -> Optional[Dict[int, List[str]]]:
+        """The lines of each span edited since the last write (None: any may differ)."""
+        if self.views is None or self._changed_spans is None:
+            return None
+        lines = self.writer.lines
+        changed = {}
+        for index in self._changed_spans:
+            start = self._span_start(index)
+            end = self._span_start(index + 1) - 1 if index + 1 < len(self._spans) else len(lines)
+            changed[index] = [line for line in lines[start - 1:end] if line is not None]
+        return changed
+
+    def _notify_views(self, before: Optional[FileVersion], changed: Optional[Dict[int, List[str]]]) -> None:
+        """Hand what was just written to the views stored for this file."""
+        if self.views is not None:
+            self.views.apply(SavedSpans(self.filepath, before, self._version, len(self._spans), changed))
+
+    def _merge_concurrent(self, lines: List[str]) -> Optional[List[str]]:
+        """
+        If another process saved the file since it was loaded, return our
+        lines merged with its version (see mdql_concurrency.merge3), else
+        None. Raises ConflictError when both changed the same lines. The
+        caller holds the file lock.
+        """
+        if file_version(self.filepath) == self._version:
+            return None
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                theirs = f.readlines()
+        except FileNotFoundError:
+            theirs = []
+        if theirs == self._base:
+            return None
+        return merge3(self._base, lines, theirs)
+
+    def _reload(self, lines: List[str]) -> None:
+        """Replace the in-memory state with a full parse of merged lines."""
+        self.parser = MDQLParser()
+        self._load(self.parser.parse_lines(list(lines)), edited=True)
+        self._changed_spans = None
+
+    def refresh(self) -> bool:
+        """
+        Pick up changes another process or an editor saved to the file (or
+        its log) since it was loaded or last refreshed; see mdql_watch to do
+        this whenever the file changes.
+
+        Unsaved edits are kept, merged with the new contents as save() would
+        merge them (ConflictError if both changed the same lines, leaving
+        the in-memory state as it was). In WAL mode the merge is written out
+        as a checkpoint. Returns False when nothing changed, or a transaction
+        is open.
+        """
+        if self._transaction is not None:
+            return False
+        wal = self.wal
+        if wal is not None:
+            # The log is ours, so only the file can have changed
+            with wal.checkpoint_lock, FileLock(self.filepath):
+                if file_version(self.filepath) == self._version:
+                    return False
+                self._checkpoint_merge()
+            if self.cache:
+                self.cache.invalidate(self.filepath)
+            self._notify_views(None, None)
+            return True
+
+        with FileLock(self.filepath, shared=True):
+            if (file_version(self.filepath), file_version(self._log.path)) == (self._version, self._log_version):
+                return False
+            lines = [line for line in self.writer.lines if line is not None]
+            loaded = self._loaded
+            edited = lines != loaded
+            if edited:
+                snapshot = {'lines': list(self.writer.lines), 'edited': self._edited, 'records': []}
+                seen = (self._version, self._log_version, self._base, loaded)
+            self.parser = MDQLParser()
+            data, records = self._read()
+        self._apply(data, records)
+        if edited:
+            try:
+                merged = merge3(loaded, lines, self._loaded)
+            except ConflictError:
+                # Keep our edits against the old contents, so save() still merges
+                self._restore(snapshot)
+                self._version, self._log_version, self._base, self._loaded = seen
+                raise
+            if merged != self._loaded:
+                self._reload(merged)
+        self._notify_views(None, None)
+        return True
+
+    def checkpoint(self) -> bool:
+        """
+        Write the edits logged so far into the markdown file (WAL mode).
+
+        Edits keep being logged while the file is written. Returns False when
+        there was nothing to do, or a transaction is open.
+        """
+        wal = self.wal
+        if wal is None:
+            raise ValueError("checkpoint() needs an MDQL opened with wal=True")
+        with wal.checkpoint_lock:
+            with wal.lock:
+                if not wal.records or self._transaction is not None:
+                    return False
+                lines = list(self.writer.lines)
+                upto = len(wal.records)
+                changed = self._span_changes()
+                self._changed_spans = set()
+
+            holes = [i for i, line in enumerate(lines, 1) if line is None]
+            lines = [line for line in lines if line is not None]
+            try:
+                with FileLock(self.filepath):
+                    before = self._version
+                    if file_version(self.filepath) != before:
+                        self._checkpoint_merge()
+                        changed = None
+                    else:
+                        content = ''.join(lines)
+                        digest = content_digest(content)
+                        wal.mark_checkpoint(digest, upto, holes)
+                        write_atomic(self.filepath, content)
+                        wal.rebase(digest, holes, upto)
+                        self._version = file_version(self.filepath)
+                        self._base = lines
+            except BaseException:
+                # The spans taken above were not written after all
+                self._changed_spans = None
+                raise
+            if self.cache:
+                self.cache.invalidate(self.filepath)
+            self._notify_views(before, changed)
+        return True
+
+    def _checkpoint_merge(self) -> None:
+        """
+        Checkpoint onto a file another process has saved: merge every logged
+        edit into it and start the log afresh. Edits wait meanwhile, since
+        the merge renumbers lines. The caller holds the file lock.
+        """
+        wal = self.wal
+        with wal.lock:
+            lines = [line for line in self.writer.lines if line is not None]
+            merged = self._merge_concurrent(lines) or lines
+            content = ''.join(merged)
+            digest = content_digest(content)
+            wal.mark_checkpoint(digest, len(wal.records), [])
+            write_atomic(self.filepath, content)
+            wal.rebase(digest, [], len(wal.records))
+            self._version = file_version(self.filepath)
+            self._base = merged
+            self._reload(merged)
+            self._changed_spans = set()
+
+    def _checkpoint_loop(self) -> None:
+        """Background thread: checkpoint periodically, or when the log grows."""
+        wal = self.wal
+        while not wal.closed:
+            wal.wakeup.wait(CHECKPOINT_INTERVAL)
+            wal.wakeup.clear()
+            if wal.closed:
+                break
+            try:
+                self.checkpoint()
+            except Exception as e:
+                wal.error = e
+
+    def close(self) -> None:
+        """Stop the checkpoint thread and checkpoint what is left (WAL mode)."""
+        wal = self.wal
+        if wal is None or wal.closed:
+            return
+        wal.closed = True
+        wal.wakeup.set()
+        self._checkpointer.join()
+        self.checkpoint()
+        if wal.records:
+            wal.close_file()
+        else:
+            wal.remove()
+        self._owner.release()
+        self.wal = None
+
+    def __enter__(self) -> 'MDQL':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Batch edits into one atomic write.
+
+            with mdql.transaction():
+                for task in mdql.query(section="Inbox", completed=False):
+                    mdql.mark_complete(task.line_number)
+
+        Edits apply in memory as usual, so queries inside the block see them.
+        On a clean exit the file is written once (if anything changed); if
+        the block or the write raises, the file is untouched and the
+        in-memory state is rolled back to where the transaction began.
+        Nested transactions join the outermost one.
+        """
+        if self._transaction is not None:
+            yield self
+            return
+
+        snapshot = self._transaction = {'lines': list(self.writer.lines), 'edited': self._edited, 'records': []}
+        try:
+            yield self
+            self._transaction = None
+            if self.wal is not None:
+                with self.wal.lock:
+                    self.wal.append(snapshot['records'])
+                self.wal.sync()
+            elif self.writer.lines != snapshot['lines']:
+                self.save()
+        except BaseException:
+            self._restore(snapshot)
+            raise
+        finally:
+            self._transaction = None
+
+    def rollback(self) -> None:
+        """Discard the edits made so far in the current transaction."""
+        if self._transaction is None:
+            raise ValueError("No transaction in progress")
+        self._restore(self._transaction)
+
+    def _restore(self, snapshot: Dict[str, Any]) -> None:
+        """Reload from a transaction's saved lines (a full re-parse, in memory)."""
+        self.parser = MDQLParser()
+        data = self.parser.parse_lines(list(snapshot['lines']))
+        if self.wal is not None:
+            with self.wal.lock:
+                self._load(data, snapshot['edited'])
+        else:
+            self._load(data, snapshot['edited'])
+        # The restored lines may differ from the file anywhere
+        self._changed_spans = None
+        snapshot['records'] = []
 
     def get_section_summary(self) -> List[Dict[str, Any]]:
-        """Get summary statistics for each section."""
+        """Get summary statistics for each section (top-level tasks only)."""
         summary = []
 
         for section_name, metadata in self.sections.items():
-            section_tasks = [t for t in self.tasks if t.section == section_name and t.indent_level == 0]
-            total = len(section_tasks)
-            completed = sum(1 for t in section_tasks if t.completed)
+            counts = self.index.counts.get(section_name)
+            total = counts.top_level if counts else 0
+            completed = counts.top_level_completed if counts else 0
 
             if total > 0:
                 summary.append({
@@ -415,8 +1436,10 @@ class MDQL:
                 print(f"  Status: {item['status']}")
             print(f"  Tasks: {item['completed']}/{item['total_tasks']} completed ({item['completion_pct']}%)")
 
+        completed = len(self.index.by_completed[True])
+        remaining = len(self.index.by_completed[False])
         print("\n" + "=" * 80)
-        print(f"Total Tasks: {len(self.tasks)}")
-        print(f"Completed: {sum(1 for t in self.tasks if t.completed)}")
-        print(f"Remaining: {sum(1 for t in self.tasks if not t.completed)}")
+        print(f"Total Tasks: {completed + remaining}")
+        print(f"Completed: {completed}")
+        print(f"Remaining: {remaining}")
         print("=" * 80 + "\n")
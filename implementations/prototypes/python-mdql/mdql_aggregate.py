@@ -0,0 +1,330 @@
+"""
+MDQL Aggregation
+GROUP BY, HAVING and COUNT/SUM/AVG/MIN/MAX for MDQL SELECT queries.
+
+Aggregation is one hash pass over the matching tasks: each task's GROUP BY
+key selects its group's accumulator states in a dict. States are plain
+picklable values, so a folder can be aggregated file by file in worker
+processes and the partial results merged.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from mdql import SectionMetadata, TaskItem
+from mdql_catalog import PARALLEL_THRESHOLD, discover, parse_one
+from mdql_sort import top_k
+from mdql_sql import (
+    COLUMN_TYPES, Aggregate, Column, Compiler, MDQLSyntaxError, Param, SelectQuery, TaskSource,
+    bind_filters, coerce, column_getter, compile_predicate, order_key, parse_cached,
+    resolve_column, split_filters,
+)
+
+
+# Per-group accumulator states, in AggregatePlan.aggregates order
+Groups = Dict[tuple, List[Any]]
+
+
+class Accumulator:
+    """Initial state, update, merge and final value for one aggregate call."""
+
+    def __init__(self, aggregate: Aggregate):
+        self.aggregate = aggregate
+        func = aggregate.func
+        self.name = None if aggregate.column is None else resolve_column(aggregate.column)
+        kind = COLUMN_TYPES.get(self.name)
+        if func in ('SUM', 'AVG') and kind not in (int, bool):
+            raise MDQLSyntaxError(f"{aggregate} needs a numeric or boolean column")
+        if func in ('MIN', 'MAX') and kind is list:
+            raise MDQLSyntaxError(f"{aggregate} cannot compare list values")
+        # Result type, used to coerce literals compared against it in HAVING
+        self.kind = int if func == 'COUNT' else kind if func in ('MIN', 'MAX') else None
+        self.distinct = aggregate.distinct and aggregate.column is not None
+        self.func = func
+
+    def getter(self, source: TaskSource) -> Callable[[TaskItem], Any]:
+        if self.name is None:
+            return lambda t: 1
+        return column_getter(self.name, source)
+
+    def initial(self) -> Any:
+        if self.distinct:
+            return set()
+        if self.func == 'COUNT':
+            return 0
+        if self.func == 'AVG':
+            return [0, 0]
+        return None
+
+    def update(self, state: Any, value: Any) -> Any:
+        if value is None:
+            return state
+        if self.distinct:
+            state.add(tuple(value) if isinstance(value, list) else value)
+            return state
+        func = self.func
+        if func == 'COUNT':
+            return state + 1
+        if func == 'SUM':
+            # int(): booleans sum to counts, even in a one-row group
+            return int(value) if state is None else state + value
+        if func == 'AVG':
+            state[0] += value
+            state[1] += 1
+            return state
+        if state is None:
+            return value
+        if func == 'MIN':
+            return value if value < state else state
+        return value if value > state else state
+
+    def merge(self, state: Any, other: Any) -> Any:
+        if self.distinct:
+            return state | other
+        func = self.func
+        if func == 'COUNT':
+            return state + other
+        if func == 'AVG':
+            return [state[0] + other[0], state[1] + other[1]]
+        if state is None or other is None:
+            return other if state is None else state
+        if func == 'SUM':
+            return state + other
+        if func == 'MIN':
+            return min(state, other)
+        return max(state, other)
+
+    def result(self, state: Any) -> Any:
+        if self.distinct:
+            values = list(state)
+            if self.func == 'COUNT':
+                return len(values)
+            if not values:
+                return None
+            if self.func == 'SUM':
+                return sum(values)
+            if self.func == 'AVG':
+                return sum(values) / len(values)
+            return min(values) if self.func == 'MIN' else max(values)
+        if self.func == 'AVG':
+            return state[0] / state[1] if state[1] else None
+        return state
+
+
+class GroupCompiler(Compiler):
+    """Compiles HAVING and ORDER BY terms over finished group rows."""
+
+    def __init__(self, plan: 'AggregatePlan', params: Sequence[Any] = ()):
+        super().__init__(None, params)
+        self.plan = plan
+
+    def operand(self, node: Any) -> Tuple[Callable[[Dict[str, Any]], Any], Optional[type]]:
+        key, kind = self.plan.resolve(node) if isinstance(node, (Column, Aggregate)) else (None, None)
+        if key is None:
+            return super().operand(node)
+        return (lambda row: row[key]), kind
+
+
+class AggregatePlan:
+    """
+    A grouped or aggregate SELECT, validated and split into the per-row
+    work (partial) and the per-group work (merge, finish).
+    """
+
+    def __init__(self, query: SelectQuery):
+        if query.joins:
+            raise MDQLSyntaxError("GROUP BY and aggregates are not supported with JOIN")
+        if query.star:
+            raise MDQLSyntaxError("SELECT * cannot be combined with GROUP BY or aggregates")
+        self.query = query
+
+        self.group_names = []
+        for column in query.group_by:
+            name = resolve_column(column)
+            if COLUMN_TYPES[name] is list:
+                raise MDQLSyntaxError(f"Cannot GROUP BY list column '{column}'")
+            self.group_names.append(name)
+
+        # Every aggregate named in SELECT, HAVING or ORDER BY, computed once each
+        self.aggregates: List[Aggregate] = []
+        self.aliases: Dict[str, Any] = {}
+        for label, item in zip(query.columns, query.items):
+            if isinstance(item, Column):
+                name = resolve_column(item)
+                if name not in self.group_names:
+                    raise MDQLSyntaxError(f"Column '{item}' must appear in GROUP BY or inside an aggregate")
+            self._collect(item)
+            if label != str(item):
+                self.aliases[label.lower()] = item
+        self._collect(query.having)
+        for order in query.order_by:
+            self._collect(order.column)
+        self.accumulators = [Accumulator(aggregate) for aggregate in self.aggregates]
+
+    def _collect(self, node: Any) -> None:
+        """Register the aggregate calls in an AST subtree."""
+        if isinstance(node, Aggregate):
+            if str(node) not in (str(a) for a in self.aggregates):
+                self.aggregates.append(node)
+        elif isinstance(node, list):
+            for item in node:
+                self._collect(item)
+        elif hasattr(node, '__dataclass_fields__') and not isinstance(node, Column):
+            for name in node.__dataclass_fields__:
+                self._collect(getattr(node, name))
+
+    def resolve(self, node: Any) -> Tuple[str, Optional[type]]:
+        """Map a Column, alias or Aggregate to its key in a group row."""
+        if isinstance(node, Column) and node.table is None and node.name.lower() in self.aliases:
+            node = self.aliases[node.name.lower()]
+        if isinstance(node, Aggregate):
+            position = [str(a) for a in self.aggregates].index(str(node))
+            return str(node), self.accumulators[position].kind
+        name = resolve_column(node)
+        if name not in self.group_names:
+            raise MDQLSyntaxError(f"Column '{node}' must appear in GROUP BY or inside an aggregate")
+        return name, COLUMN_TYPES[name]
+
+    def partial(self, tasks: Iterable[TaskItem], source: TaskSource) -> Groups:
+        """Aggregate tasks into per-group accumulator states (one pass)."""
+        key_getters = [column_getter(name, source) for name in self.group_names]
+        if not key_getters:
+            key_of = lambda t: ()
+        elif len(key_getters) == 1:
+            get_key = key_getters[0]
+            key_of = lambda t: (get_key(t),)
+        else:
+            key_of = lambda t: tuple(get(t) for get in key_getters)
+
+        accumulators = list(enumerate(self.accumulators))
+        value_getters = [accumulator.getter(source) for accumulator in self.accumulators]
+        groups: Groups = {}
+        for task in tasks:
+            key = key_of(task)
+            states = groups.get(key)
+            if states is None:
+                states = groups[key] = [accumulator.initial() for accumulator in self.accumulators]
+            for i, accumulator in accumulators:
+                states[i] = accumulator.update(states[i], value_getters[i](task))
+        return groups
+
+    def merge(self, groups: Groups, other: Groups) -> Groups:
+        """Fold another partial result into groups (group order follows first appearance)."""
+        for key, states in other.items():
+            current = groups.get(key)
+            if current is None:
+                groups[key] = states
+            else:
+                groups[key] = [accumulator.merge(a, b)
+                               for accumulator, a, b in zip(self.accumulators, current, states)]
+        return groups
+
+    def finish(self, groups: Groups, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Compute final values, then apply HAVING, ORDER BY and LIMIT."""
+        query = self.query
+        if not groups and not self.group_names:
+            # An aggregate over no rows still yields one row (COUNT(*) = 0)
+            groups = {(): [accumulator.initial() for accumulator in self.accumulators]}
+
+        rows = []
+        for key, states in groups.items():
+            row = dict(zip(self.group_names, key))
+            for aggregate, accumulator, state in zip(self.aggregates, self.accumulators, states):
+                row[str(aggregate)] = accumulator.result(state)
+            rows.append(row)
+
+        compiler = GroupCompiler(self, params)
+        if query.having is not None:
+            having = compiler.compile(query.having)
+            rows = [row for row in rows if having(row)]
+        limit = query.limit
+        if isinstance(limit, Param):
+            limit = coerce(params[limit.index], int)
+        if query.order_by:
+            key = order_key([(compiler.operand(item.column)[0], item.descending) for item in query.order_by])
+            rows = top_k(rows, limit, key) if limit is not None else sorted(rows, key=key)
+        elif limit is not None:
+            rows = rows[:limit]
+
+        keys = [self.resolve(item)[0] for item in query.items]
+        return [{label: row[key] for label, key in zip(query.columns, keys)} for row in rows]
+
+
+def matching_tasks(query: SelectQuery, source: TaskSource, params: Sequence[Any] = ()) -> Iterable[TaskItem]:
+    """
+    Tasks that pass the WHERE clause.
+
+    Sources with a query() method (MDQL, MDQLCatalog) answer the pushed-down
+    filters from their indexes; streams are filtered as they are read.
+    """
+    residual = query.where
+    tasks: Iterable[TaskItem] = source
+    if hasattr(source, 'query'):
+        filters, residual = split_filters(query.where)
+        tasks = source.query(**bind_filters(filters, params)) if filters else source.tasks
+    if residual is None:
+        return tasks
+    predicate = compile_predicate(residual, source, params)
+    return (t for t in tasks if predicate(t))
+
+
+def aggregate_query(query: Any, source: TaskSource, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """Run a GROUP BY / aggregate SELECT over a loaded or streamed source."""
+    if isinstance(query, str):
+        query = parse_cached(query)
+    plan = AggregatePlan(query)
+    groups = plan.partial(matching_tasks(query, source, params), source)
+    return plan.finish(groups, params)
+
+
+class FileSections:
+    """One parsed file as a task source (for column getters in workers)."""
+
+    def __init__(self, tasks: List[TaskItem], sections: Dict[str, SectionMetadata]):
+        self.tasks = tasks
+        self.sections = sections
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+
+def _aggregate_chunk(args: Tuple[SelectQuery, List[str], Optional[str], Sequence[Any]]) -> Groups:
+    """Parse and partially aggregate a chunk of files (runs in a worker process)."""
+    query, paths, cache_dir, params = args
+    plan = AggregatePlan(query)
+    groups: Groups = {}
+    for path in paths:
+        _, tasks, sections = parse_one(path, cache_dir)
+        source = FileSections(tasks, sections)
+        plan.merge(groups, plan.partial(matching_tasks(query, source, params), source))
+    return groups
+
+
+def aggregate_folder(query: Any, root: str, workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                     params: Sequence[Any] = (), pattern: str = '*.md') -> List[Dict[str, Any]]:
+    """
+    Aggregate every markdown file under a directory.
+
+    Each worker parses a chunk of files and returns only its per-group
+    states, so the parent never holds the tasks themselves.
+    """
+    if isinstance(query, str):
+        query = parse_cached(query)
+    plan = AggregatePlan(query)
+    files = discover(root, pattern)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(files) < PARALLEL_THRESHOLD:
+        partials = [_aggregate_chunk((query, files, cache_dir, params))]
+    else:
+        chunk_size = max(1, min(64, len(files) // (workers * 4)))
+        chunks = [(query, files[i:i + chunk_size], cache_dir, params)
+                  for i in range(0, len(files), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(_aggregate_chunk, chunks))
+
+    groups: Groups = {}
+    for partial in partials:
+        plan.merge(groups, partial)
+    return plan.finish(groups, params)
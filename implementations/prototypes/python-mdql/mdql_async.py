@@ -0,0 +1,231 @@
+"""
+MDQL Async
+asyncio facade over MDQL and MDQLCatalog for use inside an event loop (an
+aiohttp or FastAPI service). Parsing, queries, edits and file I/O run on a
+bounded thread pool, so the loop only awaits them:
+
+    mdql = await AsyncMDQL.load("todo.md")
+    tasks = await mdql.query(completed=False, priority="High")
+    rows = await mdql.execute("SELECT * FROM todo.md WHERE section = ?", "Inbox")
+    await mdql.mark_complete(tasks[0].line_number)
+    await mdql.save()
+
+    catalog = await AsyncCatalog.load("notes/")
+    tasks = await catalog.query(completed=False)
+
+Every instance shares one BoundedExecutor unless given its own. Calls on
+the same instance run one at a time and wait on the loop, not in the pool,
+so a busy vault holds at most one worker and cannot starve the others.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from mdql import MDQL, TaskItem
+from mdql_aggregate import aggregate_query
+from mdql_catalog import MDQLCatalog
+from mdql_sql import parse_cached, stream_query
+
+
+# Threads in the shared pool (ThreadPoolExecutor's own default)
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class BoundedExecutor:
+    """
+    A thread pool for blocking MDQL calls, with a cap on calls in flight.
+
+    Calls beyond `limit` (default: one per worker) wait on the event loop,
+    where they can still be cancelled, instead of piling up in the pool's
+    queue. A slot is only freed when its call has actually finished, even if
+    the caller was cancelled meanwhile.
+    """
+
+    def __init__(self, workers: Optional[int] = None, limit: Optional[int] = None):
+        self.workers = workers or DEFAULT_WORKERS
+        self.limit = limit or self.workers
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='mdql-async')
+        self.running = 0
+        self.waiting = 0
+        # One semaphore per event loop, which asyncio objects are bound to
+        self._slots: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the pool and return its result."""
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            future = self.pool.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            slots.release()
+            raise
+        self.running += 1
+        future.add_done_callback(lambda _: self._finished(loop, slots))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore) -> None:
+        """Free a slot (from the pool thread, so by way of the loop)."""
+        def release() -> None:
+            self.running -= 1
+            slots.release()
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass  # the loop has closed, and its semaphore with it
+
+    def stats(self) -> Dict[str, int]:
+        return {'workers': self.workers, 'limit': self.limit, 'running': self.running, 'waiting': self.waiting}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.pool.shutdown(wait)
+
+
+_shared: Optional[BoundedExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def shared_executor() -> BoundedExecutor:
+    """The executor used by instances that are not given one."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BoundedExecutor()
+        return _shared
+
+
+class _AsyncSource:
+    """Runs calls on a wrapped source one at a time, on an executor."""
+
+    def __init__(self, source: Any, executor: Optional[BoundedExecutor] = None):
+        self.source = source
+        self.executor = executor or shared_executor()
+        # Queues callers on the loop; `lock` guards the source itself, also
+        # against a call that outlives its cancelled caller. Pass it to
+        # mdql_watch.watch() to refresh the source safely in the background.
+        self._queue = asyncio.Lock()
+        self.lock = threading.Lock()
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(source, *args, **kwargs) on the executor."""
+        async with self._queue:
+            return await self.executor.run(self._locked, func, *args, **kwargs)
+
+    def _locked(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.lock:
+            return func(self.source, *args, **kwargs)
+
+    async def query(self, **filters) -> List[TaskItem]:
+        """Filter tasks (see MDQL.query / MDQLCatalog.query)."""
+        return await self.run(lambda source: source.query(**filters))
+
+    async def tasks(self) -> List[TaskItem]:
+        return await self.run(lambda source: list(source.tasks))
+
+    async def refresh(self, *args) -> Any:
+        """Pick up changes made on disk (see MDQL.refresh / MDQLCatalog.refresh)."""
+        return await self.run(lambda source: source.refresh(*args))
+
+
+class AsyncMDQL(_AsyncSource):
+    """
+    An MDQL whose blocking calls are awaitable. Create it with load(); the
+    wrapped instance is `mdql`, for reads that need no I/O.
+    """
+
+    def __init__(self, mdql: MDQL, executor: Optional[BoundedExecutor] = None):
+        super().__init__(mdql, executor)
+        self.mdql = mdql
+
+    @classmethod
+    async def load(cls, filepath: str, executor: Optional[BoundedExecutor] = None, **options) -> 'AsyncMDQL':
+        """Load a file (options as for MDQL: cache, text_index, wal)."""
+        executor = executor or shared_executor()
+        return cls(await executor.run(MDQL, filepath, **options), executor)
+
+    async def execute(self, query: str, *params) -> Any:
+        """
+        Run an MDQL SELECT with '?' placeholders: a list of tasks, or of
+        result rows for GROUP BY / aggregate queries.
+        """
+        parsed = parse_cached(query)
+        if parsed.is_aggregate:
+            return await self.run(lambda source: aggregate_query(parsed, source, params))
+        return await self.run(lambda mdql: mdql.prepare(query).execute(*params))
+
+    async def mark_complete(self, line_number: int) -> None:
+        await self.run(MDQL.mark_complete, line_number)
+
+    async def mark_incomplete(self, line_number: int) -> None:
+        await self.run(MDQL.mark_incomplete, line_number)
+
+    async def update_text(self, line_number: int, new_text: str) -> None:
+        await self.run(MDQL.update_text, line_number, new_text)
+
+    async def delete(self, line_number: int) -> None:
+        await self.run(MDQL.delete, line_number)
+
+    async def add_task(self, section: str, text: str, indent_level: int = 0, completed: bool = False) -> None:
+        await self.run(MDQL.add_task, section, text, indent_level, completed)
+
+    async def save(self, filepath: Optional[str] = None) -> None:
+        await self.run(MDQL.save, filepath)
+
+    async def transaction(self, func: Callable[[MDQL], Any]) -> Any:
+        """
+        Run func(mdql) inside mdql.transaction() on the executor, and return
+        its result. The edits it makes are written once, or not at all if
+        it raises.
+
+            await mdql.transaction(lambda m: [m.mark_complete(t.line_number)
+                                              for t in m.query(section="Inbox")])
+        """
+        def run(mdql: MDQL) -> Any:
+            with mdql.transaction():
+                return func(mdql)
+        return await self.run(run)
+
+    async def close(self) -> None:
+        """Checkpoint and release the log (WAL mode); see MDQL.close."""
+        await self.run(MDQL.close)
+
+    async def __aenter__(self) -> 'AsyncMDQL':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+class AsyncCatalog(_AsyncSource):
+    """An MDQLCatalog whose folder scans and queries are awaitable."""
+
+    def __init__(self, catalog: MDQLCatalog, executor: Optional[BoundedExecutor] = None):
+        super().__init__(catalog, executor)
+        self.catalog = catalog
+
+    @classmethod
+    async def load(cls, root: str, executor: Optional[BoundedExecutor] = None, **options) -> 'AsyncCatalog':
+        """
+        Discover and parse a folder (options as for MDQLCatalog). The parse
+        still fans out to worker processes; only the wait is on a thread.
+        """
+        executor = executor or shared_executor()
+        return cls(await executor.run(MDQLCatalog, root, **options), executor)
+
+    async def execute(self, query: str, *params) -> Any:
+        """Run an MDQL SELECT over every file, as AsyncMDQL.execute."""
+        parsed = parse_cached(query)
+        if parsed.is_aggregate:
+            return await self.run(lambda source: aggregate_query(parsed, source, params))
+        return await self.run(lambda catalog: list(stream_query(parsed, catalog, params)))
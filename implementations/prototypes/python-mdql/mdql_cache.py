@@ -0,0 +1,221 @@
+"""
+MDQL Parse Cache
+Persistent on-disk cache of parsed markdown files, so repeated loads of an
+unchanged file skip the line-by-line parse.
+
+A parse is stored as plain columns (task texts, flags, indents, line and
+parent numbers, section metadata as tuples) written with marshal, not as
+pickled objects: it is a fraction of the size, loads much faster, and the
+file's lines are read from the file itself rather than stored again.
+"""
+
+import gc
+import hashlib
+import marshal
+import os
+import pickle
+from dataclasses import fields
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Bump whenever the packed layout of a parse (see pack_parse) changes.
+CACHE_VERSION = 5
+
+
+def default_cache_dir() -> str:
+    """Return the default cache directory (honours XDG_CACHE_HOME)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'mdql')
+
+
+def file_digest(filepath: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pack_parse(data: Dict[str, Any]) -> Tuple:
+    """
+    Flatten MDQLParser output into marshal-able columns. The lines are left
+    out; unpack_parse takes them from the file.
+    """
+    meta_fields = _meta_fields()
+    spans = []
+    texts: List[str] = []
+    completed: List[bool] = []
+    indents: List[int] = []
+    line_numbers: List[int] = []
+    parents: List[int] = []
+    notes: List[Tuple[str, ...]] = []
+    for span in data['spans']:
+        meta = span.metadata
+        first = span.tasks[0] if span.tasks else None
+        spans.append((
+            span.start_line,
+            tuple(getattr(meta, name) for name in meta_fields) if meta else None,
+            len(span.tasks),
+            first.section if first else None,
+            first.section_level if first else 0,
+        ))
+        # Parents never cross a heading, so look them up within the span
+        position = {}
+        for task in span.tasks:
+            position[task.line_number] = len(texts)
+            texts.append(task.text)
+            completed.append(task.completed)
+            indents.append(task.indent_level)
+            line_numbers.append(task.line_number)
+            parents.append(position[task.parent_line] if task.parent_line is not None else -1)
+            notes.append(tuple(task.notes))
+    return spans, texts, completed, indents, line_numbers, parents, notes
+
+
+def unpack_parse(packed: Tuple, lines: List[str]) -> Dict[str, Any]:
+    """Rebuild the MDQLParser output pack_parse flattened, around the file's lines."""
+    from mdql import SectionMetadata, SectionSpan, TaskItem  # mdql imports this module
+
+    spans_packed, texts, completed, indents, line_numbers, parents, notes = packed
+    meta_fields = _meta_fields()
+    new_task = TaskItem.__new__
+    tasks: List[TaskItem] = []
+    append = tasks.append
+    sections: Dict[str, SectionMetadata] = {}
+    spans: List[SectionSpan] = []
+    rows = zip(texts, completed, indents, line_numbers, parents, notes)
+    # Hundreds of thousands of new lists would set off the cycle collector
+    # over and over; tasks only refer to their children, so there are no
+    # cycles to find
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for start_line, meta_values, count, section, section_level in spans_packed:
+            meta = None
+            if meta_values is not None:
+                meta = SectionMetadata(**dict(zip(meta_fields, meta_values)))
+                sections[meta.section_name] = meta
+            first = len(tasks)
+            for text, done, indent, line_number, parent, task_notes in islice(rows, count):
+                task = new_task(TaskItem)
+                task.__dict__ = {
+                    'text': text, 'completed': done, 'section': section,
+                    'section_level': section_level, 'indent_level': indent,
+                    'line_number': line_number, 'parent_line': None, 'has_children': False,
+                    'children': [], 'notes': list(task_notes), 'source_file': None,
+                }
+                if parent >= 0:
+                    parent_task = tasks[parent]
+                    task.parent_line = parent_task.line_number
+                    parent_task.has_children = True
+                    parent_task.children.append(task)
+                append(task)
+            spans.append(SectionSpan(start_line, meta, tasks[first:]))
+    finally:
+        if collecting:
+            gc.enable()
+    return {'tasks': tasks, 'sections': sections, 'lines': lines, 'spans': spans}
+
+
+def _meta_fields() -> List[str]:
+    """SectionMetadata fields a parse fills in (not the catalog's `file`)."""
+    from mdql import SectionMetadata
+    return [f.name for f in fields(SectionMetadata) if f.name != 'file']
+
+
+class ParseCache:
+    """
+    Sidecar cache for parsed MDQL data.
+
+    Entries are keyed by absolute path and validated against the file's
+    mtime and size (and optionally a content hash) before being reused.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, verify_hash: bool = False):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.verify_hash = verify_hash
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, filepath: str, kind: str = '') -> str:
+        """Get the cache file path for a source file (or one of its derived indexes)."""
+        key = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+        # Parses are packed with marshal; derived indexes are pickled as given
+        suffix = f".{kind}.pickle" if kind else '.marshal'
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def _fingerprint(self, filepath: str) -> Dict[str, Any]:
+        """Build the validation key for the current state of a file."""
+        st = os.stat(filepath)
+        fingerprint = {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(filepath),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+        }
+        if self.verify_hash:
+            fingerprint['sha256'] = file_digest(filepath)
+        return fingerprint
+
+    def load(self, filepath: str, kind: str = '') -> Optional[Any]:
+        """
+        Return cached parse data for a file, or None if missing or stale.
+
+        kind names a derived entry (such as 'text' for the full-text index)
+        stored with store(..., kind=); it is validated the same way.
+        """
+        entry_path = self._entry_path(filepath, kind)
+        try:
+            with open(entry_path, 'rb') as f:
+                raw = f.read()
+            entry = pickle.loads(raw) if kind else marshal.loads(raw)
+        except (OSError, ValueError, TypeError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+
+        fingerprint = self._fingerprint(filepath)
+        if not isinstance(entry, dict) or entry.get('fingerprint') != fingerprint:
+            self.misses += 1
+            return None
+        if kind:
+            self.hits += 1
+            return entry['data']
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        st = os.stat(filepath)
+        if (st.st_mtime_ns, st.st_size) != (fingerprint['mtime_ns'], fingerprint['size']):
+            self.misses += 1    # replaced while it was read
+            return None
+        self.hits += 1
+        return unpack_parse(entry['data'], lines)
+
+    def store(self, filepath: str, data: Any, kind: str = '') -> None:
+        """Write parse data (or a derived entry) for a file to the cache."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {
+            'fingerprint': self._fingerprint(filepath),
+            'data': data if kind else pack_parse(data),
+        }
+        entry_path = self._entry_path(filepath, kind)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            if kind:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                marshal.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+
+    def invalidate(self, filepath: str) -> None:
+        """Drop the cache entries for a file, if any."""
+        for kind in ('', 'text', 'trigram'):
+            try:
+                os.remove(self._entry_path(filepath, kind))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters."""
+        return {'hits': self.hits, 'misses': self.misses}
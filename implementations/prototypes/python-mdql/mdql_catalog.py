@@ -0,0 +1,233 @@
+"""
+MDQL Catalog
+Treats a folder of markdown files as one table: discovers the files, parses
+them in parallel worker processes and merges their tasks, tagging each task
+with its source_file.
+"""
+
+import bisect
+import fnmatch
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mdql import MDQLParser, SectionMetadata, TaskItem
+from mdql_cache import ParseCache
+from mdql_concurrency import file_version
+from mdql_text import SEARCH_FIELDS, SEARCH_KINDS, value_matcher
+
+
+# Below this many files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 8
+
+
+def discover(root: str, pattern: str = '*.md', recursive: bool = True) -> List[str]:
+    """List markdown files under a directory, sorted for stable output."""
+    if not recursive:
+        return sorted(
+            os.path.join(root, name) for name in os.listdir(root)
+            if fnmatch.fnmatch(name, pattern) and os.path.isfile(os.path.join(root, name))
+        )
+
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Skip hidden directories such as .git and parse-cache folders
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        found.extend(os.path.join(dirpath, name) for name in filenames if fnmatch.fnmatch(name, pattern))
+    return sorted(found)
+
+
+def parse_one(path: str, cache_dir: Optional[str] = None) -> Tuple[str, List[TaskItem], Dict[str, SectionMetadata]]:
+    """Parse a single file (runs inside a worker process)."""
+    cache = ParseCache(cache_dir) if cache_dir else None
+    data = cache.load(path) if cache else None
+    if data is None:
+        data = MDQLParser().parse_file(path)
+        if cache:
+            cache.store(path, data)
+
+    for task in data['tasks']:
+        task.source_file = path
+    for meta in data['sections'].values():
+        meta.file = path
+    return path, data['tasks'], data['sections']
+
+
+def _parse_chunk(args: Tuple[List[str], Optional[str]]) -> List[Tuple[str, List[TaskItem], Dict[str, SectionMetadata]]]:
+    paths, cache_dir = args
+    return [parse_one(path, cache_dir) for path in paths]
+
+
+class MDQLCatalog:
+    """
+    All task lists under a directory, queried as one table.
+
+        catalog = MDQLCatalog("notes/", workers=8)
+        open_tasks = catalog.query(completed=False, priority="High")
+        for task in open_tasks:
+            print(task.source_file, task.text)
+    """
+
+    def __init__(self, root: str, pattern: str = '*.md', recursive: bool = True,
+                 workers: Optional[int] = None, cache_dir: Optional[str] = None):
+        self.root = root
+        self.pattern = pattern
+        self.recursive = recursive
+        self.files = discover(root, pattern, recursive)
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.file_tasks: Dict[str, List[TaskItem]] = {}
+        self.file_sections: Dict[str, Dict[str, SectionMetadata]] = {}
+        self.file_versions: Dict[str, Any] = {}
+        self._load()
+
+    def _load(self) -> None:
+        # Versions are taken before parsing, so a change made meanwhile is
+        # still picked up by the next refresh()
+        self.file_versions = {path: file_version(path) for path in self.files}
+        for path, tasks, sections in self._parse_all():
+            self.file_tasks[path] = tasks
+            self.file_sections[path] = sections
+
+    def refresh(self, paths: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Re-parse the files that changed on disk, add new ones and drop
+        deleted ones; the rest are left as they are.
+
+        With paths (such as a FileWatcher reports, see mdql_watch) only those
+        files are checked, and a folder stands for every file under it.
+        Without, the whole folder is rediscovered. Returns the paths that
+        were re-parsed, added or dropped.
+        """
+        known = {os.path.abspath(path): path for path in self.files}
+        if paths is None:
+            candidates = set(self.files) | set(discover(self.root, self.pattern, self.recursive))
+        else:
+            candidates = set()
+            for path in paths:
+                full = os.path.abspath(path)
+                found = discover(full, self.pattern, self.recursive) if os.path.isdir(full) else [full]
+                candidates.update(self._name(path) for path in found if self._covers(path))
+                candidates.update(name for absolute, name in known.items()
+                                  if absolute == full or absolute.startswith(full + os.sep))
+
+        changed = []
+        for path in sorted(candidates):
+            version = file_version(path)
+            if version == self.file_versions.get(path):
+                continue
+            changed.append(path)
+            if version is None:
+                self.files.remove(path)
+                for table in (self.file_tasks, self.file_sections, self.file_versions):
+                    table.pop(path, None)
+                continue
+            if path not in self.file_versions:
+                bisect.insort(self.files, path)
+            self.file_versions[path] = version
+            _, self.file_tasks[path], self.file_sections[path] = parse_one(path, self.cache_dir)
+        return changed
+
+    def _name(self, path: str) -> str:
+        """A file's path as discover() spells it."""
+        return os.path.join(self.root, os.path.relpath(path, os.path.abspath(self.root)))
+
+    def _covers(self, path: str) -> bool:
+        """Whether discover() would list a file (given as an absolute path)."""
+        parts = os.path.relpath(path, os.path.abspath(self.root)).split(os.sep)
+        if parts[0] == os.pardir or not fnmatch.fnmatch(parts[-1], self.pattern):
+            return False
+        if not self.recursive:
+            return len(parts) == 1
+        return not any(part.startswith('.') for part in parts[:-1])
+
+    def _parse_all(self) -> Iterator[Tuple[str, List[TaskItem], Dict[str, SectionMetadata]]]:
+        """Parse every file, in parallel when there are enough of them."""
+        if self.workers <= 1 or len(self.files) < PARALLEL_THRESHOLD:
+            for path in self.files:
+                yield parse_one(path, self.cache_dir)
+            return
+
+        # Send files in chunks so per-task IPC overhead stays small for many tiny files
+        chunk_size = max(1, min(64, len(self.files) // (self.workers * 4)))
+        chunks = [(self.files[i:i + chunk_size], self.cache_dir)
+                  for i in range(0, len(self.files), chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for results in pool.map(_parse_chunk, chunks):
+                yield from results
+
+    @property
+    def tasks(self) -> List[TaskItem]:
+        """All tasks, grouped by file in path order."""
+        return [task for path in self.files for task in self.file_tasks.get(path, [])]
+
+    def __iter__(self) -> Iterator[TaskItem]:
+        for path in self.files:
+            yield from self.file_tasks.get(path, [])
+
+    @property
+    def sections(self) -> Dict[str, SectionMetadata]:
+        """Section metadata by name across all files (later files win on clashes)."""
+        merged: Dict[str, SectionMetadata] = {}
+        for path in self.files:
+            merged.update(self.file_sections.get(path, {}))
+        return merged
+
+    def section_for(self, task: TaskItem) -> Optional[SectionMetadata]:
+        """Get the metadata of a task's section within its own file."""
+        return self.file_sections.get(task.source_file, {}).get(task.section)
+
+    def query(self, **filters) -> List[TaskItem]:
+        """
+        Query tasks across all files.
+
+        Accepts the MDQL.query() filters plus:
+        - source_file: str - Only tasks from this file
+        """
+        if 'source_file' in filters:
+            paths = [filters['source_file']]
+        else:
+            paths = self.files
+
+        predicates = []
+        if 'completed' in filters:
+            completed = filters['completed']
+            predicates.append(lambda t: t.completed == completed)
+        if 'section' in filters:
+            section = filters['section']
+            predicates.append(lambda t: t.section == section)
+        if 'indent_level' in filters:
+            indent_level = filters['indent_level']
+            predicates.append(lambda t: t.indent_level == indent_level)
+        if 'has_notes' in filters:
+            has_notes = bool(filters['has_notes'])
+            predicates.append(lambda t: bool(t.notes) == has_notes)
+        for name in SEARCH_FIELDS:
+            for kind in SEARCH_KINDS:
+                if f"{name}_{kind}" in filters:
+                    matcher = value_matcher(kind, filters[f"{name}_{kind}"])
+                    predicates.append(lambda t, name=name, matcher=matcher: matcher(getattr(t, name)))
+
+        results = []
+        for path in paths:
+            sections = self.file_sections.get(path, {})
+            file_predicates = list(predicates)
+            for attr in ('priority', 'status'):
+                if attr in filters:
+                    names = frozenset(name for name, meta in sections.items()
+                                      if getattr(meta, attr) == filters[attr])
+                    file_predicates.append(lambda t, names=names: t.section in names)
+            results.extend(
+                t for t in self.file_tasks.get(path, [])
+                if all(predicate(t) for predicate in file_predicates)
+            )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Get file, task and section counts."""
+        return {
+            'files': len(self.files),
+            'tasks': sum(len(tasks) for tasks in self.file_tasks.values()),
+            'sections': sum(len(sections) for sections in self.file_sections.values()),
+            'workers': self.workers,
+        }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+MDQL Query Client
+Thin client for a running query server (see mdql_server). It only imports
+the standard library, so a query costs interpreter startup and one round
+trip instead of a parse.
+
+    client = MDQLClient()
+    result = client.query("todo.md", "SELECT text FROM todo.md WHERE completed = ?", [False])
+    for row in result['rows']:
+        print(row['text'])
+
+From a shell:
+    mdql_client.py todo.md "SELECT text FROM todo.md WHERE completed = false"
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, Optional, Sequence
+
+
+def default_socket_path() -> str:
+    """The server's default socket (matches mdql_server.default_socket_path)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'mdql', 'mdql.sock')
+
+
+class MDQLClient:
+    """A connection to a query server; requests reuse the same socket."""
+
+    def __init__(self, socket_path: Optional[str] = None, port: Optional[int] = None,
+                 host: str = '127.0.0.1', timeout: Optional[float] = 30.0):
+        if port is not None:
+            self.sock = socket.create_connection((host, port), timeout=timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(socket_path or default_socket_path())
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, **fields: Any) -> Dict[str, Any]:
+        """Send one request; raises ValueError with the server's message on failure."""
+        self.sock.sendall(json.dumps(fields).encode('utf-8') + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise ValueError(response.get('error', 'Unknown server error'))
+        return response
+
+    def query(self, file: str, query: str, params: Sequence[Any] = (), limit: Optional[int] = None) -> Dict[str, Any]:
+        """Run a query; returns {'columns': [...], 'rows': [{...}], 'count': n}."""
+        return self.request(file=os.path.abspath(file), query=query, params=list(params),
+                            limit=limit, cwd=os.getcwd())
+
+    def explain(self, file: str, query: str) -> str:
+        return self.request(op='explain', file=os.path.abspath(file), query=query, cwd=os.getcwd())['plan']
+
+    def stats(self) -> Dict[str, Any]:
+        return self.request(op='stats')
+
+    def close(self) -> None:
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self) -> 'MDQLClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Send an MDQL query to a running query server')
+    parser.add_argument('file', help='Markdown file or folder to query')
+    parser.add_argument('query', help='MDQL query string')
+    parser.add_argument('params', nargs='*', help="Values for '?' placeholders (JSON, or plain strings)")
+    parser.add_argument('--socket', help='Server socket (default: ~/.cache/mdql/mdql.sock)')
+    parser.add_argument('--port', type=int, help='Connect to localhost TCP instead of a socket')
+    parser.add_argument('--limit', type=int, help='Limit number of results')
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON response')
+    parser.add_argument('--explain', action='store_true', help='Show the query plan')
+    args = parser.parse_args()
+
+    params = []
+    for value in args.params:
+        try:
+            params.append(json.loads(value))
+        except ValueError:
+            params.append(value)
+
+    try:
+        with MDQLClient(args.socket, args.port) as client:
+            if args.explain:
+                print(client.explain(args.file, args.query))
+                return 0
+            result = client.query(args.file, args.query, params, args.limit)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(result))
+        return 0
+    for row in result['rows']:
+        print(' | '.join('' if value is None else str(value) for value in row.values()))
+    print(f"\n{result['count']} result(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+MDQL Concurrency
+File locks, version checks and a three-way line merge, so several processes
+can load, edit and save one markdown file without losing each other's edits.
+
+Saving is optimistic: MDQL remembers the version (mtime, size, inode) and
+lines of the file it loaded. If the file has changed by the time it saves,
+its own edits and the other writer's are merged line by line against that
+common base. Edits that touch different lines merge cleanly; edits to the
+same lines raise ConflictError and leave the file alone.
+
+Locks are advisory fcntl locks on a small file in a shared lock directory
+(`$MDQL_LOCK_DIR`, or `mdql-locks` under the system temp directory), named
+after the markdown file's real path: the file itself is replaced on every
+save, so it cannot carry the lock, and its own directory may be read-only.
+Where fcntl is not available, or the lock directory cannot be written, they
+do nothing, and only the version check protects a save.
+"""
+
+import bisect
+import difflib
+import errno
+import hashlib
+import os
+import tempfile
+import time
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+# Errors opening a lock file that mean it cannot be had at all, rather
+# than that something is wrong
+UNLOCKABLE = (errno.EACCES, errno.EPERM, errno.EROFS)
+
+# Gaps without unique lines are matched with difflib up to this size
+# (len(a) * len(b)); larger ones are treated as replaced outright
+DIFFLIB_LIMIT = 1_000_000
+
+# (base start, base end, other start, other end): base[a1:a2] became other[b1:b2]
+Hunk = Tuple[int, int, int, int]
+
+FileVersion = Tuple[int, int, int]
+
+
+class ConflictError(ValueError):
+    """Raised when concurrent edits change the same lines of a file."""
+
+
+def file_version(filepath: str) -> Optional[FileVersion]:
+    """A cheap version stamp for a file (None if it does not exist)."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def default_lock_dir() -> str:
+    """Return the directory lock files are kept in (honours MDQL_LOCK_DIR)."""
+    return os.environ.get('MDQL_LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'mdql-locks')
+
+
+def lock_path(filepath: str, name: str = 'lock') -> str:
+    """Path of the lock file for a markdown file (which need not exist)."""
+    key = hashlib.sha1(os.path.realpath(filepath).encode('utf-8')).hexdigest()
+    return os.path.join(default_lock_dir(), f"{key}-{name}")
+
+
+def _open_lock(path: str) -> int:
+    """Open (creating if needed) a lock file and its directory."""
+    try:
+        return os.open(path, os.O_RDONLY | os.O_CREAT, 0o666)
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+        if 'MDQL_LOCK_DIR' not in os.environ:
+            os.chmod(directory, 0o1777)  # shared by every user, like /tmp
+    except FileExistsError:
+        pass
+    return os.open(path, os.O_RDONLY | os.O_CREAT, 0o666)
+
+
+class FileLock:
+    """
+    Advisory lock on a markdown file: shared for readers, exclusive for writers.
+
+        with FileLock("todo.md"):                 # exclusive
+            ...
+        with FileLock("todo.md", shared=True):    # many readers at once
+            ...
+
+    timeout=None waits forever; otherwise TimeoutError is raised after that
+    many seconds (0 tries once). `name` selects a separate lock for the same
+    file. If the lock file cannot be created (a read-only or foreign lock
+    directory), acquiring does nothing and `held` stays False.
+    """
+
+    def __init__(self, filepath: str, shared: bool = False, timeout: Optional[float] = None,
+                 name: str = 'lock'):
+        self.path = lock_path(filepath, name)
+        self.shared = shared
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> None:
+        if fcntl is None:
+            return
+        try:
+            fd = _open_lock(self.path)
+        except OSError as e:
+            if e.errno in UNLOCKABLE:
+                return
+            raise
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        try:
+            if self.timeout is None:
+                fcntl.flock(fd, mode)
+            else:
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    try:
+                        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                        time.sleep(0.01)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def diff_lines(a: Sequence[str], b: Sequence[str]) -> List[Hunk]:
+    """
+    The changed regions between two line lists, in order.
+
+    Both lists are first walked in step, skipping equal runs a slice at a
+    time and stepping over single replaced, inserted or deleted lines, which
+    covers the edits MDQL makes. The first larger difference hands the rest
+    to a patience diff: lines that occur exactly once on both sides anchor
+    the alignment, and the gaps between anchors are diffed the same way.
+    """
+    hunks = []
+    i = j = 0
+    for mi, mj, size in _matches(a, b) + [(len(a), len(b), 0)]:
+        if mi > i or mj > j:
+            hunks.append((i, mi, j, mj))
+        i, j = mi + size, mj + size
+    return hunks
+
+
+def merge3(base: Sequence[str], ours: Sequence[str], theirs: Sequence[str]) -> List[str]:
+    """
+    Merge two edited versions of base line by line.
+
+    Changes to separate lines are both applied. Identical changes are taken
+    once, and two insertions at the same place are both kept (theirs first).
+    Any other overlap raises ConflictError.
+    """
+    ours_hunks = _line_hunks(base, ours)
+    theirs_hunks = _line_hunks(base, theirs)
+
+    merged: List[str] = []
+    position = 0
+    i = j = 0
+    while i < len(ours_hunks) or j < len(theirs_hunks):
+        mine = ours_hunks[i] if i < len(ours_hunks) else None
+        other = theirs_hunks[j] if j < len(theirs_hunks) else None
+        if mine and other and _overlaps(mine, other):
+            if mine == other:
+                hunk = mine
+            elif mine[0] == mine[1] == other[0] == other[1]:
+                hunk = (mine[0], mine[1], other[2] + mine[2])
+            else:
+                raise ConflictError(f"Conflicting edits at line {min(mine[0], other[0]) + 1}")
+            i += 1
+            j += 1
+        elif other is None or (mine and mine[:2] <= other[:2]):
+            hunk = mine
+            i += 1
+        else:
+            hunk = other
+            j += 1
+
+        start, end, lines = hunk
+        merged.extend(base[position:start])
+        merged.extend(lines)
+        position = end
+    merged.extend(base[position:])
+    return merged
+
+
+def _line_hunks(base: Sequence[str], other: Sequence[str]) -> List[Tuple[int, int, Sequence[str]]]:
+    """Diff hunks with their new lines; same-length replacements are split per line."""
+    hunks = []
+    for a1, a2, b1, b2 in diff_lines(base, other):
+        if a2 - a1 == b2 - b1:
+            # e.g. two adjacent toggles: another writer may insert between them
+            hunks.extend((a1 + k, a1 + k + 1, other[b1 + k:b1 + k + 1]) for k in range(a2 - a1))
+        else:
+            hunks.append((a1, a2, other[b1:b2]))
+    return hunks
+
+
+def _overlaps(x: Tuple[int, int, Sequence[str]], y: Tuple[int, int, Sequence[str]]) -> bool:
+    (x1, x2, _), (y1, y2, _) = x, y
+    if x1 == x2 and y1 == y2:
+        return x1 == y1
+    if x1 == x2:
+        return y1 < x1 < y2
+    if y1 == y2:
+        return x1 < y1 < x2
+    return x1 < y2 and y1 < x2
+
+
+def _matches(a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int, int]]:
+    """Matching blocks (i, j, size) of a and b, increasing in both."""
+    blocks = []
+    i, j = _scan(a, b, blocks)
+    stack = [(i, len(a), j, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        run = _common_run(a, alo, ahi, b, blo, bhi)
+        if run:
+            blocks.append((alo, blo, run))
+            alo += run
+            blo += run
+        run = 0
+        while alo < ahi - run and blo < bhi - run and a[ahi - run - 1] == b[bhi - run - 1]:
+            run += 1
+        if run:
+            ahi -= run
+            bhi -= run
+            blocks.append((ahi, bhi, run))
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            prev_a, prev_b = alo, blo
+            for i, j in anchors:
+                stack.append((prev_a, i, prev_b, j))
+                blocks.append((i, j, 1))
+                prev_a, prev_b = i + 1, j + 1
+            stack.append((prev_a, ahi, prev_b, bhi))
+        elif (ahi - alo) * (bhi - blo) <= DIFFLIB_LIMIT:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            blocks.extend((alo + i, blo + j, size) for i, j, size in matcher.get_matching_blocks() if size)
+
+    # The regions are disjoint and ordered, so sorting by i orders j too
+    blocks.sort()
+    return blocks
+
+
+# Lines that must match after a skipped line before the scan trusts it
+RESYNC_LINES = 4
+
+
+def _scan(a: Sequence[str], b: Sequence[str], blocks: List[Tuple[int, int, int]]) -> Tuple[int, int]:
+    """Match a and b in step while they differ by single lines; returns where it stopped."""
+    i = j = 0
+    n, m = len(a), len(b)
+    k = RESYNC_LINES
+    while i < n and j < m:
+        run = _common_run(a, i, n, b, j, m)
+        if run:
+            blocks.append((i, j, run))
+            i += run
+            j += run
+            continue
+        if a[i + 1:i + 1 + k] == b[j + 1:j + 1 + k]:
+            i, j = i + 1, j + 1         # one line replaced
+        elif a[i:i + k] == b[j + 1:j + 1 + k]:
+            j += 1                      # one line inserted
+        elif a[i + 1:i + 1 + k] == b[j:j + k]:
+            i += 1                      # one line deleted
+        else:
+            # Up to k neighbouring lines replaced (such as a task and its subtask)
+            replaced = next((r for r in range(1, k + 1) if i + r < n and j + r < m
+                             and a[i + r] == b[j + r]), None)
+            if replaced is None:
+                break
+            i, j = i + replaced, j + replaced
+    return i, j
+
+
+def _common_run(a: Sequence[str], i: int, n: int, b: Sequence[str], j: int, m: int, chunk: int = 256) -> int:
+    """Length of the equal run starting at a[i] and b[j] (within a[:n], b[:m])."""
+    start = i
+    limit = min(n - i, m - j)
+    while chunk <= limit - (i - start) and a[i:i + chunk] == b[j:j + chunk]:
+        i += chunk
+        j += chunk
+    while i < n and j < m and a[i] == b[j]:
+        i += 1
+        j += 1
+    return i - start
+
+
+def _unique_anchors(a: Sequence[str], alo: int, ahi: int,
+                    b: Sequence[str], blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """Lines unique in both ranges, reduced to the longest in-order chain."""
+    a_positions = _unique_positions(a, alo, ahi)
+    b_positions = _unique_positions(b, blo, bhi)
+    pairs = sorted((i, b_positions[line]) for line, i in a_positions.items() if line in b_positions)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of the b positions (patience sorting)
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        slot = bisect.bisect_left(tails, j)
+        if slot == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[slot] = j
+            tail_index[slot] = k
+        previous[k] = tail_index[slot - 1] if slot else -1
+
+    chain = []
+    k = tail_index[-1]
+    while k >= 0:
+        chain.append(pairs[k])
+        k = previous[k]
+    chain.reverse()
+    return chain
+
+
+def _unique_positions(lines: Sequence[str], lo: int, hi: int) -> dict:
+    positions = {}
+    repeated = set()
+    for i in range(lo, hi):
+        line = lines[i]
+        if line in positions:
+            repeated.add(line)
+        else:
+            positions[line] = i
+    for line in repeated:
+        del positions[line]
+    return positions
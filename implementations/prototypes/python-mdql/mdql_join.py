@@ -0,0 +1,556 @@
+"""
+MDQL Joins
+Executes SELECT queries that join task lists, section metadata and folders.
+
+Joins run left to right. Equality conditions use a hash join that builds on
+the smaller input, range conditions (<, <=, >, >=) use a sort-merge join, and
+anything else falls back to a nested loop. WHERE terms that touch a single
+table are pushed down into that table's scan (and through MDQL.query()'s
+indexes for task lists) before any rows are joined.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from mdql import SectionMetadata
+from mdql_sort import top_k
+from mdql_sql import (
+    COLUMN_ALIASES, COLUMN_TYPES, COMPARATORS, And, Column, Compare, Compiler, JoinClause,
+    MDQLSyntaxError, Param, SelectQuery, TableRef, TaskSource, bind_filters, coerce,
+    column_getter, conjuncts, order_key, parse_cached, split_filters,
+)
+
+
+# Columns of a ::section_metadata table and their value types
+SECTION_COLUMN_TYPES: Dict[str, type] = {
+    'section_name': str,
+    'section_level': int,
+    'line_number': int,
+    'priority': str,
+    'status': str,
+    'source_file': str,
+    'source_date': str,
+    'updated_file': str,
+    'updated_date': str,
+    'file': str,
+}
+
+SECTION_COLUMN_ALIASES = {
+    'section': 'section_name',
+    'name': 'section_name',
+    'level': 'section_level',
+    'line': 'line_number',
+}
+
+TABLE_TYPES = ('task_lists', 'section_metadata')
+
+# Columns shown for SELECT * in a join, per table type
+STAR_COLUMNS = {
+    'task_lists': ['text', 'completed', 'section'],
+    'section_metadata': ['section_name', 'priority', 'status'],
+}
+
+RANGE_OPS = {'<', '<=', '>', '>='}
+
+# "a op b" is the same test as "b FLIPPED[op] a"
+FLIPPED = {'=': '=', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+Row = Tuple[Any, ...]
+
+
+def section_records(source: TaskSource) -> List[SectionMetadata]:
+    """
+    Section metadata rows of a source. For a folder these are every file's
+    sections, each with its `file`: join on it as well as the section name,
+    since files may share section names.
+    """
+    file_sections = getattr(source, 'file_sections', None)
+    if file_sections is not None:
+        return [meta for sections in file_sections.values() for meta in sections.values()]
+    return list(source.sections.values())
+
+
+class Table:
+    """A FROM or JOIN source bound to its loaded data."""
+
+    def __init__(self, ref: TableRef, source: TaskSource, position: int):
+        self.ref = ref
+        self.source = source
+        self.position = position
+        self.table_type = (ref.table_type or 'task_lists').lower()
+        if self.table_type not in TABLE_TYPES:
+            raise MDQLSyntaxError(
+                f"Unknown table type '{ref.table_type}' (known types: {', '.join(TABLE_TYPES)})"
+            )
+        self.name = (ref.alias or self.table_type).lower()
+
+    @property
+    def column_types(self) -> Dict[str, type]:
+        return SECTION_COLUMN_TYPES if self.table_type == 'section_metadata' else COLUMN_TYPES
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Get the canonical column name, or None if the table has no such column."""
+        name = name.lower()
+        aliases = SECTION_COLUMN_ALIASES if self.table_type == 'section_metadata' else COLUMN_ALIASES
+        name = aliases.get(name, name)
+        return name if name in self.column_types else None
+
+    def getter(self, name: str) -> Callable[[Any], Any]:
+        """Build an accessor for a column of this table's records."""
+        if self.table_type == 'section_metadata':
+            return operator.attrgetter(name)
+        return column_getter(name, self.source)
+
+    def scan(self, where: Any, tables: List['Table'], params: Sequence[Any]) -> List[Any]:
+        """Read the table's records, applying conditions pushed down to it."""
+        if self.table_type == 'section_metadata':
+            records = section_records(self.source)
+            residual = where
+        else:
+            filters, residual = split_filters(where)
+            if filters:
+                records = self.source.query(**bind_filters(filters, params))
+            else:
+                records = self.source.tasks
+        if residual is not None:
+            predicate = RowCompiler(tables, params, table=self).compile(residual)
+            records = [record for record in records if predicate(record)]
+        return records
+
+    def __str__(self):
+        return f"{self.name} ({self.ref.source!r}::{self.table_type})"
+
+
+def resolve_table_column(tables: Sequence[Table], column: Column) -> Tuple[Table, str]:
+    """Find the table a column reference belongs to."""
+    if column.table:
+        wanted = column.table.lower()
+        for table in tables:
+            if table.name == wanted:
+                name = table.resolve(column.name)
+                if name is None:
+                    known = ', '.join(sorted(table.column_types))
+                    raise MDQLSyntaxError(f"Unknown column '{column}' (known columns: {known})")
+                return table, name
+        raise MDQLSyntaxError(f"Unknown table '{column.table}' in column '{column}'")
+
+    matches = [(table, table.resolve(column.name)) for table in tables]
+    matches = [(table, name) for table, name in matches if name is not None]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        raise MDQLSyntaxError(f"Unknown column '{column}'")
+    names = ', '.join(table.name for table, _ in matches)
+    raise MDQLSyntaxError(f"Column '{column}' is ambiguous; qualify it with one of: {names}")
+
+
+def referenced_tables(node: Any, tables: Sequence[Table]) -> Set[int]:
+    """Positions of the tables an AST subtree refers to."""
+    if isinstance(node, Column):
+        return {resolve_table_column(tables, node)[0].position}
+    if isinstance(node, list):
+        return set().union(*(referenced_tables(item, tables) for item in node))
+    if hasattr(node, '__dataclass_fields__'):
+        return set().union(*(referenced_tables(getattr(node, name), tables)
+                             for name in node.__dataclass_fields__))
+    return set()
+
+
+def row_getter(position: int, get: Callable[[Any], Any]) -> Callable[[Row], Any]:
+    """Lift a record accessor to joined rows (NULL for the padded side of an outer join)."""
+    def value(row: Row) -> Any:
+        record = row[position]
+        return None if record is None else get(record)
+    return value
+
+
+class RowCompiler(Compiler):
+    """
+    Compiles conditions over joined rows, which are tuples holding one
+    record per table. With `table` set, compiles over that table's bare
+    records instead (for pushed-down filters).
+    """
+
+    def __init__(self, tables: Sequence[Table], params: Sequence[Any] = (), table: Optional[Table] = None):
+        super().__init__(None, params)
+        self.tables = tables
+        self.table = table
+
+    def operand(self, node: Any) -> Tuple[Callable[[Any], Any], Optional[type]]:
+        if isinstance(node, Column):
+            table, name = resolve_table_column(self.tables, node)
+            get = table.getter(name)
+            if self.table is None:
+                get = row_getter(table.position, get)
+            return get, table.column_types[name]
+        return super().operand(node)
+
+
+def key_function(getters: List[Callable[[Any], Any]]) -> Callable[[Any], Any]:
+    """Build a join key from one or more columns; None if any of them is NULL."""
+    if len(getters) == 1:
+        return getters[0]
+
+    def key(record: Any) -> Optional[tuple]:
+        values = tuple(get(record) for get in getters)
+        return None if any(value is None for value in values) else values
+    return key
+
+
+def pad_outer(out: List[Row], left: List[Row], right: List[Any], left_hit: bytearray,
+              right_hit: bytearray, kind: str, width: int) -> None:
+    """Append the unmatched rows an outer join keeps, padded with NULLs."""
+    if kind in ('LEFT', 'FULL'):
+        out.extend(row + (None,) for row, hit in zip(left, left_hit) if not hit)
+    if kind in ('RIGHT', 'FULL'):
+        nulls = (None,) * width
+        out.extend(nulls + (record,) for record, hit in zip(right, right_hit) if not hit)
+
+
+def hash_join(left: List[Row], right: List[Any], left_key: Callable[[Row], Any],
+              right_key: Callable[[Any], Any], kind: str, on: Optional[Callable[[Row], bool]],
+              width: int, build_right: bool) -> List[Row]:
+    """Equality join: hash one input on its key and probe with the other."""
+    build, build_key = (right, right_key) if build_right else (left, left_key)
+    buckets: Dict[Any, List[int]] = {}
+    for index, record in enumerate(build):
+        key = build_key(record)
+        if key is not None:
+            buckets.setdefault(key, []).append(index)
+
+    left_hit = bytearray(len(left))
+    right_hit = bytearray(len(right))
+    out: List[Row] = []
+    if build_right:
+        for i, row in enumerate(left):
+            key = left_key(row)
+            if key is None:
+                continue
+            for j in buckets.get(key, ()):
+                combined = row + (right[j],)
+                if on is None or on(combined):
+                    out.append(combined)
+                    left_hit[i] = right_hit[j] = 1
+    else:
+        for j, record in enumerate(right):
+            key = right_key(record)
+            if key is None:
+                continue
+            for i in buckets.get(key, ()):
+                combined = left[i] + (record,)
+                if on is None or on(combined):
+                    out.append(combined)
+                    left_hit[i] = right_hit[j] = 1
+
+    pad_outer(out, left, right, left_hit, right_hit, kind, width)
+    return out
+
+
+def merge_join(left: List[Row], right: List[Any], left_key: Callable[[Row], Any],
+               right_key: Callable[[Any], Any], op: str, kind: str,
+               on: Optional[Callable[[Row], bool]], width: int) -> List[Row]:
+    """
+    Range join (left_key op right_key): sort both inputs by key, then sweep.
+
+    Keys on each side are sorted ascending, so the boundary between matching
+    and non-matching right rows only ever moves forward as the left key grows.
+    Raises TypeError if the keys cannot be ordered against each other.
+    """
+    right_sorted = sorted((key, j) for j, key in enumerate(map(right_key, right)) if key is not None)
+    left_sorted = sorted((key, i) for i, key in enumerate(map(left_key, left)) if key is not None)
+    keys = [key for key, _ in right_sorted]
+    order = [j for _, j in right_sorted]
+    cmp = COMPARATORS[op]
+    ascending = op in ('<', '<=')     # matches are a suffix of the right keys, else a prefix
+
+    left_hit = bytearray(len(left))
+    right_hit = bytearray(len(right))
+    out: List[Row] = []
+    boundary = 0
+    count = len(keys)
+    for value, i in left_sorted:
+        if ascending:
+            while boundary < count and not cmp(value, keys[boundary]):
+                boundary += 1
+            matches = range(boundary, count)
+        else:
+            while boundary < count and cmp(value, keys[boundary]):
+                boundary += 1
+            matches = range(boundary)
+
+        row = left[i]
+        for position in matches:
+            j = order[position]
+            combined = row + (right[j],)
+            if on is None or on(combined):
+                out.append(combined)
+                left_hit[i] = right_hit[j] = 1
+
+    pad_outer(out, left, right, left_hit, right_hit, kind, width)
+    return out
+
+
+def nested_loop_join(left: List[Row], right: List[Any], kind: str,
+                     on: Optional[Callable[[Row], bool]], width: int) -> List[Row]:
+    """Join by testing every pair of rows (CROSS JOIN and non-key conditions)."""
+    left_hit = bytearray(len(left))
+    right_hit = bytearray(len(right))
+    out: List[Row] = []
+    for i, row in enumerate(left):
+        for j, record in enumerate(right):
+            combined = row + (record,)
+            if on is None or on(combined):
+                out.append(combined)
+                left_hit[i] = right_hit[j] = 1
+
+    pad_outer(out, left, right, left_hit, right_hit, kind, width)
+    return out
+
+
+class JoinStep:
+    """How one JOIN clause will be executed."""
+
+    def __init__(self, join: JoinClause, position: int):
+        self.join = join
+        self.position = position
+        self.keys: List[Tuple[Column, Column]] = []      # (left column, right column) equalities
+        self.range: Optional[Tuple[str, Column, Column]] = None
+        self.residual: List[Any] = []                   # other ON terms, tested per pair
+
+    @property
+    def method(self) -> str:
+        if self.keys:
+            return 'Hash join'
+        if self.range:
+            return 'Sort-merge join'
+        return 'Nested loop join'
+
+
+class JoinQuery:
+    """
+    A SELECT with joins, planned once and executed with bound '?' values.
+
+        query = JoinQuery(
+            "SELECT t.text, m.priority FROM todo.md t "
+            "JOIN todo.md::section_metadata m ON t.section = m.section_name "
+            "WHERE t.completed = false",
+            MDQL,
+        )
+        for row in query.execute():
+            print(query.project(row))
+
+    open_source loads a path into an MDQL, MDQLCatalog or similar task
+    source and is called once per distinct path. Each result row is a tuple
+    with one record per table (a TaskItem or SectionMetadata), or None on
+    the missing side of an outer join.
+    """
+
+    def __init__(self, query: Any, open_source: Callable[[str], TaskSource]):
+        self.query: SelectQuery = parse_cached(query) if isinstance(query, str) else query
+        if self.query.is_aggregate:
+            raise MDQLSyntaxError("GROUP BY and aggregates are not supported with JOIN")
+        sources: Dict[str, TaskSource] = {}
+        self.tables: List[Table] = []
+        for position, ref in enumerate(self.query.tables):
+            if ref.source not in sources:
+                sources[ref.source] = open_source(ref.source)
+            self.tables.append(Table(ref, sources[ref.source], position))
+
+        names = [table.name for table in self.tables]
+        for name in names:
+            if names.count(name) > 1:
+                raise MDQLSyntaxError(f"Table name '{name}' is used more than once; give each source an alias")
+
+        self.pushed: List[List[Any]] = [[] for _ in self.tables]
+        self.join_steps = [JoinStep(join, k) for k, join in enumerate(self.query.joins, 1)]
+        self.where = self._plan()
+        self.columns = self._select_columns()
+        self.order_getters = [
+            (self._row_getter(item.column), item.descending) for item in self.query.order_by
+        ]
+        self.steps: List[str] = []
+
+    # -- planning -----------------------------------------------------------
+
+    def _plan(self) -> Any:
+        """Push single-table terms into scans, classify ON terms, return the residual WHERE."""
+        tables = self.tables
+
+        # Tables an outer join may pad with NULLs: filtering them before the
+        # join would turn "no match" into "no row"
+        null_extended: Set[int] = set()
+        for step in self.join_steps:
+            if step.join.kind in ('LEFT', 'FULL'):
+                null_extended.add(step.position)
+            if step.join.kind in ('RIGHT', 'FULL'):
+                null_extended.update(range(step.position))
+
+        residual = []
+        for term in conjuncts(self.query.where):
+            refs = referenced_tables(term, tables)
+            if len(refs) == 1 and not refs & null_extended:
+                self.pushed[refs.pop()].append(term)
+            else:
+                residual.append(term)
+
+        for step in self.join_steps:
+            visible = tables[:step.position + 1]
+            for term in conjuncts(step.join.condition):
+                refs = referenced_tables(term, visible)
+                if refs == {step.position} and step.join.kind in ('INNER', 'LEFT'):
+                    self.pushed[step.position].append(term)
+                    continue
+                sides = self._split_sides(term, step.position)
+                if sides and sides[0] == '=':
+                    step.keys.append((sides[1], sides[2]))
+                elif sides and sides[0] in RANGE_OPS and step.range is None:
+                    step.range = sides
+                else:
+                    step.residual.append(term)
+            if step.keys and step.range:
+                # Equality keys are more selective; test the range per pair
+                step.residual.append(Compare(*step.range))
+                step.range = None
+
+        if not residual:
+            return None
+        return residual[0] if len(residual) == 1 else And(residual)
+
+    def _split_sides(self, term: Any, position: int) -> Optional[Tuple[str, Column, Column]]:
+        """Match "earlier.column op joined.column", normalised to (op, left, right)."""
+        if not (isinstance(term, Compare) and isinstance(term.left, Column)
+                and isinstance(term.right, Column)):
+            return None
+        visible = self.tables[:position + 1]
+        left_table, left_name = resolve_table_column(visible, term.left)
+        right_table, right_name = resolve_table_column(visible, term.right)
+        if list in (left_table.column_types[left_name], right_table.column_types[right_name]):
+            return None
+        if left_table.position < position and right_table.position == position:
+            return term.op, term.left, term.right
+        if right_table.position < position and left_table.position == position:
+            return FLIPPED[term.op], term.right, term.left
+        return None
+
+    def _select_columns(self) -> List[Tuple[str, Callable[[Row], Any]]]:
+        """Resolve the select list to (label, row accessor) pairs."""
+        if self.query.star:
+            columns = [Column(name, table.name) for table in self.tables
+                       for name in STAR_COLUMNS[table.table_type]]
+            return [(str(column), self._row_getter(column)) for column in columns]
+        return [(label, self._row_getter(item)) for label, item in zip(self.query.columns, self.query.items)]
+
+    def _row_getter(self, column: Column, tables: Optional[Sequence[Table]] = None) -> Callable[[Row], Any]:
+        table, name = resolve_table_column(tables or self.tables, column)
+        return row_getter(table.position, table.getter(name))
+
+    # -- execution ----------------------------------------------------------
+
+    @property
+    def param_count(self) -> int:
+        return self.query.param_count
+
+    def execute(self, *params: Any) -> List[Row]:
+        """Run the joins, residual WHERE, ORDER BY and LIMIT."""
+        if len(params) != self.param_count:
+            raise ValueError(f"Expected {self.param_count} parameter(s), got {len(params)}")
+        self.steps = []
+        tables = self.tables
+
+        first = tables[0]
+        rows: List[Row] = [(record,) for record in self._scan(first, params)]
+        for step in self.join_steps:
+            right = self._scan(tables[step.position], params)
+            rows = self._join(step, rows, right, params)
+
+        if self.where is not None:
+            predicate = RowCompiler(tables, params).compile(self.where)
+            rows = [row for row in rows if predicate(row)]
+            self.steps.append(f"Filter {self.where} -> {len(rows)} rows")
+
+        limit = self.query.limit
+        if isinstance(limit, Param):
+            limit = coerce(params[limit.index], int)
+        if self.order_getters:
+            order = ', '.join(str(item) for item in self.query.order_by)
+            key = order_key(self.order_getters)
+            if limit is not None:
+                rows = top_k(rows, limit, key)
+                self.steps.append(f"Top {limit} by {order} (bounded heap)")
+                return rows
+            rows.sort(key=key)
+            self.steps.append(f"Sort: {order}")
+        if limit is not None:
+            rows = rows[:limit]
+            self.steps.append(f"Limit: {limit}")
+        return rows
+
+    def _scan(self, table: Table, params: Sequence[Any]) -> List[Any]:
+        terms = self.pushed[table.position]
+        where = None
+        if terms:
+            where = terms[0] if len(terms) == 1 else And(terms)
+        records = table.scan(where, self.tables, params)
+        pushed = f" where {where}" if where is not None else ''
+        self.steps.append(f"Scan {table}{pushed} -> {len(records)} rows")
+        return records
+
+    def _join(self, step: JoinStep, left: List[Row], right: List[Any], params: Sequence[Any]) -> List[Row]:
+        kind = step.join.kind
+        width = step.position
+        visible = self.tables[:width + 1]
+        on = None
+        if step.residual:
+            residual = step.residual[0] if len(step.residual) == 1 else And(step.residual)
+            on = RowCompiler(visible, params).compile(residual)
+
+        table = self.tables[step.position]
+        label = f"[{kind}] {table.name}"
+        if step.keys:
+            left_key = key_function([self._row_getter(column, visible) for column, _ in step.keys])
+            right_key = key_function([self._record_getter(visible, column) for _, column in step.keys])
+            build_right = len(right) <= len(left)
+            rows = hash_join(left, right, left_key, right_key, kind, on, width, build_right)
+            condition = ' AND '.join(f"{left_column} = {right_column}" for left_column, right_column in step.keys)
+            build = f"build {table.name} ({len(right)} rows)" if build_right else f"build left ({len(left)} rows)"
+            self.steps.append(f"Hash join {label} ON {condition}: {build} -> {len(rows)} rows")
+            return rows
+
+        if step.range:
+            op, left_column, right_column = step.range
+            left_key = self._row_getter(left_column, visible)
+            right_key = self._record_getter(visible, right_column)
+            try:
+                rows = merge_join(left, right, left_key, right_key, op, kind, on, width)
+                self.steps.append(
+                    f"Sort-merge join {label} ON {left_column} {op} {right_column} -> {len(rows)} rows"
+                )
+                return rows
+            except TypeError:
+                # Mixed key types cannot be sorted together; compare pair by pair
+                condition = Compare(op, left_column, right_column)
+                residual = And([condition] + step.residual) if step.residual else condition
+                on = RowCompiler(visible, params).compile(residual)
+
+        rows = nested_loop_join(left, right, kind, on, width)
+        self.steps.append(f"Nested loop join {label} -> {len(rows)} rows")
+        return rows
+
+    @staticmethod
+    def _record_getter(tables: Sequence[Table], column: Column) -> Callable[[Any], Any]:
+        table, name = resolve_table_column(tables, column)
+        return table.getter(name)
+
+    def project(self, row: Row) -> Dict[str, Any]:
+        """Get the selected columns of a row, keyed by their select-list labels."""
+        return {label: get(row) for label, get in self.columns}
+
+    def explain(self, *params: Any) -> str:
+        """Run the query and describe each step with its actual row counts."""
+        self.execute(*params)
+        return "\n".join(self.steps)
+
+
+def execute_join(query: Any, open_source: Callable[[str], TaskSource], params: Sequence[Any] = ()) -> List[Row]:
+    """Run a SELECT with joins, loading each source through open_source."""
+    return JoinQuery(query, open_source).execute(*params)
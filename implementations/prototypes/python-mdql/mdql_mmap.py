@@ -0,0 +1,299 @@
+"""
+MDQL Memory-Mapped Reader
+Parses a markdown file through an mmap with the parser's tokenizer, recording
+byte offsets for each task instead of keeping its text, and supports in-place
+checkbox toggles.
+"""
+
+import mmap
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+from mdql import MDQLParser, SectionMetadata
+from mdql_cache import ParseCache
+from mdql_concurrency import ConflictError, FileLock, file_version
+from mdql_scan import HEADING, NOTE, SOURCE, TASK, UPDATED, LineScanner
+from mdql_wal import wal_path
+
+
+# First bytes of lines the tokenizer ignores: ASCII other than '-', '#', '*'
+# and whitespace (which may indent a task)
+SKIPPED_LEADS = frozenset(
+    byte for byte in range(0x80) if byte not in b'-#*' and not chr(byte).isspace()
+)
+
+
+class MappedTask:
+    """
+    A task backed by byte offsets into a mapped file.
+
+    Exposes the same attributes as TaskItem; `text` and `notes` are decoded
+    from the mapping on access.
+    """
+
+    __slots__ = (
+        '_file', 'text_offset', 'text_length', 'check_offset', 'note_spans',
+        'completed', 'section', 'section_level', 'indent_level', 'line_number',
+        'parent_line', 'has_children', 'children',
+    )
+
+    def __init__(self, mapped_file: 'MappedTaskFile', text_offset: int, text_length: int,
+                 check_offset: int, completed: bool, section: str, section_level: int,
+                 indent_level: int, line_number: int):
+        self._file = mapped_file
+        self.text_offset = text_offset
+        self.text_length = text_length
+        self.check_offset = check_offset
+        self.note_spans: Optional[List[tuple]] = None
+        self.completed = completed
+        self.section = section
+        self.section_level = section_level
+        self.indent_level = indent_level
+        self.line_number = line_number
+        self.parent_line: Optional[int] = None
+        self.has_children = False
+        self.children: List['MappedTask'] = []
+
+    @property
+    def text(self) -> str:
+        return self._file.decode(self.text_offset, self.text_length)
+
+    @property
+    def notes(self) -> List[str]:
+        if not self.note_spans:
+            return []
+        return [self._file.decode(offset, length) for offset, length in self.note_spans]
+
+    def __repr__(self):
+        status = "✓" if self.completed else "☐"
+        indent = "  " * self.indent_level
+        notes_str = f" [{len(self.note_spans)} notes]" if self.note_spans else ""
+        return f"{indent}{status} {self.text}{notes_str} (line {self.line_number})"
+
+
+class MappedTaskFile:
+    """
+    Memory-mapped view of a markdown task file.
+
+    Lines are classified by the parser's tokenizer (mdql_scan.LineScanner),
+    so results match MDQL's; lines that cannot hold a task, heading or
+    metadata are skipped on their first byte without being decoded. With
+    writable=True, checkbox toggles and same-length text edits are written
+    straight into the mapping:
+
+        with MappedTaskFile("todo.md", writable=True) as f:
+            f.mark_complete(42)
+
+    Each in-place write holds the file's lock (mdql_concurrency.FileLock),
+    as a save does, and bumps the file's mtime so watchers and refresh()
+    see the change. Writing fails with ConflictError once another process
+    has replaced the file, and a file with a pending write-ahead log (see
+    mdql_wal) is not opened for writing: edit it through MDQL.
+    """
+
+    def __init__(self, filepath: str, writable: bool = False, cache: Optional[ParseCache] = None):
+        self.filepath = filepath
+        self.writable = writable
+        self.cache = cache
+        if writable and os.path.exists(wal_path(filepath)):
+            raise ConflictError(f"{filepath} has a write-ahead log; edit it through MDQL")
+        self.tokenizer = LineScanner()
+        self._fh = open(filepath, 'r+b' if writable else 'rb')
+        try:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.mm: Optional[mmap.mmap] = mmap.mmap(self._fh.fileno(), 0, access=access)
+        except ValueError:
+            # Empty files cannot be mapped
+            self.mm = None
+        self._version = file_version(filepath)
+        self.tasks: List[MappedTask] = []
+        self.sections: Dict[str, SectionMetadata] = {}
+        self._by_line: Dict[int, MappedTask] = {}
+        self._parse()
+
+    def __enter__(self) -> 'MappedTaskFile':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[MappedTask]:
+        return iter(self.tasks)
+
+    def decode(self, offset: int, length: int) -> str:
+        """Decode a byte range of the mapped file."""
+        return self.mm[offset:offset + length].decode('utf-8')
+
+    def _parse(self) -> None:
+        """Scan the mapping line by line, recording task offsets."""
+        mm = self.mm
+        if mm is None:
+            return
+
+        meta_parser = MDQLParser()
+        scan = self.tokenizer.scan
+        size = len(mm)
+        parent_stack: List[tuple] = []  # Stack of (indent_level, task)
+        current_meta: Optional[SectionMetadata] = None
+        current_section: Optional[str] = None
+        current_level = 0
+        last_task: Optional[MappedTask] = None
+
+        pos = 0
+        line_num = 0
+        while pos < size:
+            line_num += 1
+            newline = mm.find(b'\n', pos)
+            next_pos = size if newline == -1 else newline + 1
+            end = size if newline == -1 else newline
+            if end > pos and mm[end - 1] == 0x0D:  # '\r', which MDQL reads as part of the newline
+                end -= 1
+            if end == pos or mm[pos] in SKIPPED_LEADS:
+                pos = next_pos
+                continue
+
+            start, pos = pos, next_pos
+            token = scan(mm[start:end].decode('utf-8'))
+            if token is None:
+                continue
+            kind = token[0]
+
+            if kind == TASK:
+                _, indent_level, completed, text = token
+                text_length = len(text.encode('utf-8'))
+                task = MappedTask(
+                    self,
+                    text_offset=end - text_length,
+                    text_length=text_length,
+                    check_offset=mm.find(b'- [', start, end) + 3,
+                    completed=completed,
+                    section=current_section or "Untitled",
+                    section_level=current_level,
+                    indent_level=indent_level,
+                    line_number=line_num
+                )
+
+                while parent_stack and parent_stack[-1][0] >= indent_level:
+                    parent_stack.pop()
+                if parent_stack:
+                    parent_task = parent_stack[-1][1]
+                    task.parent_line = parent_task.line_number
+                    parent_task.has_children = True
+                    parent_task.children.append(task)
+
+                parent_stack.append((indent_level, task))
+                self.tasks.append(task)
+                self._by_line[line_num] = task
+                last_task = task
+
+            elif kind == NOTE:
+                _, indent_level, text = token
+                if last_task and indent_level > last_task.indent_level:
+                    if last_task.note_spans is None:
+                        last_task.note_spans = []
+                    text_length = len(text.encode('utf-8'))
+                    last_task.note_spans.append((end - text_length, text_length))
+
+            elif kind == HEADING:
+                _, current_level, current_section = token
+                current_meta = SectionMetadata(
+                    section_name=current_section,
+                    section_level=current_level,
+                    line_number=line_num
+                )
+                self.sections[current_section] = current_meta
+                parent_stack.clear()
+                last_task = None
+
+            elif current_meta:
+                _, key, value = token
+                if kind == SOURCE:
+                    current_meta.source_file = key
+                    meta_parser._parse_datetime(value, current_meta, 'source')
+                elif kind == UPDATED:
+                    current_meta.updated_file = key
+                    meta_parser._parse_datetime(value, current_meta, 'updated')
+                elif key == 'Priority':
+                    current_meta.priority = value
+                elif key == 'Status':
+                    current_meta.status = value
+                else:
+                    current_meta.properties[key] = value
+
+    def task_at(self, line_number: int) -> Optional[MappedTask]:
+        """Look up a task by line number."""
+        return self._by_line.get(line_number)
+
+    def _require_writable(self) -> None:
+        if not self.writable or self.mm is None:
+            raise ValueError(f"{self.filepath} is not mapped for writing")
+
+    def set_completed(self, line_number: int, completed: bool) -> None:
+        """Toggle a checkbox by rewriting its single byte in place."""
+        self._require_writable()
+        task = self.task_at(line_number)
+        if task is None:
+            return
+        self._write(task.check_offset, b'x' if completed else b' ')
+        task.completed = completed
+
+    def mark_complete(self, line_number: int) -> None:
+        """Mark a task as complete."""
+        self.set_completed(line_number, True)
+
+    def mark_incomplete(self, line_number: int) -> None:
+        """Mark a task as incomplete."""
+        self.set_completed(line_number, False)
+
+    def update_text(self, line_number: int, new_text: str) -> None:
+        """
+        Replace task text in place.
+
+        Only edits that keep the same encoded length can be applied without
+        moving the rest of the file; use MDQL for anything else.
+        """
+        self._require_writable()
+        task = self.task_at(line_number)
+        if task is None:
+            return
+        encoded = new_text.encode('utf-8')
+        if len(encoded) != task.text_length:
+            raise ValueError(
+                f"In-place edit needs {task.text_length} bytes, got {len(encoded)}; use MDQL.update_text"
+            )
+        self._write(task.text_offset, encoded)
+
+    def _write(self, offset: int, data: bytes) -> None:
+        """
+        Write bytes into the mapping under the file lock, then give the file
+        a new version (mtime) and drop its parse cache entry.
+        """
+        with FileLock(self.filepath):
+            if file_version(self.filepath) != self._version:
+                raise ConflictError(f"{self.filepath} changed since it was mapped; open it again")
+            self.mm[offset:offset + len(data)] = data
+            # The size and inode stay the same, so the mtime must move on
+            # even within the filesystem's timestamp granularity
+            mtime = max(time.time_ns(), self._version[0] + 1)
+            try:
+                os.utime(self.filepath, ns=(os.stat(self.filepath).st_atime_ns, mtime))
+            except PermissionError:
+                # Setting an explicit time needs ownership; "now" only write access
+                os.utime(self.filepath)
+            self._version = file_version(self.filepath)
+        if self.cache:
+            self.cache.invalidate(self.filepath)
+
+    def flush(self) -> None:
+        """Write in-place edits back to disk."""
+        if self.mm is not None and self.writable:
+            self.mm.flush()
+
+    def close(self) -> None:
+        """Flush and release the mapping."""
+        if self.mm is not None:
+            self.flush()
+            self.mm.close()
+            self.mm = None
+        self._fh.close()
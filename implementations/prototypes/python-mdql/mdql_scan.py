@@ -0,0 +1,97 @@
+"""
+MDQL Line Scanners
+Classify markdown lines for MDQLParser. A tokenizer turns one line into a
+token tuple, or None for lines the parser ignores:
+
+    (HEADING, level, name)
+    (SOURCE, file, date_time)           *Source: file.md (2024-01-15 10:30)*
+    (UPDATED, file, date_time)          *Updated: file.md (2024-01-15 10:30)*
+    (PROPERTY, key, value)              **Priority:** High
+    (TASK, indent_level, completed, text)
+    (NOTE, indent_level, text)          a plain bullet
+
+LineScanner, the default, dispatches on a line's first character and runs
+at most one regular expression; it reads lines as they come, newline and
+all. RegexTokenizer tries each pattern in turn on the stripped line, as the
+parser used to, and is kept as the reference to check and benchmark
+against. Pass another tokenizer to MDQLParser(tokenizer=...) to read a
+different syntax.
+"""
+
+import re
+from typing import Optional, Tuple
+
+
+HEADING, SOURCE, UPDATED, PROPERTY, TASK, NOTE = range(6)
+
+Token = Tuple
+
+
+class LineScanner:
+    """Single-pass line classifier: one dispatch on the first character, at most one regex."""
+
+    # The parser's patterns with their alternatives folded together. `$` also
+    # matches before a final newline and `.` never matches one, so lines need
+    # no rstrip.
+    HEADING_PATTERN = re.compile(r'(#{1,6})\s+(.+)$')
+    METADATA_PATTERN = re.compile(r'\*(?:\*(.+?):\*\*\s+(.+)|(Source|Updated):\s*(.+?\.md)\s*\((.+?)\)\*)$')
+    ITEM_PATTERN = re.compile(r'(\s*)- (?:\[([ xX])\]\s+(.+)|(.+))$')
+
+    def scan(self, line: str) -> Optional[Token]:
+        first = line[:1]
+        if first == '-' or first == ' ' or first == '\t' or (first and first.isspace()):
+            match = self.ITEM_PATTERN.match(line)
+            if match is None:
+                return None
+            indent, check, text, note = match.groups()
+            if check is None:
+                return NOTE, len(indent) // 2, note
+            return TASK, len(indent) // 2, check != ' ', text
+        if first == '#':
+            match = self.HEADING_PATTERN.match(line)
+            if match is None:
+                return None
+            level, name = match.groups()
+            return HEADING, len(level), name
+        if first == '*':
+            match = self.METADATA_PATTERN.match(line)
+            if match is None:
+                return None
+            key, value, kind, file, date_time = match.groups()
+            if kind is None:
+                return PROPERTY, key, value
+            return SOURCE if kind == 'Source' else UPDATED, file, date_time
+        return None
+
+
+class RegexTokenizer:
+    """The parser's original chain: every pattern in turn, on the stripped line."""
+
+    HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$')
+    TASK_PATTERN = re.compile(r'^(\s*)- \[([ xX])\]\s+(.+)$')
+    NOTE_PATTERN = re.compile(r'^(\s*)- (.+)$')  # Regular bullet without checkbox
+    SOURCE_PATTERN = re.compile(r'^\*Source:\s*(.+?\.md)\s*\((.+?)\)\*$')
+    UPDATED_PATTERN = re.compile(r'^\*Updated:\s*(.+?\.md)\s*\((.+?)\)\*$')
+    PROPERTY_PATTERN = re.compile(r'^\*\*(.+?):\*\*\s+(.+)$')
+
+    def scan(self, line: str) -> Optional[Token]:
+        line = line.rstrip('\n')
+        match = self.HEADING_PATTERN.match(line)
+        if match:
+            return HEADING, len(match.group(1)), match.group(2)
+        match = self.SOURCE_PATTERN.match(line)
+        if match:
+            return SOURCE, match.group(1), match.group(2)
+        match = self.UPDATED_PATTERN.match(line)
+        if match:
+            return UPDATED, match.group(1), match.group(2)
+        match = self.PROPERTY_PATTERN.match(line)
+        if match:
+            return PROPERTY, match.group(1), match.group(2)
+        match = self.TASK_PATTERN.match(line)
+        if match:
+            return TASK, len(match.group(1)) // 2, match.group(2).lower() == 'x', match.group(3)
+        match = self.NOTE_PATTERN.match(line)
+        if match:
+            return NOTE, len(match.group(1)) // 2, match.group(2)
+        return None
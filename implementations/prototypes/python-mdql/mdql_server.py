@@ -0,0 +1,340 @@
+"""
+MDQL Query Server
+A long-running process that keeps parsed files, their indexes and prepared
+statements in memory and answers queries over a Unix socket (or localhost
+TCP), so each query skips interpreter startup and the parse.
+
+The protocol is one JSON object per line in each direction, and a client
+may send any number of requests on one connection:
+
+    {"file": "/abs/todo.md", "query": "SELECT text FROM todo.md WHERE completed = ?", "params": [false]}
+    {"ok": true, "columns": ["text"], "rows": [{"text": "..."}], "count": 1}
+
+    {"op": "explain", "file": ..., "query": ...}  ->  {"ok": true, "plan": "..."}
+    {"op": "stats"}                               ->  {"ok": true, "files": {...}, ...}
+    {"op": "ping"}                                ->  {"ok": true}
+
+Errors come back as {"ok": false, "error": "..."}. Files are refreshed when
+their version (or their write-ahead log's) changes, so results are never
+stale; with watch=True a FileWatcher (see mdql_watch) refreshes them as soon
+as they change instead of on the next query. A folder only re-parses the
+files that changed. Refreshing a file also refreshes the materialized views
+over it (see mdql_views), and a query whose FROM names a view, rather than
+a file, reads the view's stored rows. See mdql_client for the client side.
+"""
+
+import json
+import os
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from mdql import MDQL, TaskItem
+from mdql_aggregate import aggregate_folder, aggregate_query
+from mdql_cache import ParseCache, default_cache_dir
+from mdql_catalog import MDQLCatalog, discover
+from mdql_concurrency import file_version
+from mdql_join import JoinQuery
+from mdql_sql import (
+    SelectQuery, column_getter, explain_query, parse_cached, resolve_column, stream_query,
+)
+from mdql_wal import wal_path
+from mdql_views import ViewStore
+from mdql_watch import FileWatcher
+
+
+# Task columns returned for SELECT * (plus source_file for folders)
+TASK_FIELDS = ['line_number', 'text', 'completed', 'section', 'indent_level', 'parent_line',
+               'notes', 'priority', 'status']
+
+
+def default_socket_path() -> str:
+    """The server's default Unix socket, next to the parse cache."""
+    return os.path.join(default_cache_dir(), 'mdql.sock')
+
+
+class HotSource:
+    """A loaded MDQL or MDQLCatalog, and the file versions it was loaded from."""
+
+    def __init__(self, path: str, version: Any, source: Any):
+        self.path = path
+        self.version = version
+        self.source = source
+        self.lock = threading.Lock()
+        self.queries = 0
+
+
+class QueryService:
+    """
+    The server's state and request handling, independent of the transport.
+
+        service = QueryService()
+        service.handle({"file": "todo.md", "query": "SELECT * FROM todo.md"})
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, workers: Optional[int] = None,
+                 watch: bool = False):
+        self.cache_dir = cache_dir
+        self.cache = ParseCache(cache_dir) if cache_dir else None
+        self.views = ViewStore(cache_dir)
+        self.workers = workers
+        self.sources: Dict[str, HotSource] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.reloads = 0
+        self.watcher = FileWatcher([], self._changed).start() if watch else None
+
+    # -- sources ------------------------------------------------------------
+
+    def _version(self, path: str) -> Any:
+        """What must stay the same for a loaded source to be current."""
+        if os.path.isdir(path):
+            return tuple((name, file_version(name)) for name in discover(path))
+        return file_version(path), file_version(wal_path(path))
+
+    def source(self, path: str) -> HotSource:
+        """The loaded source for a path, loading it when missing and refreshing it when stale."""
+        path = os.path.abspath(path)
+        version = self._version(path)
+        with self.lock:
+            hot = self.sources.get(path)
+            if hot is None:
+                if os.path.isdir(path):
+                    loaded = MDQLCatalog(path, workers=self.workers, cache_dir=self.cache_dir)
+                else:
+                    loaded = MDQL(path, cache=self.cache, views=self.views)
+                hot = self.sources[path] = HotSource(path, version, loaded)
+                if self.watcher is not None:
+                    self.watcher.add(path)
+                return hot
+        if hot.version != version:
+            self.refresh(hot)
+        return hot
+
+    def refresh(self, hot: HotSource, paths: Optional[Set[str]] = None) -> None:
+        """Bring a loaded source up to date (only the changed files of a folder)."""
+        with hot.lock:
+            version = self._version(hot.path)
+            if version == hot.version:
+                return
+            if isinstance(hot.source, MDQLCatalog):
+                hot.source.refresh(paths)
+            else:
+                hot.source.refresh()
+            hot.version = version
+            self.reloads += 1
+
+    def _changed(self, paths: Set[str]) -> None:
+        """Watcher callback: refresh the sources the changed files belong to."""
+        with self.lock:
+            sources = list(self.sources.values())
+        for hot in sources:
+            if isinstance(hot.source, MDQLCatalog):
+                inside = {path for path in paths if path.startswith(hot.path + os.sep)}
+                if inside:
+                    self.refresh(hot, inside)
+            elif hot.path in paths:
+                self.refresh(hot)
+
+    # -- requests -----------------------------------------------------------
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one request; errors are returned, never raised."""
+        self.requests += 1
+        op = request.get('op', 'query')
+        try:
+            if op == 'ping':
+                return {'ok': True}
+            if op == 'stats':
+                return self.stats()
+            if op not in ('query', 'explain'):
+                raise ValueError(f"Unknown op {op!r}")
+            return self.query(request, explain=op == 'explain')
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            return {'ok': False, 'error': str(e) or type(e).__name__}
+
+    def query(self, request: Dict[str, Any], explain: bool = False) -> Dict[str, Any]:
+        text = request['query']
+        params = list(request.get('params') or [])
+        limit = request.get('limit')
+        parsed = parse_cached(text)
+        if parsed.joins:
+            return self._join(parsed, request, params, limit, explain)
+        if self._is_view(parsed.source, request):
+            if explain:
+                raise ValueError("explain is only available for plain SELECTs on a file")
+            columns, rows = self.views.load(parsed.source).select(text)
+            return _response(columns, rows, limit)
+
+        path = self._resolve(parsed.source, request)
+        hot = self.source(path)
+        with hot.lock:
+            hot.queries += 1
+            source = hot.source
+            if explain:
+                if not isinstance(source, MDQL) or parsed.is_aggregate:
+                    raise ValueError("explain is only available for plain SELECTs on a file")
+                return {'ok': True, 'plan': explain_query(parsed, source)}
+
+            if parsed.is_aggregate:
+                if isinstance(source, MDQLCatalog):
+                    rows = aggregate_folder(parsed, path, workers=self.workers,
+                                            cache_dir=self.cache_dir, params=params)
+                else:
+                    rows = aggregate_query(parsed, source, params)
+                return _response(parsed.columns, rows, limit)
+
+            if isinstance(source, MDQL):
+                tasks = source.prepare(text).execute(*params)
+            else:
+                tasks = list(stream_query(parsed, source, params))
+            columns, getters = _task_columns(parsed, source)
+            if limit is not None:
+                tasks = tasks[:limit]
+            rows = [{column: get(task) for column, get in zip(columns, getters)} for task in tasks]
+            return _response(columns, rows)
+
+    def _join(self, parsed: SelectQuery, request: Dict[str, Any], params: List[Any],
+              limit: Optional[int], explain: bool) -> Dict[str, Any]:
+        hot_sources = {}
+
+        def open_source(source: str):
+            hot = self.source(self._resolve(source, request))
+            hot_sources[hot.path] = hot
+            return hot.source
+
+        join = JoinQuery(parsed, open_source)
+        locks = [hot.lock for _, hot in sorted(hot_sources.items())]
+        for lock in locks:
+            lock.acquire()
+        try:
+            if explain:
+                return {'ok': True, 'plan': join.explain(*params)}
+            rows = [join.project(row) for row in join.execute(*params)]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        return _response([label for label, _ in join.columns], rows, limit)
+
+    def _is_view(self, source: str, request: Dict[str, Any]) -> bool:
+        """True when a FROM names a stored materialized view and no file."""
+        cwd = request.get('cwd') or os.getcwd()
+        return source in self.views and not os.path.exists(os.path.join(cwd, source))
+
+    def _resolve(self, source: str, request: Dict[str, Any]) -> str:
+        """The path a query's FROM names, as the CLI resolves it."""
+        cwd = request.get('cwd') or os.getcwd()
+        file = request.get('file')
+        for candidate in (source, os.path.join(os.path.dirname(file), source) if file else None):
+            if candidate:
+                candidate = os.path.join(cwd, candidate)
+                if os.path.exists(candidate):
+                    return candidate
+        if file:
+            return os.path.join(cwd, file)
+        raise ValueError(f"File not found: {source}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            files = {path: {'queries': hot.queries, 'tasks': len(hot.source.tasks)}
+                     for path, hot in self.sources.items()}
+        stats = {
+            'ok': True,
+            'files': files,
+            'requests': self.requests,
+            'reloads': self.reloads,
+            'uptime': round(time.time() - self.started, 1),
+        }
+        if self.watcher is not None:
+            stats['watch'] = dict(self.watcher.metrics.summary(), backend=self.watcher.backend)
+        return stats
+
+    def close(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+
+
+def _task_columns(parsed: SelectQuery, source: Any) -> Tuple[List[str], List[Callable[[TaskItem], Any]]]:
+    """Labels and getters for the selected task columns."""
+    if parsed.star:
+        names = TASK_FIELDS + (['source_file'] if isinstance(source, MDQLCatalog) else [])
+        return names, [column_getter(name, source) for name in names]
+    getters = []
+    for item in parsed.items:
+        name = resolve_column(item)
+        getters.append(column_getter(name, source))
+    return list(parsed.columns), getters
+
+
+def _response(columns: List[str], rows: List[Dict[str, Any]], limit: Optional[int] = None) -> Dict[str, Any]:
+    if limit is not None:
+        rows = rows[:limit]
+    return {'ok': True, 'columns': columns, 'rows': rows, 'count': len(rows)}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Reads JSON requests line by line and writes one JSON response per line."""
+
+    def handle(self) -> None:
+        service = self.server.service
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError as e:
+                response = {'ok': False, 'error': f"Bad request: {e}"}
+            else:
+                response = service.handle(request)
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(service: QueryService, socket_path: Optional[str] = None,
+                port: Optional[int] = None, host: str = '127.0.0.1') -> socketserver.BaseServer:
+    """
+    Bind a server for a service: TCP on host:port when a port is given,
+    otherwise a Unix socket (default_socket_path()) readable only by the user.
+    """
+    if port is not None:
+        server = _TCPServer((host, port), _Handler)
+    else:
+        socket_path = socket_path or default_socket_path()
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+    server.service = service
+    return server
+
+
+def serve(socket_path: Optional[str] = None, port: Optional[int] = None, host: str = '127.0.0.1',
+          cache_dir: Optional[str] = None, workers: Optional[int] = None,
+          preload: Optional[List[str]] = None, watch: bool = False) -> None:
+    """Run a query server until interrupted, optionally loading some files up front."""
+    service = QueryService(cache_dir, workers, watch)
+    for path in preload or []:
+        service.source(path)
+    server = make_server(service, socket_path, port, host)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+        if port is None:
+            try:
+                os.remove(socket_path or default_socket_path())
+            except FileNotFoundError:
+                pass
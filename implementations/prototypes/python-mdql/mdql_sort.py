@@ -0,0 +1,115 @@
+"""
+MDQL Sorting
+ORDER BY for row sources of any size: a bounded heap when there is a LIMIT,
+an in-memory sort when the rows fit in the buffer, and an external merge
+sort that spills sorted runs to temp files when they do not.
+
+All three orders are stable, so rows with equal keys keep their input order,
+matching list.sort().
+"""
+
+import heapq
+import pickle
+import tempfile
+from itertools import count
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+# Rows held in memory before ORDER BY without LIMIT spills a sorted run
+DEFAULT_SORT_BUFFER = 100_000
+
+# Entries pickled together when writing a run, to keep per-row overhead low
+RUN_BATCH = 1024
+
+
+class Descending:
+    """Wraps a sort key so it compares in reverse (for DESC in a composite key)."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: 'Descending') -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Descending) and self.value == other.value
+
+    def __getstate__(self):
+        return (self.value,)
+
+    def __setstate__(self, state):
+        self.value, = state
+
+
+def top_k(rows: Iterable[Any], k: int, key: Callable[[Any], Any]) -> List[Any]:
+    """The k smallest rows by key in O(n log k), keeping only k rows in memory."""
+    if k <= 0:
+        return []
+    return heapq.nsmallest(k, rows, key=key)
+
+
+def external_sort(rows: Iterable[Any], key: Callable[[Any], Any],
+                  buffer_rows: int = DEFAULT_SORT_BUFFER, tmpdir: Optional[str] = None) -> Iterator[Any]:
+    """
+    Sort rows by key, holding at most buffer_rows of them in memory.
+
+    Input is cut into runs of buffer_rows, each sorted and written to a temp
+    file; the runs are then merged lazily with heapq.merge. When the input
+    fits in one buffer nothing is written.
+    """
+    sequence = count()
+    runs = []
+    buffer: List[Tuple[Any, int, Any]] = []
+    try:
+        for row in rows:
+            buffer.append((key(row), next(sequence), row))
+            if len(buffer) >= buffer_rows:
+                runs.append(_write_run(buffer, tmpdir))
+                buffer = []
+        buffer.sort(key=_entry_key)
+        if not runs:
+            for _, _, row in buffer:
+                yield row
+            return
+
+        merged = heapq.merge(*[_read_run(run) for run in runs], iter(buffer), key=_entry_key)
+        for _, _, row in merged:
+            yield row
+    finally:
+        for run in runs:
+            run.close()
+
+
+def sort_rows(rows: Iterable[Any], key: Callable[[Any], Any], limit: Optional[int] = None,
+              buffer_rows: int = DEFAULT_SORT_BUFFER, tmpdir: Optional[str] = None) -> Iterator[Any]:
+    """ORDER BY [LIMIT]: a bounded heap for LIMIT, otherwise a spilling sort."""
+    if limit is not None:
+        return iter(top_k(rows, limit, key))
+    return external_sort(rows, key, buffer_rows, tmpdir)
+
+
+def _entry_key(entry: Tuple[Any, int, Any]) -> Tuple[Any, int]:
+    # The sequence number breaks ties, so rows themselves are never compared
+    return entry[0], entry[1]
+
+
+def _write_run(buffer: List[Tuple[Any, int, Any]], tmpdir: Optional[str]):
+    """Sort a buffer and pickle it to an anonymous temp file in batches."""
+    buffer.sort(key=_entry_key)
+    run = tempfile.TemporaryFile(dir=tmpdir)
+    for start in range(0, len(buffer), RUN_BATCH):
+        pickle.dump(buffer[start:start + RUN_BATCH], run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run) -> Iterator[Tuple[Any, int, Any]]:
+    while True:
+        try:
+            batch = pickle.load(run)
+        except EOFError:
+            return
+        yield from batch
+
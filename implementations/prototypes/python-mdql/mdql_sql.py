@@ -0,0 +1,1130 @@
+"""
+MDQL SQL Front End
+Tokenizer, recursive-descent parser and predicate compiler for MDQL SELECT
+queries over task lists.
+
+Grammar:
+    query      := SELECT select_list FROM table_ref join* [WHERE expr]
+                  [GROUP BY column (',' column)*] [HAVING expr]
+                  [ORDER BY order_item (',' order_item)*] [LIMIT number] [';']
+    select_list:= '*' | value [AS alias] (',' value [AS alias])*
+    value      := column | aggregate
+    aggregate  := (COUNT | SUM | AVG | MIN | MAX) '(' [DISTINCT] (column | '*') ')'
+    table_ref  := source ['::' table_type] [[AS] alias]
+    join       := [INNER | LEFT [OUTER] | RIGHT [OUTER] | FULL [OUTER]] JOIN table_ref ON expr
+                | CROSS JOIN table_ref
+    expr       := and_expr (OR and_expr)*
+    and_expr   := not_expr (AND not_expr)*
+    not_expr   := NOT not_expr | predicate
+    predicate  := '(' expr ')'
+                | operand [cmp_op operand
+                           | [NOT] LIKE operand
+                           | [NOT] MATCH operand
+                           | [NOT] REGEXP operand
+                           | [NOT] IN '(' operand (',' operand)* ')'
+                           | IS [NOT] NULL]
+    operand    := value | string | number | TRUE | FALSE | NULL | '?'
+    order_item := value [ASC | DESC]
+
+A '?' is a positional parameter bound when a PreparedStatement is executed.
+`text MATCH 'words "a phrase" prefix*'` is a full-text search (see mdql_text).
+Queries with joins are run by mdql_join.JoinQuery, and queries with GROUP BY
+or aggregates by mdql_aggregate.
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from mdql import MDQL, MDQLStream, TaskItem
+from mdql_sort import DEFAULT_SORT_BUFFER, Descending, sort_rows, top_k
+from mdql_text import like_to_regex, like_literals, match_values, parse_match, regexp_compile
+
+
+class MDQLSyntaxError(ValueError):
+    """Raised for malformed MDQL queries."""
+
+    def __init__(self, message: str, position: Optional[int] = None):
+        if position is not None:
+            message = f"{message} (at position {position})"
+        super().__init__(message)
+        self.position = position
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'LIKE', 'IS', 'NULL',
+    'TRUE', 'FALSE', 'ORDER', 'BY', 'ASC', 'DESC', 'LIMIT',
+    'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'ON',
+    'GROUP', 'HAVING', 'AS', 'DISTINCT', 'MATCH', 'REGEXP',
+}
+
+AGGREGATE_FUNCTIONS = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX'}
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><>|!=|<=|>=|::|[=<>(),*.;/\-~:?])
+''', re.VERBOSE)
+
+
+@dataclass
+class Token:
+    """A lexical token with its source span."""
+    kind: str       # 'keyword', 'ident', 'string', 'number', 'op', 'eof'
+    value: Any
+    start: int
+    end: int
+
+
+def tokenize(text: str) -> List[Token]:
+    """Split a query string into tokens."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match:
+            raise MDQLSyntaxError(f"Unexpected character {text[pos]!r}", pos)
+        kind = match.lastgroup
+        raw = match.group()
+        if kind == 'string':
+            quote = raw[0]
+            tokens.append(Token('string', raw[1:-1].replace(quote * 2, quote), match.start(), match.end()))
+        elif kind == 'number':
+            value = float(raw) if '.' in raw else int(raw)
+            tokens.append(Token('number', value, match.start(), match.end()))
+        elif kind == 'ident':
+            upper = raw.upper()
+            if upper in KEYWORDS:
+                tokens.append(Token('keyword', upper, match.start(), match.end()))
+            else:
+                tokens.append(Token('ident', raw, match.start(), match.end()))
+        elif kind == 'op':
+            tokens.append(Token('op', raw, match.start(), match.end()))
+        pos = match.end()
+    tokens.append(Token('eof', None, len(text), len(text)))
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# AST
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Column:
+    name: str
+    table: Optional[str] = None
+
+    def __str__(self):
+        return f"{self.table}.{self.name}" if self.table else self.name
+
+
+@dataclass
+class Literal:
+    value: Any
+
+    def __str__(self):
+        if self.value is None:
+            return 'NULL'
+        if isinstance(self.value, bool):
+            return 'true' if self.value else 'false'
+        if isinstance(self.value, str):
+            return "'" + self.value.replace("'", "''") + "'"
+        return str(self.value)
+
+
+@dataclass
+class Param:
+    """A positional '?' placeholder."""
+    index: int
+
+    def __str__(self):
+        return '?'
+
+
+@dataclass
+class Compare:
+    op: str
+    left: Any
+    right: Any
+
+    def __str__(self):
+        return f"{self.left} {self.op} {self.right}"
+
+
+@dataclass
+class Like:
+    operand: Any
+    pattern: Any
+    negated: bool = False
+
+    def __str__(self):
+        return f"{self.operand} {'NOT LIKE' if self.negated else 'LIKE'} {self.pattern}"
+
+
+@dataclass
+class Match:
+    """Full-text search: every word, phrase and prefix in the query must occur."""
+    operand: Any
+    query: Any
+    negated: bool = False
+
+    def __str__(self):
+        return f"{self.operand} {'NOT MATCH' if self.negated else 'MATCH'} {self.query}"
+
+
+@dataclass
+class Regexp:
+    """Regular expression search anywhere in the value, ignoring case."""
+    operand: Any
+    pattern: Any
+    negated: bool = False
+
+    def __str__(self):
+        return f"{self.operand} {'NOT REGEXP' if self.negated else 'REGEXP'} {self.pattern}"
+
+
+@dataclass
+class InList:
+    operand: Any
+    values: List[Any]
+    negated: bool = False
+
+    def __str__(self):
+        values = ', '.join(str(v) for v in self.values)
+        return f"{self.operand} {'NOT IN' if self.negated else 'IN'} ({values})"
+
+
+@dataclass
+class IsNull:
+    operand: Any
+    negated: bool = False
+
+    def __str__(self):
+        return f"{self.operand} IS {'NOT NULL' if self.negated else 'NULL'}"
+
+
+@dataclass
+class Truthy:
+    """A bare operand used as a condition, e.g. WHERE has_notes."""
+    operand: Any
+
+    def __str__(self):
+        return str(self.operand)
+
+
+@dataclass
+class And:
+    items: List[Any]
+
+    def __str__(self):
+        return ' AND '.join(_wrap(item) for item in self.items)
+
+
+@dataclass
+class Or:
+    items: List[Any]
+
+    def __str__(self):
+        return ' OR '.join(_wrap(item) for item in self.items)
+
+
+@dataclass
+class Not:
+    operand: Any
+
+    def __str__(self):
+        return f"NOT {_wrap(self.operand)}"
+
+
+def _wrap(node: Any) -> str:
+    """Render a child node, parenthesising boolean connectives."""
+    if isinstance(node, (And, Or)):
+        return f"({node})"
+    return str(node)
+
+
+@dataclass
+class Aggregate:
+    """An aggregate call; column is None for COUNT(*)."""
+    func: str
+    column: Optional[Column] = None
+    distinct: bool = False
+
+    def __str__(self):
+        inner = '*' if self.column is None else str(self.column)
+        return f"{self.func}({'DISTINCT ' if self.distinct else ''}{inner})"
+
+
+@dataclass
+class OrderItem:
+    column: Any                 # Column, or Aggregate in grouped queries
+    descending: bool = False
+
+    def __str__(self):
+        return f"{self.column} {'DESC' if self.descending else 'ASC'}"
+
+
+@dataclass
+class TableRef:
+    """A FROM or JOIN source."""
+    source: str
+    table_type: Optional[str] = None
+    alias: Optional[str] = None
+
+    def __str__(self):
+        text = repr(self.source)
+        if self.table_type:
+            text += f"::{self.table_type}"
+        return f"{text} {self.alias}" if self.alias else text
+
+
+@dataclass
+class JoinClause:
+    kind: str                   # INNER, LEFT, RIGHT, FULL or CROSS
+    table: TableRef
+    condition: Any = None       # None for CROSS JOIN
+
+    def __str__(self):
+        text = f"{self.kind} JOIN {self.table}"
+        return f"{text} ON {self.condition}" if self.condition is not None else text
+
+
+@dataclass
+class SelectQuery:
+    """A parsed MDQL SELECT statement."""
+    columns: List[str]
+    source: str
+    table_type: Optional[str] = None
+    alias: Optional[str] = None
+    where: Any = None
+    order_by: List[OrderItem] = field(default_factory=list)
+    limit: Any = None           # int, Param or None
+    param_count: int = 0
+    joins: List[JoinClause] = field(default_factory=list)
+    star: bool = False          # SELECT *
+    items: List[Any] = field(default_factory=list)     # Column/Aggregate per label in columns
+    group_by: List[Column] = field(default_factory=list)
+    having: Any = None
+
+    @property
+    def is_aggregate(self) -> bool:
+        """True for GROUP BY queries and queries selecting aggregates."""
+        return bool(self.group_by) or any(isinstance(item, Aggregate) for item in self.items)
+
+    @property
+    def file(self) -> str:
+        """Source file path (compatibility with the old dict result)."""
+        return self.source
+
+    @property
+    def tables(self) -> List[TableRef]:
+        """The FROM source followed by each joined source."""
+        return [TableRef(self.source, self.table_type, self.alias)] + [join.table for join in self.joins]
+
+
+# Columns shown for SELECT *
+DEFAULT_COLUMNS = ['status', 'text', 'section', 'notes']
+
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+class Parser:
+    """Recursive-descent parser for MDQL SELECT queries."""
+
+    CMP_OPS = {'=', '!=', '<>', '<', '<=', '>', '>='}
+    JOIN_START = {'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS'}
+    SOURCE_STOP = {'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'ON'} | JOIN_START
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.param_count = 0
+
+    # -- token helpers ------------------------------------------------------
+
+    @property
+    def current(self) -> Token:
+        return self.tokens[self.pos]
+
+    def advance(self) -> Token:
+        token = self.tokens[self.pos]
+        if token.kind != 'eof':
+            self.pos += 1
+        return token
+
+    def at_keyword(self, *words: str) -> bool:
+        return self.current.kind == 'keyword' and self.current.value in words
+
+    def at_op(self, *ops: str) -> bool:
+        return self.current.kind == 'op' and self.current.value in ops
+
+    def expect_keyword(self, word: str) -> Token:
+        if not self.at_keyword(word):
+            raise self.error(f"Expected {word}")
+        return self.advance()
+
+    def expect_op(self, op: str) -> Token:
+        if not self.at_op(op):
+            raise self.error(f"Expected '{op}'")
+        return self.advance()
+
+    def error(self, message: str) -> MDQLSyntaxError:
+        token = self.current
+        found = 'end of query' if token.kind == 'eof' else repr(self.text[token.start:token.end])
+        return MDQLSyntaxError(f"{message}, found {found}", token.start)
+
+    # -- grammar ------------------------------------------------------------
+
+    def parse(self) -> SelectQuery:
+        self.expect_keyword('SELECT')
+        star = self.at_op('*')
+        columns, items = self.parse_select_list()
+        self.expect_keyword('FROM')
+        source, table_type, alias = self.parse_source()
+        query = SelectQuery(columns=columns, source=source, table_type=table_type, alias=alias,
+                            star=star, items=items)
+
+        while self.at_keyword(*self.JOIN_START):
+            query.joins.append(self.parse_join())
+
+        if self.at_keyword('WHERE'):
+            self.advance()
+            query.where = self.parse_expr()
+        if self.at_keyword('GROUP'):
+            self.advance()
+            self.expect_keyword('BY')
+            query.group_by = [self.parse_column()]
+            while self.at_op(','):
+                self.advance()
+                query.group_by.append(self.parse_column())
+        if self.at_keyword('HAVING'):
+            self.advance()
+            query.having = self.parse_expr()
+        if self.at_keyword('ORDER'):
+            self.advance()
+            self.expect_keyword('BY')
+            query.order_by = self.parse_order_list()
+        if self.at_keyword('LIMIT'):
+            self.advance()
+            if self.at_op('?'):
+                query.limit = self.parse_operand()
+            else:
+                token = self.advance()
+                if token.kind != 'number' or not isinstance(token.value, int):
+                    raise MDQLSyntaxError("LIMIT expects an integer", token.start)
+                query.limit = token.value
+        if self.at_op(';'):
+            self.advance()
+        if self.current.kind != 'eof':
+            raise self.error("Unexpected input")
+        query.param_count = self.param_count
+        return query
+
+    def parse_select_list(self) -> Tuple[List[str], List[Any]]:
+        """Parse the select list into display labels and their Column/Aggregate items."""
+        if self.at_op('*'):
+            self.advance()
+            return list(DEFAULT_COLUMNS), []
+        labels, items = [], []
+        while True:
+            item = self.parse_value()
+            label = str(item)
+            if self.at_keyword('AS'):
+                self.advance()
+                if self.current.kind != 'ident':
+                    raise self.error("Expected an alias after AS")
+                label = self.advance().value
+            labels.append(label)
+            items.append(item)
+            if not self.at_op(','):
+                return labels, items
+            self.advance()
+
+    def parse_source(self) -> Tuple[str, Optional[str], Optional[str]]:
+        """Parse a quoted or bare path, an optional ::type and an optional alias."""
+        token = self.current
+        if token.kind == 'string':
+            self.advance()
+            source = token.value
+        elif token.kind == 'eof' or self.at_keyword(*self.SOURCE_STOP):
+            raise self.error("Expected a file after FROM")
+        else:
+            # A bare path is a run of adjacent tokens, e.g. samples/notes-app/todo.md
+            first = self.advance()
+            last = first
+            while (self.current.kind != 'eof' and self.current.start == last.end
+                   and not self.at_op('::', ',', ';', '(', ')')):
+                last = self.advance()
+            source = self.text[first.start:last.end]
+
+        table_type = None
+        if '::' in source:
+            source, table_type = source.split('::', 1)
+        elif self.at_op('::'):
+            self.advance()
+            table_type = self.advance().value
+
+        alias = None
+        if self.at_keyword('AS'):
+            self.advance()
+            if self.current.kind != 'ident':
+                raise self.error("Expected an alias after AS")
+        if self.current.kind == 'ident':
+            alias = self.advance().value
+        return source, table_type, alias
+
+    def parse_join(self) -> JoinClause:
+        kind = 'INNER'
+        if self.at_keyword('INNER', 'CROSS'):
+            kind = self.advance().value
+        elif self.at_keyword('LEFT', 'RIGHT', 'FULL'):
+            kind = self.advance().value
+            if self.at_keyword('OUTER'):
+                self.advance()
+        self.expect_keyword('JOIN')
+        table = TableRef(*self.parse_source())
+        if kind == 'CROSS':
+            return JoinClause(kind, table)
+        self.expect_keyword('ON')
+        return JoinClause(kind, table, self.parse_expr())
+
+    def parse_order_list(self) -> List[OrderItem]:
+        items = [self.parse_order_item()]
+        while self.at_op(','):
+            self.advance()
+            items.append(self.parse_order_item())
+        return items
+
+    def parse_order_item(self) -> OrderItem:
+        column = self.parse_value()
+        descending = False
+        if self.at_keyword('ASC', 'DESC'):
+            descending = self.advance().value == 'DESC'
+        return OrderItem(column, descending)
+
+    def parse_value(self) -> Any:
+        """Parse a column, or an aggregate call such as COUNT(*)."""
+        token = self.current
+        if (token.kind == 'ident' and token.value.upper() in AGGREGATE_FUNCTIONS
+                and self.tokens[self.pos + 1].kind == 'op' and self.tokens[self.pos + 1].value == '('):
+            return self.parse_aggregate()
+        return self.parse_column()
+
+    def parse_aggregate(self) -> Aggregate:
+        func = self.advance().value.upper()
+        self.expect_op('(')
+        distinct = False
+        if self.at_keyword('DISTINCT'):
+            self.advance()
+            distinct = True
+        column = None
+        if self.at_op('*'):
+            if func != 'COUNT' or distinct:
+                raise self.error(f"{func} needs a column")
+            self.advance()
+        else:
+            column = self.parse_column()
+        self.expect_op(')')
+        return Aggregate(func, column, distinct)
+
+    def parse_column(self) -> Column:
+        token = self.current
+        if token.kind != 'ident':
+            raise self.error("Expected a column name")
+        self.advance()
+        if self.at_op('.') and self.tokens[self.pos + 1].kind == 'ident':
+            self.advance()
+            return Column(self.advance().value, table=token.value)
+        return Column(token.value)
+
+    def parse_expr(self) -> Any:
+        items = [self.parse_and()]
+        while self.at_keyword('OR'):
+            self.advance()
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else Or(items)
+
+    def parse_and(self) -> Any:
+        items = [self.parse_not()]
+        while self.at_keyword('AND'):
+            self.advance()
+            items.append(self.parse_not())
+        return items[0] if len(items) == 1 else And(items)
+
+    def parse_not(self) -> Any:
+        if self.at_keyword('NOT'):
+            self.advance()
+            return Not(self.parse_not())
+        return self.parse_predicate()
+
+    def parse_predicate(self) -> Any:
+        if self.at_op('('):
+            self.advance()
+            expr = self.parse_expr()
+            self.expect_op(')')
+            return expr
+
+        left = self.parse_operand()
+
+        if self.current.kind == 'op' and self.current.value in self.CMP_OPS:
+            op = self.advance().value
+            return Compare('!=' if op == '<>' else op, left, self.parse_operand())
+
+        negated = False
+        if self.at_keyword('NOT'):
+            self.advance()
+            negated = True
+            if not self.at_keyword('LIKE', 'MATCH', 'REGEXP', 'IN'):
+                raise self.error("Expected LIKE, MATCH, REGEXP or IN after NOT")
+
+        if self.at_keyword('LIKE'):
+            self.advance()
+            return Like(left, self.parse_operand(), negated)
+
+        if self.at_keyword('MATCH'):
+            self.advance()
+            return Match(left, self.parse_operand(), negated)
+
+        if self.at_keyword('REGEXP'):
+            self.advance()
+            return Regexp(left, self.parse_operand(), negated)
+
+        if self.at_keyword('IN'):
+            self.advance()
+            self.expect_op('(')
+            values = [self.parse_operand()]
+            while self.at_op(','):
+                self.advance()
+                values.append(self.parse_operand())
+            self.expect_op(')')
+            return InList(left, values, negated)
+
+        if self.at_keyword('IS'):
+            self.advance()
+            is_not = False
+            if self.at_keyword('NOT'):
+                self.advance()
+                is_not = True
+            self.expect_keyword('NULL')
+            return IsNull(left, is_not)
+
+        return Truthy(left)
+
+    def parse_operand(self) -> Any:
+        token = self.current
+        if token.kind == 'ident':
+            return self.parse_value()
+        if token.kind in ('string', 'number'):
+            self.advance()
+            return Literal(token.value)
+        if self.at_keyword('TRUE', 'FALSE'):
+            self.advance()
+            return Literal(token.value == 'TRUE')
+        if self.at_keyword('NULL'):
+            self.advance()
+            return Literal(None)
+        if self.at_op('?'):
+            self.advance()
+            self.param_count += 1
+            return Param(self.param_count - 1)
+        raise self.error("Expected a column or value")
+
+
+def parse_mdql_query(query: str) -> SelectQuery:
+    """Parse an MDQL SELECT query into a SelectQuery AST."""
+    return Parser(query.strip()).parse()
+
+
+# Parsed ASTs are never mutated, so identical query text can share one
+parse_cached = lru_cache(maxsize=256)(parse_mdql_query)
+
+
+# ---------------------------------------------------------------------------
+# Compiler
+# ---------------------------------------------------------------------------
+
+# Filterable task columns and their value types
+COLUMN_TYPES: Dict[str, type] = {
+    'text': str,
+    'completed': bool,
+    'section': str,
+    'section_level': int,
+    'indent_level': int,
+    'line_number': int,
+    'parent_line': int,
+    'has_children': bool,
+    'has_notes': bool,
+    'notes': list,
+    'priority': str,
+    'status': str,
+    'source_file': str,
+}
+
+COLUMN_ALIASES = {
+    'indent': 'indent_level',
+    'line': 'line_number',
+    'file': 'source_file',
+}
+
+
+def resolve_column(column: Column) -> str:
+    """Map a column reference to its canonical task column name."""
+    if not isinstance(column, Column):
+        raise MDQLSyntaxError(f"{column} can only be used with GROUP BY or other aggregates")
+    name = column.name.lower()
+    name = COLUMN_ALIASES.get(name, name)
+    if name not in COLUMN_TYPES:
+        known = ', '.join(sorted(COLUMN_TYPES))
+        raise MDQLSyntaxError(f"Unknown column '{column}' (known columns: {known})")
+    return name
+
+
+def column_getter(name: str, mdql: 'TaskSource') -> Callable[[TaskItem], Any]:
+    """Build an accessor for a task column (mdql is an MDQL or MDQLStream)."""
+    if name in ('priority', 'status'):
+        # Multi-file sources resolve a task's section within its own file
+        section_for = getattr(mdql, 'section_for', None)
+        if section_for is not None:
+            return lambda t: getattr(section_for(t), name, None)
+        # Edits update this dict in place; MDQL drops its cached statements
+        # when a reload replaces it
+        sections = mdql.sections
+        return lambda t: getattr(sections.get(t.section), name, None)
+    if name == 'has_notes':
+        return lambda t: bool(t.notes)
+    getter_name = name
+    return lambda t: getattr(t, getter_name)
+
+
+def coerce(value: Any, kind: type) -> Any:
+    """Convert a literal to a column's type (e.g. 'true' for a bool column)."""
+    if value is None:
+        return None
+    if kind is bool and not isinstance(value, bool):
+        return str(value).lower() in ('true', '1', 'yes')
+    if kind is int and not isinstance(value, int):
+        try:
+            return int(value)
+        except ValueError:
+            raise MDQLSyntaxError(f"Expected an integer, got {value!r}")
+    if kind in (str, list) and not isinstance(value, str):
+        return str(value).lower() if isinstance(value, bool) else str(value)
+    return value
+
+
+COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+class Compiler:
+    """Compiles WHERE trees into closures over TaskItem rows."""
+
+    def __init__(self, mdql: 'TaskSource', params: Sequence[Any] = ()):
+        self.mdql = mdql
+        self.params = params
+
+    def operand(self, node: Any) -> Tuple[Callable[[TaskItem], Any], Optional[type]]:
+        """Compile an operand to (getter, column type or None for literals)."""
+        if isinstance(node, Column):
+            name = resolve_column(node)
+            return column_getter(name, self.mdql), COLUMN_TYPES[name]
+        if isinstance(node, (Literal, Param)):
+            value = self.literal(node, None)
+            return (lambda t: value), None
+        raise MDQLSyntaxError(f"Unsupported operand {node}")
+
+    def literal(self, node: Any, kind: Optional[type]) -> Any:
+        """Evaluate a literal or bound parameter, coerced to the column type."""
+        if isinstance(node, Param):
+            value = self.params[node.index]
+        elif isinstance(node, Literal):
+            value = node.value
+        else:
+            raise MDQLSyntaxError(f"Expected a value, got {node}")
+        return coerce(value, kind) if kind else value
+
+    def compile(self, node: Any) -> Callable[[TaskItem], bool]:
+        """Compile a condition into a predicate."""
+        if node is None:
+            return lambda t: True
+
+        if isinstance(node, And):
+            parts = [self.compile(item) for item in node.items]
+            return lambda t: all(p(t) for p in parts)
+
+        if isinstance(node, Or):
+            parts = [self.compile(item) for item in node.items]
+            return lambda t: any(p(t) for p in parts)
+
+        if isinstance(node, Not):
+            inner = self.compile(node.operand)
+            return lambda t: not inner(t)
+
+        if isinstance(node, Truthy):
+            get, _ = self.operand(node.operand)
+            return lambda t: bool(get(t))
+
+        if isinstance(node, IsNull):
+            get, _ = self.operand(node.operand)
+            if node.negated:
+                return lambda t: get(t) is not None
+            return lambda t: get(t) is None
+
+        if isinstance(node, Compare):
+            return self.compile_compare(node)
+
+        if isinstance(node, (Like, Regexp)):
+            get, kind = self.operand(node.operand)
+            pattern = str(self.literal(node.pattern, None))
+            if isinstance(node, Like):
+                find = like_to_regex(pattern).match
+            else:
+                find = regexp_compile(pattern).search
+            if kind is list:
+                test = lambda t: any(find(v) for v in get(t))
+            else:
+                def test(t):
+                    value = get(t)
+                    return value is not None and find(str(value)) is not None
+            if node.negated:
+                return lambda t: not test(t)
+            return test
+
+        if isinstance(node, Match):
+            get, kind = self.operand(node.operand)
+            if kind not in (str, list):
+                raise MDQLSyntaxError(f"MATCH needs a text column, got {node.operand}")
+            search = parse_match(str(self.literal(node.query, None)))
+            if node.negated:
+                return lambda t: not match_values(search, get(t))
+            return lambda t: match_values(search, get(t))
+
+        if isinstance(node, InList):
+            get, kind = self.operand(node.operand)
+            values = frozenset(self.literal(v, kind) for v in node.values)
+            if kind is list:
+                test = lambda t: any(v in values for v in get(t))
+            else:
+                test = lambda t: get(t) in values
+            if node.negated:
+                return lambda t: not test(t)
+            return test
+
+        raise MDQLSyntaxError(f"Unsupported condition {node}")
+
+    def compile_compare(self, node: Compare) -> Callable[[TaskItem], bool]:
+        cmp = COMPARATORS[node.op]
+        left_column = isinstance(node.left, (Column, Aggregate))
+        right_column = isinstance(node.right, (Column, Aggregate))
+
+        if left_column and not right_column:
+            get, kind = self.operand(node.left)
+            value = self.literal(node.right, kind)
+        elif right_column and not left_column:
+            # Normalise "value op column" to "column op' value"
+            flipped = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}.get(node.op, node.op)
+            return self.compile_compare(Compare(flipped, node.right, node.left))
+        else:
+            left, _ = self.operand(node.left)
+            right, _ = self.operand(node.right)
+            return lambda t: _safe_compare(cmp, left(t), right(t))
+
+        if kind is list:
+            return lambda t: any(_safe_compare(cmp, v, value) for v in get(t))
+        if node.op == '=':
+            return lambda t: get(t) == value
+        return lambda t: _safe_compare(cmp, get(t), value)
+
+
+def _safe_compare(cmp: Callable[[Any, Any], bool], a: Any, b: Any) -> bool:
+    """Compare two values, treating NULL and type mismatches as no match."""
+    if a is None or b is None:
+        return False
+    try:
+        return cmp(a, b)
+    except TypeError:
+        return False
+
+
+def compile_predicate(where: Any, mdql: 'TaskSource', params: Sequence[Any] = ()) -> Callable[[TaskItem], bool]:
+    """Compile a WHERE tree into a predicate over tasks."""
+    return Compiler(mdql, params).compile(where)
+
+
+def has_params(node: Any) -> bool:
+    """Check whether an AST subtree contains '?' placeholders."""
+    if isinstance(node, Param):
+        return True
+    if isinstance(node, list):
+        return any(has_params(item) for item in node)
+    if hasattr(node, '__dataclass_fields__'):
+        return any(has_params(getattr(node, name)) for name in node.__dataclass_fields__)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+# Anything with a `sections` dict that column getters can read from;
+# mdql_mmap.MappedTaskFile and mdql_catalog.MDQLCatalog also fit
+TaskSource = Union[MDQL, MDQLStream]
+
+
+# Columns that MDQL.query() can answer directly from its indexes
+PUSHDOWN_EQUALITY = {'completed', 'section', 'priority', 'status', 'indent_level', 'has_notes'}
+PUSHDOWN_CONTAINS = {'text': 'text_contains', 'notes': 'notes_contains'}
+# Columns with text search filters (text_match=, section_like=, notes_regexp=, ...)
+PUSHDOWN_SEARCH = {'text', 'notes', 'section'}
+
+
+def conjuncts(where: Any) -> List[Any]:
+    """Flatten a WHERE tree into its top-level AND terms."""
+    if where is None:
+        return []
+    if isinstance(where, And):
+        return [term for item in where.items for term in conjuncts(item)]
+    return [where]
+
+
+def split_filters(where: Any) -> Tuple[Dict[str, Any], Any]:
+    """
+    Split a WHERE tree into MDQL.query() filters and a residual condition.
+
+    Simple equality, LIKE, MATCH and REGEXP terms joined by AND are pushed
+    down to the index-driven planner; everything else is evaluated by the compiled
+    residual predicate.
+    """
+    filters: Dict[str, Any] = {}
+    residual = []
+    for term in conjuncts(where):
+        key, value = _pushdown(term)
+        if key is not None and key not in filters:
+            filters[key] = value
+        else:
+            residual.append(term)
+
+    if not residual:
+        return filters, None
+    return filters, residual[0] if len(residual) == 1 else And(residual)
+
+
+def _pushdown(term: Any) -> Tuple[Optional[str], Any]:
+    """Convert a single term into a MDQL.query() filter if possible."""
+    if isinstance(term, Compare) and term.op == '=':
+        column, value = term.left, term.right
+        if isinstance(value, Column) and isinstance(column, Literal):
+            column, value = value, column
+        if isinstance(column, Column) and isinstance(value, Param):
+            name = resolve_column(column)
+            if name in PUSHDOWN_EQUALITY:
+                return name, value
+        if isinstance(column, Column) and isinstance(value, Literal) and value.value is not None:
+            name = resolve_column(column)
+            if name in PUSHDOWN_EQUALITY:
+                return name, coerce(value.value, COLUMN_TYPES[name])
+
+    if isinstance(term, Like) and not term.negated and isinstance(term.operand, Column):
+        name = resolve_column(term.operand)
+        if name in PUSHDOWN_SEARCH and isinstance(term.pattern, Literal):
+            pattern = str(term.pattern.value)
+            inner = pattern[1:-1]
+            if (name in PUSHDOWN_CONTAINS and len(pattern) >= 2 and pattern[0] == '%' and pattern[-1] == '%'
+                    and inner and '%' not in inner and '_' not in inner):
+                return PUSHDOWN_CONTAINS[name], inner
+            if like_literals(pattern):
+                return f"{name}_like", pattern
+
+    if (isinstance(term, (Match, Regexp)) and not term.negated and isinstance(term.operand, Column)
+            and isinstance(getattr(term, 'query', getattr(term, 'pattern', None)), Literal)):
+        name = resolve_column(term.operand)
+        if name in PUSHDOWN_SEARCH:
+            kind = 'match' if isinstance(term, Match) else 'regexp'
+            value = term.query if isinstance(term, Match) else term.pattern
+            return f"{name}_{kind}", str(value.value)
+
+    return None, None
+
+
+def sort_tasks(tasks: Iterable[TaskItem], order_by: List[OrderItem], mdql: 'TaskSource',
+               limit: Optional[int] = None) -> List[TaskItem]:
+    """Sort tasks by ORDER BY items (NULLs sort last); with a limit, keep only the first rows."""
+    key = order_key([(column_getter(resolve_column(item.column), mdql), item.descending) for item in order_by])
+    if limit is not None:
+        return top_k(tasks, limit, key)
+    return sorted(tasks, key=key)
+
+
+def order_key(getters: Sequence[Tuple[Callable[[Any], Any], bool]]) -> Callable[[Any], Any]:
+    """Build one sort key from (getter, descending) pairs, for heaps and merges."""
+    if len(getters) == 1 and not getters[0][1]:
+        get = getters[0][0]
+        return lambda row: _sort_key(get(row))
+    return lambda row: tuple(Descending(_sort_key(get(row))) if descending else _sort_key(get(row))
+                             for get, descending in getters)
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    if value is None:
+        return (1, '')
+    if isinstance(value, list):
+        return (0, len(value))
+    return (0, value)
+
+
+def bind_filters(filters: Dict[str, Any], params: Sequence[Any]) -> Dict[str, Any]:
+    """Substitute bound parameter values into pushed-down filters."""
+    return {
+        key: coerce(params[value.index], COLUMN_TYPES[key]) if isinstance(value, Param) else value
+        for key, value in filters.items()
+    }
+
+
+def run_plan(query: SelectQuery, mdql: MDQL, filters: Dict[str, Any],
+             predicate: Optional[Callable[[TaskItem], bool]], limit: Optional[int]) -> List[TaskItem]:
+    """Execute pushed-down filters, the residual predicate, ORDER BY and LIMIT."""
+    results = mdql.query(**filters) if filters else mdql.tasks
+    if predicate is not None:
+        results = [t for t in results if predicate(t)]
+    if query.order_by:
+        return sort_tasks(results, query.order_by, mdql, limit)
+    if limit is not None:
+        results = results[:limit]
+    return results
+
+
+def execute_query(query: SelectQuery, mdql: MDQL, params: Sequence[Any] = ()) -> List[TaskItem]:
+    """Run a parsed SELECT against a loaded file."""
+    return PreparedStatement(query, mdql).execute(*params)
+
+
+class PreparedStatement:
+    """
+    A SELECT parsed and planned once, then executed with bound '?' values.
+
+    The residual WHERE predicate is compiled at prepare time when it has no
+    placeholders; otherwise it is rebuilt from the cached AST per execution.
+    """
+
+    def __init__(self, query: Any, mdql: MDQL):
+        self.query = parse_cached(query) if isinstance(query, str) else query
+        if self.query.joins:
+            raise ValueError("Queries with JOIN run through mdql_join.JoinQuery")
+        if self.query.is_aggregate:
+            raise ValueError("Queries with GROUP BY or aggregates run through mdql_aggregate")
+        self.mdql = mdql
+        self.filters, self.residual = split_filters(self.query.where)
+        self._filters_bound = not has_params(list(self.filters.values()))
+        self._predicate = None
+        if self.residual is not None and not has_params(self.residual):
+            self._predicate = compile_predicate(self.residual, mdql)
+
+    @property
+    def param_count(self) -> int:
+        return self.query.param_count
+
+    def execute(self, *params: Any) -> List[TaskItem]:
+        """Run the statement with positional parameter values."""
+        if len(params) != self.param_count:
+            raise ValueError(f"Expected {self.param_count} parameter(s), got {len(params)}")
+
+        filters = self.filters if self._filters_bound else bind_filters(self.filters, params)
+        predicate = self._predicate
+        if predicate is None and self.residual is not None:
+            predicate = compile_predicate(self.residual, self.mdql, params)
+
+        limit = self.query.limit
+        if isinstance(limit, Param):
+            limit = coerce(params[limit.index], int)
+        return run_plan(self.query, self.mdql, filters, predicate, limit)
+
+
+class StatementCache:
+    """LRU cache of PreparedStatements keyed by query text."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.statements: 'OrderedDict[str, PreparedStatement]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, mdql: MDQL) -> PreparedStatement:
+        """Get a cached statement, preparing it on a miss."""
+        statement = self.statements.get(text)
+        if statement is not None:
+            self.hits += 1
+            self.statements.move_to_end(text)
+            return statement
+
+        self.misses += 1
+        statement = PreparedStatement(text, mdql)
+        self.statements[text] = statement
+        if len(self.statements) > self.maxsize:
+            self.statements.popitem(last=False)
+        return statement
+
+
+def stream_query(query: SelectQuery, source: Union[str, 'TaskSource'],
+                 params: Sequence[Any] = (), sort_buffer: int = DEFAULT_SORT_BUFFER) -> Iterator[TaskItem]:
+    """
+    Run a SELECT over a file without loading it, yielding matches lazily.
+
+    source is a file path or any iterable of tasks with a `sections` dict,
+    such as an MDQLStream or a MappedTaskFile. Without ORDER BY, rows are produced as the file is
+    read, so LIMIT (or a consumer that stops early) ends the parse. ORDER BY
+    with LIMIT keeps a heap of LIMIT rows; without LIMIT, matches beyond
+    sort_buffer rows are spilled to temp files in sorted runs.
+    """
+    if isinstance(query, str):
+        query = parse_cached(query)
+    if query.joins:
+        raise ValueError("Queries with JOIN cannot be streamed")
+    if query.is_aggregate:
+        raise ValueError("Use mdql_aggregate.aggregate_query for GROUP BY and aggregates")
+    stream = MDQLStream(source) if isinstance(source, str) else source
+    predicate = compile_predicate(query.where, stream, params)
+    limit = query.limit
+    if isinstance(limit, Param):
+        limit = coerce(params[limit.index], int)
+
+    results: Iterable[TaskItem] = (t for t in stream if predicate(t))
+    if query.order_by:
+        key = order_key([(column_getter(resolve_column(item.column), stream), item.descending)
+                         for item in query.order_by])
+        return sort_rows(results, key, limit, sort_buffer)
+    if limit is not None:
+        results = islice(results, limit)
+    return iter(results)
+
+
+def explain_query(query: SelectQuery, mdql: MDQL) -> str:
+    """Describe how execute_query() will run a SELECT."""
+    filters, residual = split_filters(query.where)
+    lines = [str(mdql.explain(**filters))]
+    if residual is not None:
+        lines.append(f"Residual predicate: {residual}")
+    if query.order_by and query.limit is not None:
+        lines.append(f"Top {query.limit} by " + ', '.join(str(item) for item in query.order_by) + " (bounded heap)")
+    elif query.order_by:
+        lines.append("Sort: " + ', '.join(str(item) for item in query.order_by))
+    elif query.limit is not None:
+        lines.append(f"Limit: {query.limit}")
+    return "\n".join(lines)
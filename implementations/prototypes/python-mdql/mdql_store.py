@@ -0,0 +1,357 @@
+"""
+MDQL Compact Task Store
+Columnar, array-backed storage for large task files, with lightweight
+read-only views that expose the TaskItem attributes.
+"""
+
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from mdql import MDQLParser, SectionMetadata, TaskItem
+from mdql_text import SEARCH_FIELDS, SEARCH_KINDS, value_matcher
+
+
+# Bit layout of TaskStore.flags
+COMPLETED_BIT = 0x01
+HAS_CHILDREN_BIT = 0x02
+INDENT_SHIFT = 2          # indent_level lives in the upper fourteen bits
+MAX_INDENT = 0x3FFF
+
+
+class TaskStore:
+    """
+    Parallel-array storage for tasks.
+
+    Per task: a 16-bit flags word (completed, has_children and indent_level packed
+    together), the section heading level, an interned section id, line and
+    parent line numbers, and the index of its first string. Task text and
+    notes are UTF-8 encoded into one blob: string k is
+    blob[bounds[k]:bounds[k + 1]], task i owns strings first[i] .. first[i + 1] - 1,
+    and the first of those is its text.
+    """
+
+    def __init__(self):
+        self.flags = array('H')
+        self.section_levels = array('B')
+        self.section_ids = array('I')
+        self.line_numbers = array('I')
+        self.parent_lines = array('I')    # 0 means no parent
+        self.first = array('I', [0])
+        self.bounds = array('I', [0])
+        self.section_names: List[str] = []
+        self._section_ids: Dict[str, int] = {}
+        self._blob = bytearray()
+        self._line_index: Optional[Dict[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def intern_section(self, name: str) -> int:
+        """Get the id of a section name, adding it if new."""
+        section_id = self._section_ids.get(name)
+        if section_id is None:
+            section_id = len(self.section_names)
+            self.section_names.append(name)
+            self._section_ids[name] = section_id
+        return section_id
+
+    def section_id(self, name: str) -> Optional[int]:
+        """Get the id of a section name, or None if no task uses it."""
+        return self._section_ids.get(name)
+
+    def _add_string(self, value: str) -> None:
+        self._blob += value.encode('utf-8')
+        self.bounds.append(len(self._blob))
+
+    def append(self, task: TaskItem) -> None:
+        """Copy a parsed task into the columns."""
+        if task.indent_level > MAX_INDENT:
+            raise ValueError(f"Task on line {task.line_number} is nested {task.indent_level} levels deep; "
+                             f"the compact store holds at most {MAX_INDENT}")
+        flags = task.indent_level << INDENT_SHIFT
+        if task.completed:
+            flags |= COMPLETED_BIT
+        if task.has_children:
+            flags |= HAS_CHILDREN_BIT
+
+        self.flags.append(flags)
+        self.section_levels.append(task.section_level)
+        self.section_ids.append(self.intern_section(task.section))
+        self.line_numbers.append(task.line_number)
+        self.parent_lines.append(task.parent_line or 0)
+
+        self._add_string(task.text)
+        for note in task.notes:
+            self._add_string(note)
+        self.first.append(len(self.bounds) - 1)
+        self._line_index = None
+
+    def freeze(self) -> None:
+        """Convert the growable text buffer to immutable bytes."""
+        if isinstance(self._blob, bytearray):
+            self._blob = bytes(self._blob)
+
+    def string(self, k: int) -> str:
+        return self._blob[self.bounds[k]:self.bounds[k + 1]].decode('utf-8')
+
+    def text(self, i: int) -> str:
+        return self.string(self.first[i])
+
+    def note_count(self, i: int) -> int:
+        return self.first[i + 1] - self.first[i] - 1
+
+    def notes(self, i: int) -> List[str]:
+        return [self.string(k) for k in range(self.first[i] + 1, self.first[i + 1])]
+
+    def completed(self, i: int) -> bool:
+        return bool(self.flags[i] & COMPLETED_BIT)
+
+    def set_completed(self, i: int, completed: bool) -> None:
+        if completed:
+            self.flags[i] |= COMPLETED_BIT
+        else:
+            self.flags[i] &= ~COMPLETED_BIT & 0xFFFF
+
+    def indent_level(self, i: int) -> int:
+        return self.flags[i] >> INDENT_SHIFT
+
+    def index_of_line(self, line_number: int) -> Optional[int]:
+        """Find the task on a line."""
+        if self._line_index is None:
+            self._line_index = {line: i for i, line in enumerate(self.line_numbers)}
+        return self._line_index.get(line_number)
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the columns and the text blob."""
+        columns = (self.flags, self.section_levels, self.section_ids, self.line_numbers,
+                   self.parent_lines, self.first, self.bounds)
+        return sum(col.itemsize * len(col) for col in columns) + len(self._blob)
+
+
+class TaskView:
+    """A read-only TaskItem lookalike over one row of a TaskStore."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: TaskStore, index: int):
+        self._store = store
+        self._index = index
+
+    @property
+    def text(self) -> str:
+        return self._store.text(self._index)
+
+    @property
+    def completed(self) -> bool:
+        return self._store.completed(self._index)
+
+    @property
+    def section(self) -> str:
+        return self._store.section_names[self._store.section_ids[self._index]]
+
+    @property
+    def section_level(self) -> int:
+        return self._store.section_levels[self._index]
+
+    @property
+    def indent_level(self) -> int:
+        return self._store.indent_level(self._index)
+
+    @property
+    def line_number(self) -> int:
+        return self._store.line_numbers[self._index]
+
+    @property
+    def parent_line(self) -> Optional[int]:
+        return self._store.parent_lines[self._index] or None
+
+    @property
+    def has_children(self) -> bool:
+        return bool(self._store.flags[self._index] & HAS_CHILDREN_BIT)
+
+    @property
+    def notes(self) -> List[str]:
+        return self._store.notes(self._index)
+
+    @property
+    def children(self) -> List['TaskView']:
+        """Direct subtasks (the rows after this one that name it as parent)."""
+        store, i = self._store, self._index
+        if not self.has_children:
+            return []
+        line = store.line_numbers[i]
+        indent = store.indent_level(i)
+        children = []
+        j = i + 1
+        while j < len(store) and store.indent_level(j) > indent and store.section_ids[j] == store.section_ids[i]:
+            if store.parent_lines[j] == line:
+                children.append(TaskView(store, j))
+            j += 1
+        return children
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, TaskView) and other._store is self._store and other._index == self._index
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self._index))
+
+    def __repr__(self):
+        status = "✓" if self.completed else "☐"
+        indent = "  " * self.indent_level
+        count = self._store.note_count(self._index)
+        notes_str = f" [{count} notes]" if count else ""
+        return f"{indent}{status} {self.text}{notes_str} (line {self.line_number})"
+
+
+class TaskList(Sequence):
+    """List-like access to a TaskStore that creates views on demand."""
+
+    def __init__(self, store: TaskStore, indices: Optional[Sequence[int]] = None):
+        self._store = store
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._store) if self._indices is None else len(self._indices)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[TaskView, 'TaskList']:
+        if isinstance(item, slice):
+            indices = range(len(self._store)) if self._indices is None else self._indices
+            return TaskList(self._store, indices[item])
+        if self._indices is not None:
+            item = self._indices[item]
+        elif item < 0:
+            item += len(self._store)
+        if not 0 <= item < len(self._store):
+            raise IndexError('task index out of range')
+        return TaskView(self._store, item)
+
+    def __iter__(self) -> Iterator[TaskView]:
+        store = self._store
+        indices = range(len(store)) if self._indices is None else self._indices
+        for i in indices:
+            yield TaskView(store, i)
+
+
+class CompactMDQL:
+    """
+    Read-mostly MDQL over a columnar TaskStore.
+
+    Parses with the streaming parser, so TaskItem objects are only alive
+    while their subtree is being read. Offers the same tasks, sections,
+    query() and get_section_summary() interface as MDQL, plus checkbox
+    toggles on the in-memory store; use MDQL for edits that are saved.
+    Iterating it yields the task views, so it is also a source for
+    stream_query() and aggregate_query() (mdql-query.py --compact).
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.store = TaskStore()
+        self._sections: Dict[str, SectionMetadata] = {}
+        for item in MDQLParser().iter_file(filepath):
+            if isinstance(item, TaskItem):
+                self.store.append(item)
+            else:
+                self._sections[item.section_name] = item
+        self.store.freeze()
+
+    @property
+    def tasks(self) -> TaskList:
+        """Get all tasks as views."""
+        return TaskList(self.store)
+
+    @property
+    def sections(self) -> Dict[str, SectionMetadata]:
+        """Get all section metadata."""
+        return self._sections
+
+    def __iter__(self) -> Iterator[TaskView]:
+        return iter(self.tasks)
+
+    def _section_ids_where(self, attr: str, value: str) -> set:
+        ids = set()
+        for name, meta in self._sections.items():
+            if getattr(meta, attr) == value:
+                section_id = self.store.section_id(name)
+                if section_id is not None:
+                    ids.add(section_id)
+        return ids
+
+    def query(self, **filters) -> TaskList:
+        """Query tasks with the same filters as MDQL.query()."""
+        store = self.store
+        flags = store.flags
+        section_ids = store.section_ids
+        indices = range(len(store))
+
+        if 'section' in filters:
+            section_id = store.section_id(filters['section'])
+            indices = [i for i in indices if section_ids[i] == section_id]
+        for attr in ('priority', 'status'):
+            if attr in filters:
+                wanted = self._section_ids_where(attr, filters[attr])
+                indices = [i for i in indices if section_ids[i] in wanted]
+        if 'completed' in filters:
+            bit = COMPLETED_BIT if filters['completed'] else 0
+            indices = [i for i in indices if flags[i] & COMPLETED_BIT == bit]
+        if 'indent_level' in filters:
+            indent = filters['indent_level']
+            indices = [i for i in indices if flags[i] >> INDENT_SHIFT == indent]
+        if 'has_notes' in filters:
+            has_notes = bool(filters['has_notes'])
+            first = store.first
+            indices = [i for i in indices if (first[i + 1] - first[i] > 1) == has_notes]
+        section_names = store.section_names
+        values = {
+            'text': store.text,
+            'notes': store.notes,
+            'section': lambda i: section_names[section_ids[i]],
+        }
+        for name in SEARCH_FIELDS:
+            for kind in SEARCH_KINDS:
+                if f"{name}_{kind}" in filters:
+                    matcher, value = value_matcher(kind, filters[f"{name}_{kind}"]), values[name]
+                    indices = [i for i in indices if matcher(value(i))]
+
+        return TaskList(store, list(indices))
+
+    def mark_complete(self, line_number: int) -> None:
+        """Mark a task as complete in memory."""
+        i = self.store.index_of_line(line_number)
+        if i is not None:
+            self.store.set_completed(i, True)
+
+    def mark_incomplete(self, line_number: int) -> None:
+        """Mark a task as incomplete in memory."""
+        i = self.store.index_of_line(line_number)
+        if i is not None:
+            self.store.set_completed(i, False)
+
+    def get_section_summary(self) -> List[Dict[str, Any]]:
+        """Get summary statistics for each section (top-level tasks only)."""
+        store = self.store
+        totals = [0] * len(store.section_names)
+        done = [0] * len(store.section_names)
+        for i, flags in enumerate(store.flags):
+            if flags >> INDENT_SHIFT == 0:
+                section_id = store.section_ids[i]
+                totals[section_id] += 1
+                if flags & COMPLETED_BIT:
+                    done[section_id] += 1
+
+        summary = []
+        for section_name, metadata in self._sections.items():
+            section_id = store.section_id(section_name)
+            total = totals[section_id] if section_id is not None else 0
+            if total > 0:
+                completed = done[section_id]
+                summary.append({
+                    'section': section_name,
+                    'priority': metadata.priority,
+                    'status': metadata.status,
+                    'total_tasks': total,
+                    'completed': completed,
+                    'remaining': total - completed,
+                    'completion_pct': round(100 * completed / total, 1)
+                })
+        return summary
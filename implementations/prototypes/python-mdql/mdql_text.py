@@ -0,0 +1,510 @@
+"""
+MDQL Text Indexes
+Word and trigram indexes over task text and notes, and the matchers for the
+text search filters (contains, MATCH, LIKE, REGEXP).
+
+TextIndex splits text into lowercased \\w+ terms and maps every term to
+{doc id: positions}. It answers MATCH queries (all words, "quoted phrases"
+at consecutive positions, word* prefixes) straight from the postings.
+
+TrigramIndex maps every three-character substring to the docs containing
+it. A substring, LIKE pattern or regex is reduced to the literal runs every
+match must contain; docs holding all of their trigrams are the candidates,
+which are then checked with the real predicate.
+
+MDQL keeps both up to date as tasks are edited, and stores them next to the
+parse cache so an unchanged file does not have to be re-indexed.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+TERM_PATTERN = re.compile(r'\w+')
+PHRASE_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+FIELDS = ('text', 'notes')
+
+# Text search filters, e.g. text_contains=, notes_regexp=, section_like=
+SEARCH_FIELDS = ('text', 'notes', 'section')
+SEARCH_KINDS = ('contains', 'match', 'like', 'regexp')
+
+# Postings for one field: term -> {doc id: position, or a tuple of positions}.
+# Most terms occur once per task, and a bare int pickles and loads far faster.
+Postings = Dict[str, Dict[int, Any]]
+
+
+def terms(value: str) -> List[str]:
+    """Split text into lowercased word terms."""
+    return TERM_PATTERN.findall(value.lower())
+
+
+def field_positions(values: Iterable[str]) -> Dict[str, List[int]]:
+    """
+    Map each term to its positions across values.
+
+    Positions jump by one between values (notes), so a phrase never matches
+    across the end of one note and the start of the next.
+    """
+    positions: Dict[str, List[int]] = {}
+    offset = 0
+    for value in values:
+        words = terms(value)
+        for i, term in enumerate(words):
+            positions.setdefault(term, []).append(offset + i)
+        offset += len(words) + 1
+    return positions
+
+
+def task_positions(task: Any) -> Dict[str, Dict[str, List[int]]]:
+    """Term positions for each indexed field of a task."""
+    return {'text': field_positions([task.text]), 'notes': field_positions(task.notes or [])}
+
+
+@dataclass
+class MatchQuery:
+    """A parsed MATCH string: every word, phrase and prefix must be present."""
+    words: List[str] = field(default_factory=list)
+    phrases: List[List[str]] = field(default_factory=list)
+    prefixes: List[str] = field(default_factory=list)
+
+    def __str__(self):
+        parts = self.words + [f'"{" ".join(p)}"' for p in self.phrases] + [f"{p}*" for p in self.prefixes]
+        return ' '.join(parts)
+
+
+def parse_match(text: str) -> MatchQuery:
+    """
+    Parse a MATCH string.
+
+        camera mallak        both words, anywhere
+        "final date"         the words next to each other, in order
+        confirm*             any word starting with "confirm"
+    """
+    query = MatchQuery()
+    for quoted, bare in PHRASE_PATTERN.findall(text):
+        if bare and bare.endswith('*') and len(terms(bare)) == 1:
+            query.prefixes.append(terms(bare)[0])
+            continue
+        words = terms(quoted if quoted else bare)
+        if len(words) == 1:
+            query.words.append(words[0])
+        elif words:
+            # "foo-bar" tokenizes to two words, which must stay adjacent
+            query.phrases.append(words)
+    if not (query.words or query.phrases or query.prefixes):
+        raise ValueError(f"MATCH needs at least one word, got {text!r}")
+    return query
+
+
+def _phrase_at(positions: Dict[str, List[int]], phrase: List[str]) -> bool:
+    """Whether the phrase's words occur at consecutive positions."""
+    starts: Set[int] = set(positions.get(phrase[0], ()))
+    for k, word in enumerate(phrase[1:], 1):
+        starts &= {p - k for p in positions.get(word, ())}
+        if not starts:
+            return False
+    return bool(starts)
+
+
+def _places(stored: Any) -> Any:
+    return (stored,) if isinstance(stored, int) else stored
+
+
+def matches(query: MatchQuery, positions: Dict[str, List[int]]) -> bool:
+    """Evaluate a MATCH query against one field's term positions (no index)."""
+    return (all(word in positions for word in query.words)
+            and all(any(term.startswith(prefix) for term in positions) for prefix in query.prefixes)
+            and all(_phrase_at(positions, phrase) for phrase in query.phrases))
+
+
+def match_values(query: MatchQuery, value: Any) -> bool:
+    """Evaluate a MATCH query against a text or notes column value."""
+    if value is None:
+        return False
+    return matches(query, field_positions(value if isinstance(value, list) else [value]))
+
+
+class TextIndex:
+    """
+    Inverted index over the text and notes of a set of tasks.
+
+    Document ids are slots in `docs`; a removed task frees its slot for the
+    next added one. remove() re-tokenizes the task to find its postings, so
+    it must be called before the task's text or notes change.
+    """
+
+    def __init__(self, tasks: Iterable[Any] = ()):
+        self.docs: List[Optional[Any]] = []
+        self.doc_of: Dict[int, int] = {}
+        self.free: List[int] = []
+        self.postings: Dict[str, Postings] = {name: {} for name in FIELDS}
+        for task in tasks:
+            self.add(task)
+
+    def __len__(self) -> int:
+        return len(self.doc_of)
+
+    def add(self, task: Any) -> None:
+        """Index a task."""
+        if id(task) in self.doc_of:
+            return
+        if self.free:
+            doc = self.free.pop()
+            self.docs[doc] = task
+        else:
+            doc = len(self.docs)
+            self.docs.append(task)
+        self.doc_of[id(task)] = doc
+        for name, positions in task_positions(task).items():
+            postings = self.postings[name]
+            for term, places in positions.items():
+                places = places[0] if len(places) == 1 else tuple(places)
+                bucket = postings.get(term)
+                if bucket is None:
+                    postings[term] = {doc: places}
+                else:
+                    bucket[doc] = places
+
+    def remove(self, task: Any) -> None:
+        """Drop a task from the index (before its text or notes are changed)."""
+        doc = self.doc_of.pop(id(task), None)
+        if doc is None:
+            return
+        for name, positions in task_positions(task).items():
+            postings = self.postings[name]
+            for term in positions:
+                bucket = postings.get(term)
+                if bucket is not None:
+                    bucket.pop(doc, None)
+                    if not bucket:
+                        del postings[term]
+        self.docs[doc] = None
+        self.free.append(doc)
+
+    def contains(self, field_name: str, needle: str) -> Optional[List[Any]]:
+        """
+        Candidate tasks whose field may contain needle (case-insensitive).
+
+        Every word of the needle must be inside some term of the task, so
+        the candidates are a superset of the matches; callers still check
+        the substring. Returns None when the needle has no word characters
+        and the index cannot help.
+        """
+        words = terms(needle)
+        if not words:
+            return None
+        postings = self.postings[field_name]
+        # One group of buckets per word: the terms that contain it (a scan
+        # of the vocabulary, not of the tasks)
+        groups = [[bucket for term, bucket in postings.items() if word in term] for word in set(words)]
+        return [self.docs[doc] for doc in _intersect(groups)]
+
+    def match(self, field_name: str, query: MatchQuery) -> List[Any]:
+        """Tasks whose field satisfies a MATCH query."""
+        postings = self.postings[field_name]
+        groups = []
+        for word in set(query.words + [w for phrase in query.phrases for w in phrase]):
+            bucket = postings.get(word)
+            groups.append([bucket] if bucket else [])
+        for prefix in query.prefixes:
+            groups.append([bucket for term, bucket in postings.items() if term.startswith(prefix)])
+
+        results = []
+        for doc in _intersect(groups):
+            if all(_phrase_at({w: _places(postings[w][doc]) for w in phrase}, phrase) for phrase in query.phrases):
+                results.append(self.docs[doc])
+        return results
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Picklable postings, valid only for an index built in one pass over
+        a task list (doc ids are then positions in that list).
+        """
+        return {'size': len(self.docs), 'postings': self.postings}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], tasks: List[Any]) -> Optional['TextIndex']:
+        """Attach saved postings to the task list they were built from."""
+        if state.get('size') != len(tasks):
+            return None
+        index = cls()
+        index.docs = list(tasks)
+        index.doc_of = {id(task): doc for doc, task in enumerate(tasks)}
+        index.postings = state['postings']
+        return index
+
+
+def _intersect(groups: List[List[Dict[int, Any]]]) -> Iterable[int]:
+    """
+    Docs present in at least one bucket of every group.
+
+    Starts from the smallest group and probes the others by dict lookup, so
+    a common term is never copied into a set.
+    """
+    if not groups:
+        return []
+    sized = sorted(((sum(len(bucket) for bucket in group), group) for group in groups), key=lambda item: item[0])
+    _, smallest = sized[0]
+    docs = smallest[0].keys() if len(smallest) == 1 else set().union(*smallest)
+    for size, group in sized[1:]:
+        if not docs:
+            break
+        if len(group) == 1:
+            bucket = group[0]
+            docs = [doc for doc in docs if doc in bucket]
+        elif len(docs) * len(group) < size:
+            docs = [doc for doc in docs if any(doc in bucket for bucket in group)]
+        else:
+            # Many small buckets (e.g. every number containing "27"): one set is cheaper
+            members = set().union(*group)
+            docs = [doc for doc in docs if doc in members]
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Trigrams
+# ---------------------------------------------------------------------------
+
+def trigrams(value: str) -> Set[str]:
+    """Every lowercased three-character substring of value."""
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+@lru_cache(maxsize=256)
+def like_to_regex(pattern: str) -> 're.Pattern':
+    """Translate a SQL LIKE pattern (% and _) into a case-insensitive regex."""
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile('^' + ''.join(parts) + '$', re.IGNORECASE | re.DOTALL)
+
+
+@lru_cache(maxsize=256)
+def regexp_compile(pattern: str) -> 're.Pattern':
+    """Compile a REGEXP pattern (searched anywhere in the value, ignoring case)."""
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Invalid REGEXP pattern {pattern!r}: {e}") from None
+
+
+def like_literals(pattern: str) -> List[str]:
+    """The literal runs between LIKE wildcards."""
+    return [run for run in re.split(r'[%_]', pattern) if run]
+
+
+def regexp_literals(pattern: str) -> List[str]:
+    """
+    Literal runs that every match of a regex must contain.
+
+    Deliberately conservative: groups, classes and escapes such as \\d end a
+    run, a character followed by *, ? or {n,m} is dropped, and an
+    alternation outside a group means nothing is required.
+    """
+    runs: List[str] = []
+    run: List[str] = []
+    depth = 0
+    i = 0
+
+    def end_run():
+        if run:
+            runs.append(''.join(run))
+            run.clear()
+
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if depth == 0 and escaped and not escaped.isalnum():
+                run.append(escaped)
+            else:
+                end_run()
+            i += 2
+            continue
+        if char == '[':
+            end_run()
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif char == '|' and depth == 0:
+            return []
+        elif char in '*?{':
+            if depth == 0 and run:
+                run.pop()
+            end_run()
+            if char == '{':
+                i = pattern.find('}', i)
+                if i < 0:
+                    break
+        elif char == '(':
+            depth += 1
+            end_run()
+        elif char == ')':
+            depth = max(0, depth - 1)
+            end_run()
+        elif char in '+.^$|':
+            # After '+' the character may repeat, so what follows is not adjacent
+            end_run()
+        elif depth == 0:
+            run.append(char)
+        i += 1
+    end_run()
+    return runs
+
+
+def value_matcher(kind: str, pattern: str) -> Callable[[Any], bool]:
+    """
+    Predicate for a search filter over a text value or a list of notes.
+
+    kind is one of SEARCH_KINDS; contains, LIKE and REGEXP on a list match
+    if any note matches.
+    """
+    if kind == 'match':
+        query = parse_match(pattern)
+        return lambda value: match_values(query, value)
+    if kind == 'contains':
+        needle = pattern.lower()
+        test = lambda value: needle in value.lower()
+    elif kind == 'like':
+        regex = like_to_regex(pattern)
+        test = lambda value: regex.match(value) is not None
+    elif kind == 'regexp':
+        regex = regexp_compile(pattern)
+        test = lambda value: regex.search(value) is not None
+    else:
+        raise ValueError(f"Unknown text search {kind!r}")
+
+    def matcher(value: Any) -> bool:
+        if value is None:
+            return False
+        if isinstance(value, list):
+            return any(test(item) for item in value)
+        return test(value)
+    return matcher
+
+
+def search_literals(kind: str, pattern: str) -> List[str]:
+    """Literal runs a value must contain to match a contains/LIKE/REGEXP filter."""
+    if kind == 'contains':
+        return [pattern]
+    if kind == 'like':
+        return like_literals(pattern)
+    if kind == 'regexp':
+        return regexp_literals(pattern)
+    return []
+
+
+class TrigramIndex:
+    """
+    Trigram index over the text and notes of a set of tasks.
+
+    Postings are arrays of doc ids, appended in increasing order so they
+    stay sorted. Removing a task only clears its slot in `docs`: stale
+    postings can add candidates, which the caller's check discards anyway,
+    and the index is rebuilt once most of its slots are dead.
+    """
+
+    # Rebuild when dead slots outnumber live ones (and there are this many)
+    REBUILD_MIN_DEAD = 1024
+
+    def __init__(self, tasks: Iterable[Any] = ()):
+        self.docs: List[Optional[Any]] = []
+        self.doc_of: Dict[int, int] = {}
+        self.dead = 0
+        self.postings: Dict[str, Dict[str, array]] = {name: {} for name in FIELDS}
+        for task in tasks:
+            self.add(task)
+
+    def __len__(self) -> int:
+        return len(self.doc_of)
+
+    def add(self, task: Any) -> None:
+        """Index a task under a new doc id."""
+        if id(task) in self.doc_of:
+            return
+        doc = len(self.docs)
+        self.docs.append(task)
+        self.doc_of[id(task)] = doc
+        notes = task.notes or []
+        for name, grams in (('text', trigrams(task.text)),
+                            ('notes', set().union(*(trigrams(note) for note in notes)))):
+            postings = self.postings[name]
+            for gram in grams:
+                docs = postings.get(gram)
+                if docs is None:
+                    postings[gram] = array('I', (doc,))
+                else:
+                    docs.append(doc)
+
+    def remove(self, task: Any) -> None:
+        """Drop a task; its postings go stale until the next rebuild."""
+        doc = self.doc_of.pop(id(task), None)
+        if doc is None:
+            return
+        self.docs[doc] = None
+        self.dead += 1
+        if self.dead > len(self.doc_of) and self.dead >= self.REBUILD_MIN_DEAD:
+            self.__init__([task for task in self.docs if task is not None])
+
+    def candidates(self, field_name: str, literals: Iterable[str]) -> Optional[List[Any]]:
+        """
+        Tasks whose field contains every trigram of the literals, in index
+        order. A superset of the real matches; None when no literal is long
+        enough to have a trigram.
+        """
+        grams = set().union(*(trigrams(literal) for literal in literals))
+        if not grams:
+            return None
+        postings = self.postings[field_name]
+        lists = []
+        for gram in grams:
+            docs = postings.get(gram)
+            if docs is None:
+                return []
+            lists.append(docs)
+
+        lists.sort(key=len)
+        found = set(lists[0])
+        for docs in lists[1:]:
+            if len(found) * 16 < len(docs):
+                # Few candidates left: binary-search the long sorted list
+                found = {doc for doc in found if _sorted_contains(docs, doc)}
+            else:
+                found.intersection_update(docs)
+            if not found:
+                return []
+        return [self.docs[doc] for doc in sorted(found) if self.docs[doc] is not None]
+
+    def state(self) -> Dict[str, Any]:
+        """Picklable postings (see TextIndex.state)."""
+        return {'size': len(self.docs), 'postings': self.postings}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], tasks: List[Any]) -> Optional['TrigramIndex']:
+        """Attach saved postings to the task list they were built from."""
+        if state.get('size') != len(tasks):
+            return None
+        index = cls()
+        index.docs = list(tasks)
+        index.doc_of = {id(task): doc for doc, task in enumerate(tasks)}
+        index.postings = state['postings']
+        return index
+
+
+def _sorted_contains(docs: array, doc: int) -> bool:
+    i = bisect_left(docs, doc)
+    return i < len(docs) and docs[i] == doc
@@ -0,0 +1,564 @@
+"""
+MDQL Materialized Views
+Stored query results over a markdown file that are refreshed incrementally.
+
+A view keeps one contribution per section span (a heading and the lines up to
+the next heading). On refresh the file is split at its headings and each span
+is hashed; spans whose text is unchanged keep their stored contribution, so
+only edited, added and removed sections are parsed and applied as deltas.
+An MDQL opened with views=ViewStore(...) goes further: each save and
+checkpoint hands over the spans it edited, and only those are parsed, without
+reading the file. Views are persisted under the parse cache directory, and
+`SELECT ... FROM <view>` reads their stored rows.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from mdql import MDQLParser, SavedSpans, SectionMetadata, TaskItem
+from mdql_cache import CACHE_VERSION, default_cache_dir
+from mdql_concurrency import file_version
+from mdql_sql import (
+    Column, MDQLSyntaxError, _sort_key, column_getter, compile_predicate, parse_cached,
+    resolve_column,
+)
+
+
+# Matches MDQLParser.HEADING_PATTERN at the start of any line of a whole file
+HEADING_START = re.compile(r'^#{1,6}[^\S\n][^\n]', re.MULTILINE)
+
+# Columns holding line numbers, stored relative to their span
+LINE_COLUMNS = {'line_number', 'parent_line'}
+
+VIEW_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+STATEMENT_PATTERNS = [
+    ('create', re.compile(r'^\s*CREATE\s+MATERIALIZED\s+VIEW\s+(\w+)\s+AS\s+(SELECT\b.*?)\s*;?\s*$', re.I | re.S)),
+    ('refresh', re.compile(r'^\s*REFRESH\s+MATERIALIZED\s+VIEW\s+(\w+)\s*;?\s*$', re.I)),
+    ('drop', re.compile(r'^\s*DROP\s+MATERIALIZED\s+VIEW\s+(\w+)\s*;?\s*$', re.I)),
+]
+
+
+def split_sections(text: str) -> Iterator[str]:
+    """Split file text into section spans: the preamble, then one per heading."""
+    start = 0
+    for match in HEADING_START.finditer(text):
+        if match.start() > start:
+            yield text[start:match.start()]
+        start = match.start()
+    if start < len(text):
+        yield text[start:]
+
+
+def parse_piece(piece: str) -> Tuple[Optional[SectionMetadata], List[TaskItem]]:
+    """Parse one section span with line numbers relative to its first line."""
+    lines = piece.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+        lines = [line + '\n' for line in lines]
+    else:
+        lines = [line + '\n' for line in lines[:-1]] + [lines[-1]]
+    spans = MDQLParser().parse_span(lines, 1, len(lines))
+    tasks = [task for span in spans for task in span.tasks]
+    return spans[-1].metadata, tasks
+
+
+def span_digest(piece: str) -> bytes:
+    return hashlib.blake2b(piece.encode('utf-8'), digest_size=16).digest()
+
+
+def file_fingerprint(filepath: str) -> Tuple[int, int]:
+    st = os.stat(filepath)
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class SpanState:
+    """One section span of the source file and its contribution to a view."""
+    digest: bytes
+    start_line: int
+    metadata: Optional[SectionMetadata]
+    meta_key: Any = None         # section metadata the contribution was computed with
+    contribution: Any = None
+
+    @property
+    def section(self) -> str:
+        # Tasks before the first heading belong to "Untitled", as in MDQLParser
+        return self.metadata.section_name if self.metadata else "Untitled"
+
+
+@dataclass
+class RefreshStats:
+    spans: int = 0
+    reused: int = 0
+    parsed: int = 0
+    removed: int = 0
+
+    def __str__(self):
+        return (f"{self.spans} span(s): {self.reused} reused, "
+                f"{self.parsed} parsed, {self.removed} removed")
+
+
+class MaterializedView:
+    """
+    Base class for views maintained span by span.
+
+    Subclasses compute a span's contribution from its tasks and may keep
+    running aggregates up to date in add() and remove().
+    """
+
+    kind = ''
+    depends_on_metadata = False
+
+    def __init__(self, name: str, filepath: str):
+        if not VIEW_NAME.match(name):
+            raise ValueError(f"Invalid view name {name!r}")
+        self.name = name
+        self.filepath = os.path.abspath(filepath)
+        self.fingerprint: Optional[Tuple[int, int]] = None
+        self.spans: List[SpanState] = []
+        self.sections: Dict[str, SectionMetadata] = {}
+
+    @property
+    def definition(self) -> Dict[str, Any]:
+        """What is needed to rebuild the view from scratch."""
+        return {'kind': self.kind, 'name': self.name, 'filepath': self.filepath}
+
+    def contribute(self, span: SpanState, tasks: List[TaskItem]) -> Any:
+        raise NotImplementedError
+
+    def add(self, span: SpanState) -> None:
+        """Apply a new span's contribution to running aggregates."""
+
+    def remove(self, span: SpanState) -> None:
+        """Withdraw a span's contribution from running aggregates."""
+
+    def meta_key(self, span: SpanState) -> Any:
+        if not self.depends_on_metadata:
+            return None
+        meta = self.sections.get(span.section)
+        return (meta.priority, meta.status) if meta else None
+
+    def refresh(self, force: bool = False) -> RefreshStats:
+        """Bring the view up to date with its source file, applying span deltas."""
+        fingerprint = file_fingerprint(self.filepath)
+        if not force and fingerprint == self.fingerprint:
+            return RefreshStats(spans=len(self.spans), reused=len(self.spans))
+
+        with open(self.filepath, 'r', encoding='utf-8') as f:
+            text = f.read()
+
+        previous: Dict[bytes, List[SpanState]] = {}
+        for span in self.spans:
+            previous.setdefault(span.digest, []).append(span)
+
+        stats = RefreshStats()
+        spans: List[SpanState] = []
+        pieces: List[str] = []
+        fresh: Dict[int, List[TaskItem]] = {}
+        start_line = 1
+        for piece in split_sections(text):
+            digest = span_digest(piece)
+            candidates = previous.get(digest)
+            if candidates:
+                span = candidates.pop()
+                span.start_line = start_line
+            else:
+                metadata, tasks = parse_piece(piece)
+                span = SpanState(digest, start_line, metadata)
+                fresh[len(spans)] = tasks
+            if span.metadata:
+                span.metadata.line_number = start_line
+            spans.append(span)
+            pieces.append(piece)
+            start_line += piece.count('\n')
+
+        for group in previous.values():
+            for span in group:
+                self.remove(span)
+                stats.removed += 1
+
+        self.spans = spans
+        self.sections = {}
+        for span in spans:
+            if span.metadata:
+                self.sections[span.metadata.section_name] = span.metadata
+
+        self.prepare()
+        for index, span in enumerate(spans):
+            key = self.meta_key(span)
+            tasks = fresh.get(index)
+            if tasks is None:
+                if key == span.meta_key:
+                    stats.reused += 1
+                    continue
+                # Unchanged text, but its section's metadata changed elsewhere
+                self.remove(span)
+                tasks = parse_piece(pieces[index])[1]
+            span.meta_key = key
+            span.contribution = self.contribute(span, tasks)
+            self.add(span)
+            stats.parsed += 1
+
+        self.fingerprint = fingerprint
+        stats.spans = len(spans)
+        return stats
+
+    def apply_spans(self, saved: SavedSpans) -> Optional[RefreshStats]:
+        """
+        Apply the spans an MDQL save or checkpoint edited (see SavedSpans)
+        without reading the file: the edited spans are parsed and the rest
+        only move. Returns None, leaving the view as it was, when that is not
+        enough: the view was not refreshed against the version the edits were
+        made to, sections were added or removed, or a section's metadata
+        changed under spans that were not edited. refresh() handles those.
+        """
+        if (saved.changed is None or saved.before is None or saved.after is None
+                or self.fingerprint != saved.before[:2] or saved.span_count != len(self.spans)):
+            return None
+
+        fresh: Dict[int, Tuple[SpanState, List[TaskItem], int]] = {}
+        for index, lines in saved.changed.items():
+            piece = ''.join(lines)
+            metadata, tasks = parse_piece(piece) if lines else (None, [])
+            if not lines or (metadata is None) != (self.spans[index].metadata is None):
+                return None
+            fresh[index] = (SpanState(span_digest(piece), 0, metadata), tasks, piece.count('\n'))
+
+        spans = list(self.spans)
+        for index, (span, _, _) in fresh.items():
+            spans[index] = span
+        sections = {span.metadata.section_name: span.metadata for span in spans if span.metadata}
+        previous_sections, self.sections = self.sections, sections
+        if any(index not in fresh and self.meta_key(span) != span.meta_key
+               for index, span in enumerate(spans)):
+            self.sections = previous_sections
+            return None
+
+        stats = RefreshStats(spans=len(spans))
+        start_line = 1
+        for index, span in enumerate(spans):
+            if index in fresh:
+                length = fresh[index][2]
+            elif index + 1 < len(spans):
+                length = self.spans[index + 1].start_line - span.start_line
+            else:
+                length = 0
+            span.start_line = start_line
+            if span.metadata:
+                span.metadata.line_number = start_line
+            start_line += length
+
+        for index in fresh:
+            self.remove(self.spans[index])
+            stats.removed += 1
+        self.spans = spans
+        self.prepare()
+        for index, (span, tasks, _) in fresh.items():
+            span.meta_key = self.meta_key(span)
+            span.contribution = self.contribute(span, tasks)
+            self.add(span)
+            stats.parsed += 1
+        stats.reused = len(spans) - stats.parsed
+        self.fingerprint = saved.after[:2]
+        return stats
+
+    def prepare(self) -> None:
+        """Hook run before contributions are computed in a refresh."""
+
+    def rows(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def select(self, query: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Answer `SELECT <columns> FROM <view> [LIMIT n]` from the stored rows,
+        returning (columns, rows). Filters, sorting and grouping belong in
+        the view's definition.
+        """
+        parsed = parse_cached(query)
+        if parsed.where is not None or parsed.joins or parsed.order_by or parsed.is_aggregate:
+            raise MDQLSyntaxError(f"Materialized view {self.name} can only be read with "
+                                  f"SELECT <columns> [LIMIT n]")
+        rows = self.rows()
+        available = getattr(self, 'columns', None) or (list(rows[0]) if rows else [])
+        if parsed.star:
+            columns = available
+        else:
+            names = [str(item) for item in parsed.items]
+            for name in names:
+                if name not in available:
+                    raise MDQLSyntaxError(f"Unknown column in materialized view {self.name}: {name}")
+            columns = list(parsed.columns)
+            rows = [{label: row[name] for label, name in zip(columns, names)} for row in rows]
+        if isinstance(parsed.limit, int):
+            rows = rows[:parsed.limit]
+        return columns, rows
+
+
+class SelectView(MaterializedView):
+    """
+    The rows of a single-file SELECT.
+
+    Each span stores the selected column values of its matching tasks, with
+    line numbers relative to the span, so spans that only move are reused.
+    ORDER BY (on selected columns) and LIMIT are applied when reading.
+    """
+
+    kind = 'select'
+    depends_on_metadata = True
+
+    def __init__(self, name: str, query: str, filepath: Optional[str] = None):
+        parsed = parse_cached(query)
+        if parsed.joins:
+            raise MDQLSyntaxError("Materialized views cannot contain joins")
+        if parsed.param_count:
+            raise MDQLSyntaxError("Materialized views cannot take '?' parameters")
+        if parsed.is_aggregate:
+            raise MDQLSyntaxError("Materialized views cannot use GROUP BY or aggregates")
+        super().__init__(name, filepath or parsed.source)
+        self.query_text = query
+        self.columns = list(parsed.columns)
+        names = [resolve_column(item) for item in self._select_items(parsed)]
+        self.line_positions = [i for i, name in enumerate(names) if name in LINE_COLUMNS]
+        self.order = []
+        for item in parsed.order_by:
+            name = resolve_column(item.column)
+            if name not in names:
+                raise MDQLSyntaxError(f"ORDER BY {item.column} must be a selected column in a materialized view")
+            self.order.append((names.index(name), item.descending))
+        self._evaluate = None
+
+    @staticmethod
+    def _select_items(parsed) -> List[Column]:
+        # SELECT * has labels but no items
+        return parsed.items or [Column(name) for name in parsed.columns]
+
+    @property
+    def definition(self) -> Dict[str, Any]:
+        return dict(super().definition, query=self.query_text)
+
+    def prepare(self) -> None:
+        parsed = parse_cached(self.query_text)
+        predicate = compile_predicate(parsed.where, self)
+        getters = [column_getter(resolve_column(item), self) for item in self._select_items(parsed)]
+        self._evaluate = lambda tasks: [tuple(get(t) for get in getters) for t in tasks if predicate(t)]
+
+    def contribute(self, span: SpanState, tasks: List[TaskItem]) -> List[tuple]:
+        return self._evaluate(tasks)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_evaluate'] = None
+        return state
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Get the view's rows as dicts keyed by select-list labels."""
+        values = []
+        for span in self.spans:
+            offset = span.start_line - 1
+            if not offset or not self.line_positions:
+                values.extend(span.contribution)
+                continue
+            for row in span.contribution:
+                row = list(row)
+                for i in self.line_positions:
+                    if row[i] is not None:
+                        row[i] += offset
+                values.append(tuple(row))
+
+        for i, descending in reversed(self.order):
+            values.sort(key=lambda row: _sort_key(row[i]), reverse=descending)
+        limit = parse_cached(self.query_text).limit
+        if isinstance(limit, int):
+            values = values[:limit]
+        return [dict(zip(self.columns, row)) for row in values]
+
+
+class SectionSummaryView(MaterializedView):
+    """
+    MDQL.get_section_summary() as a view: top-level task counts per section,
+    kept as running totals that each refresh adjusts by the changed spans.
+    """
+
+    kind = 'summary'
+
+    def __init__(self, name: str, filepath: str):
+        super().__init__(name, filepath)
+        self.totals: Dict[str, List[int]] = {}    # section -> [total, completed]
+
+    def contribute(self, span: SpanState, tasks: List[TaskItem]) -> Tuple[int, int]:
+        top_level = [t for t in tasks if t.indent_level == 0]
+        return len(top_level), sum(1 for t in top_level if t.completed)
+
+    def add(self, span: SpanState) -> None:
+        counts = self.totals.setdefault(span.section, [0, 0])
+        counts[0] += span.contribution[0]
+        counts[1] += span.contribution[1]
+
+    def remove(self, span: SpanState) -> None:
+        counts = self.totals.get(span.section)
+        if counts is None or span.contribution is None:
+            return
+        counts[0] -= span.contribution[0]
+        counts[1] -= span.contribution[1]
+        if not counts[0]:
+            del self.totals[span.section]
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Get the summary in the same shape as MDQL.get_section_summary()."""
+        summary = []
+        for section_name, metadata in self.sections.items():
+            total, completed = self.totals.get(section_name, (0, 0))
+            if total > 0:
+                summary.append({
+                    'section': section_name,
+                    'priority': metadata.priority,
+                    'status': metadata.status,
+                    'total_tasks': total,
+                    'completed': completed,
+                    'remaining': total - completed,
+                    'completion_pct': round(100 * completed / total, 1)
+                })
+        return summary
+
+
+VIEW_KINDS = {
+    'select': lambda d: SelectView(d['name'], d['query'], d['filepath']),
+    'summary': lambda d: SectionSummaryView(d['name'], d['filepath']),
+}
+
+
+class ViewStore:
+    """
+    Materialized views persisted next to the parse cache.
+
+        store = ViewStore()
+        store.create("open_high", "SELECT text, line FROM todo.md "
+                                  "WHERE priority = 'High' AND completed = false")
+        view, stats = store.refresh("open_high")    # after todo.md changes
+        print(stats, view.rows())
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.view_dir = os.path.join(cache_dir or default_cache_dir(), 'views')
+        # Views loaded or saved here, by the version of their file
+        self._loaded: Dict[str, Tuple[Any, MaterializedView]] = {}
+
+    def _path(self, name: str) -> str:
+        if not VIEW_NAME.match(name):
+            raise ValueError(f"Invalid view name {name!r}")
+        return os.path.join(self.view_dir, f"{name}.pickle")
+
+    def create(self, name: str, query: str, filepath: Optional[str] = None) -> SelectView:
+        """Create (or replace) a view over a SELECT query."""
+        view = SelectView(name, query, filepath)
+        view.refresh()
+        self.save(view)
+        return view
+
+    def create_summary(self, name: str, filepath: str) -> SectionSummaryView:
+        """Create (or replace) a section summary view of a file."""
+        view = SectionSummaryView(name, filepath)
+        view.refresh()
+        self.save(view)
+        return view
+
+    def save(self, view: MaterializedView) -> None:
+        """Write a view to disk atomically."""
+        os.makedirs(self.view_dir, exist_ok=True)
+        entry = {'version': CACHE_VERSION, 'definition': view.definition, 'view': view}
+        path = self._path(view.name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._loaded[view.name] = (file_version(path), view)
+
+    def load(self, name: str) -> MaterializedView:
+        """
+        Load a view; one stored by an older format is rebuilt from its
+        definition, refreshed from its file and saved in the current format.
+        """
+        path = self._path(name)
+        version = file_version(path)
+        loaded = self._loaded.get(name)
+        if loaded and version is not None and loaded[0] == version:
+            return loaded[1]
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No materialized view named {name!r}")
+        if entry.get('version') != CACHE_VERSION:
+            definition = entry['definition']
+            view = VIEW_KINDS[definition['kind']](definition)
+            view.refresh()
+            self.save(view)
+            return view
+        self._loaded[name] = (version, entry['view'])
+        return entry['view']
+
+    def refresh(self, name: str, force: bool = False) -> Tuple[MaterializedView, RefreshStats]:
+        """Load a view, apply any changes to its source file and save it."""
+        view = self.load(name)
+        stats = view.refresh(force)
+        if stats.parsed or stats.removed:
+            self.save(view)
+        return view, stats
+
+    def views_for(self, filepath: str) -> List[MaterializedView]:
+        """Load the views over a file."""
+        filepath = os.path.abspath(filepath)
+        views = [self.load(name) for name in self.names()]
+        return [view for view in views if view.filepath == filepath]
+
+    def apply(self, saved: SavedSpans) -> List[Tuple[MaterializedView, RefreshStats]]:
+        """
+        Bring the views over a file MDQL has just written up to date (MDQL
+        calls this when opened with views=store). Views that cannot take the
+        edited spans alone are refreshed from the file.
+        """
+        updated = []
+        for view in self.views_for(saved.filepath):
+            stats = view.apply_spans(saved)
+            if stats is None:
+                stats = view.refresh()
+            if stats.parsed or stats.removed:
+                self.save(view)
+            updated.append((view, stats))
+        return updated
+
+    def drop(self, name: str) -> None:
+        """Delete a view."""
+        self._loaded.pop(name, None)
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            raise ValueError(f"No materialized view named {name!r}")
+
+    def __contains__(self, name: str) -> bool:
+        return bool(VIEW_NAME.match(name)) and os.path.exists(self._path(name))
+
+    def names(self) -> List[str]:
+        """List stored view names."""
+        if not os.path.isdir(self.view_dir):
+            return []
+        return sorted(name[:-len('.pickle')] for name in os.listdir(self.view_dir)
+                      if name.endswith('.pickle'))
+
+
+def parse_view_statement(text: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    Recognise CREATE / REFRESH / DROP MATERIALIZED VIEW statements.
+
+    Returns (action, view name, SELECT text or None), or None for any other query.
+    """
+    for action, pattern in STATEMENT_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return action, match.group(1), match.group(2) if action == 'create' else None
+    return None
@@ -0,0 +1,197 @@
+"""
+MDQL Write-Ahead Log
+Append-only sidecar log of task edits, so frequent small edits (checkbox
+toggles) cost one appended line instead of a rewrite of the markdown file.
+
+The log lives next to the file as `<file>-wal`. Its first line is a header
+naming the file version the records apply to (a SHA-256 of its contents)
+and the line numbers of deleted-line placeholders at that point; each
+further line is one JSON record:
+
+    {"base": "<sha256>", "holes": []}
+    ["x", 12]                        mark_complete(12)
+    ["o", 12]                        mark_incomplete(12)
+    ["t", 12, "new text"]            update_text(12, "new text")
+    ["d", 12]                        delete(12)
+    ["a", "Inbox", "text", 0, false] add_task("Inbox", "text", 0, False)
+    ["ckpt", "<sha256>", 2, []]      checkpoint of the first 2 records started
+
+A checkpoint writes the merged file first and then rewrites the log with
+the remaining records, so a crash at any point leaves a log that either
+still matches the old file or names the new one in its "ckpt" record.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+from mdql_cache import file_digest
+
+
+WAL_SUFFIX = '-wal'
+
+# A background checkpoint runs after this many seconds with pending
+# records, or as soon as this many records are pending
+CHECKPOINT_INTERVAL = 5.0
+CHECKPOINT_RECORDS = 1000
+
+# Record opcodes and the MDQL methods they replay
+OPERATIONS = {
+    'x': 'mark_complete',
+    'o': 'mark_incomplete',
+    't': 'update_text',
+    'd': 'delete',
+    'a': 'add_task',
+}
+
+Record = List[Any]
+
+
+def content_digest(content: str) -> str:
+    """SHA-256 of text as it is written to disk (matches file_digest)."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def wal_path(filepath: str) -> str:
+    """Path of the log for a markdown file."""
+    return filepath + WAL_SUFFIX
+
+
+class WriteAheadLog:
+    """
+    The sidecar log of one markdown file.
+
+    `records` holds the records not yet checkpointed, in order. Appends are
+    flushed to the OS straight away, so they survive the process; sync()
+    (or fsync=True) also forces them to disk.
+    """
+
+    def __init__(self, filepath: str, fsync: bool = False):
+        self.filepath = filepath
+        self.path = wal_path(filepath)
+        self.fsync = fsync
+        self.records: List[Record] = []
+        # Held while an edit is applied and logged, and while a checkpoint
+        # takes its snapshot, so the two always agree
+        self.lock = threading.RLock()
+        self.checkpoint_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.error: Optional[BaseException] = None
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def recover(self, repair: bool = True) -> Tuple[List[Record], List[int]]:
+        """
+        Read the log and return (records to replay, placeholder lines) for
+        the current contents of the markdown file.
+
+        A log left by a finished checkpoint yields the records after it. A
+        log that matches neither the file nor a checkpoint of it (the file
+        was changed by something else) yields nothing. With repair, the log
+        is also rewritten in its clean form (dropping a torn last line), or
+        a mismatched one is moved aside to `<log>.stale`; readers that do
+        not write pass repair=False and leave it alone.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], []
+
+        entries = []
+        for line in data.split(b'\n')[:-1]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+        header = entries[0] if entries and isinstance(entries[0], dict) else None
+        digest = file_digest(self.filepath)
+
+        if header is None:
+            if repair:
+                self.remove()
+            return [], []
+
+        records = [entry for entry in entries[1:] if entry[0] != 'ckpt']
+        base, holes, start = header.get('base'), header.get('holes', []), 0
+        if base != digest:
+            checkpoints = [entry for entry in entries[1:] if entry[0] == 'ckpt' and entry[1] == digest]
+            if not checkpoints:
+                if repair:
+                    os.replace(self.path, self.path + '.stale')
+                return [], []
+            _, base, start, holes = checkpoints[-1]
+
+        records = records[start:]
+        if repair:
+            self.records = records
+            self.rebase(base, holes, 0)
+        return list(records), holes
+
+    def open(self) -> None:
+        """Open the log for appending, starting a new one if there is none."""
+        if not self.exists():
+            self.rebase(file_digest(self.filepath), [], 0)
+        elif self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, records: List[Record]) -> None:
+        """Append records (the caller holds `lock`)."""
+        self._file.write(''.join(_encode(record) for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records.extend(records)
+        if len(self.records) >= CHECKPOINT_RECORDS:
+            self.wakeup.set()
+
+    def sync(self) -> None:
+        """Force appended records to disk."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def mark_checkpoint(self, digest: str, upto: int, holes: List[int]) -> None:
+        """Record that the first `upto` records are being written into the file."""
+        with self.lock:
+            self._file.write(_encode(['ckpt', digest, upto, holes]))
+            self.sync()
+
+    def rebase(self, digest: str, holes: List[int], upto: int) -> None:
+        """Replace the log with a new header and the records after the first `upto`."""
+        with self.lock:
+            self.records = self.records[upto:]
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'base': digest, 'holes': holes}) + '\n')
+                f.write(''.join(_encode(record) for record in self.records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def remove(self) -> None:
+        """Delete the log (after its records were saved some other way)."""
+        with self.lock:
+            self.close_file()
+            self.records = []
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _encode(record: Record) -> str:
+    return json.dumps(record, separators=(',', ':')) + '\n'
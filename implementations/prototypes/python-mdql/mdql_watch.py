@@ -0,0 +1,432 @@
+"""
+MDQL Watch
+Notices when markdown files change on disk and refreshes the parsed state
+that depends on them, so a long-lived MDQL, MDQLCatalog or query server
+does not keep serving stale tasks.
+
+    mdql = MDQL("todo.md")
+    watcher = watch(mdql)            # mdql.refresh() after every change
+    ...
+    watcher.stop()
+
+    catalog = MDQLCatalog("notes/")
+    watcher = watch(catalog)         # re-parses only the files that changed
+
+On Linux the watcher uses inotify (through ctypes, so nothing needs
+installing); elsewhere, or if inotify is unavailable, it polls file
+versions. Bursts of events (an editor's save, a sync client writing a whole
+folder) are debounced into one refresh, and each refresh's latency, from
+the first event to the end of the refresh, is kept in `watcher.metrics`.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from mdql_catalog import MDQLCatalog, discover
+from mdql_concurrency import file_version
+from mdql_wal import WAL_SUFFIX
+
+
+# A batch is delivered once no event has arrived for DEBOUNCE seconds, or
+# MAX_DELAY seconds after its first event while events keep coming
+DEBOUNCE = 0.05
+MAX_DELAY = 1.0
+
+# Seconds between scans when polling
+POLL_INTERVAL = 1.0
+
+# Latency samples kept for the metrics
+LATENCY_SAMPLES = 1000
+
+# inotify event bits (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+# Saves replace files by rename, so directories are watched rather than files
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+_EVENT = struct.Struct('iIII')
+
+
+def _load_inotify() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_inotify()
+
+
+class WatchMetrics:
+    """Event counts and refresh latencies (in seconds) of a FileWatcher."""
+
+    def __init__(self):
+        self.events = 0
+        self.batches = 0
+        self.files = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.refresh_times: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def count(self, events: int = 0, errors: int = 0) -> None:
+        with self._lock:
+            self.events += events
+            self.errors += errors
+
+    def record(self, files: int, latency: float, refresh_time: float) -> None:
+        with self._lock:
+            self.batches += 1
+            self.files += files
+            self.latencies.append(latency)
+            self.refresh_times.append(refresh_time)
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts, plus last/mean/p95/max of the latency and refresh time samples."""
+        with self._lock:
+            return {
+                'events': self.events,
+                'batches': self.batches,
+                'files': self.files,
+                'errors': self.errors,
+                'latency': _distribution(self.latencies),
+                'refresh': _distribution(self.refresh_times),
+            }
+
+
+def _distribution(samples: Iterable[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {'last': None, 'mean': None, 'p95': None, 'max': None}
+    return {
+        'last': round(samples[-1], 6),
+        'mean': round(sum(ordered) / len(ordered), 6),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+        'max': round(ordered[-1], 6),
+    }
+
+
+class FileWatcher:
+    """
+    Watches markdown files and folders, and calls back from its own thread
+    with the set of files that changed.
+
+        watcher = FileWatcher(["todo.md", "notes/"], lambda paths: print(paths))
+        watcher.start()
+        ...
+        watcher.stop()
+
+    Paths are reported absolute. A change to a file's write-ahead log is
+    reported as a change to the file, and a folder created, moved or
+    deleted inside a watched folder is reported as the folder itself.
+    backend is 'inotify', 'poll' or 'auto' (inotify when available). An
+    exception from the callback is counted in the metrics and kept in
+    `error`; the watcher carries on.
+    """
+
+    def __init__(self, paths: Iterable[str], callback: Callable[[Set[str]], Any],
+                 pattern: str = '*.md', recursive: bool = True, backend: str = 'auto',
+                 debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY,
+                 poll_interval: float = POLL_INTERVAL):
+        if backend not in ('auto', 'inotify', 'poll'):
+            raise ValueError(f"Unknown watcher backend {backend!r}")
+        if backend == 'inotify' and _libc is None:
+            raise ValueError("inotify is not available on this system")
+        self.callback = callback
+        self.pattern = pattern
+        self.recursive = recursive
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.metrics = WatchMetrics()
+        self.error: Optional[BaseException] = None
+        self.files: Set[str] = set()
+        self.folders: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backend = _InotifyBackend(self) if backend != 'poll' and _libc is not None else _PollBackend(self)
+        self.backend = self._backend.name
+        for path in paths:
+            self.add(path)
+
+    def add(self, path: str) -> None:
+        """Watch another file or folder (also while running)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self.files or path in self.folders:
+                return
+            (self.folders if os.path.isdir(path) else self.files).add(path)
+            self._backend.add(path)
+
+    def start(self) -> 'FileWatcher':
+        self._thread = threading.Thread(target=self._run, name='mdql-watch', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._backend.wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._backend.close()
+
+    def __enter__(self) -> 'FileWatcher':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def target(self, path: str) -> Optional[str]:
+        """The watched markdown file a changed path belongs to, if any."""
+        if path.endswith(WAL_SUFFIX):
+            path = path[:-len(WAL_SUFFIX)]
+        if path in self.files:
+            return path
+        directory, name = os.path.split(path)
+        if fnmatch.fnmatch(name, self.pattern) and self._in_folder(directory):
+            return path
+        return None
+
+    def _in_folder(self, directory: str) -> bool:
+        """Whether files in a directory belong to a watched folder."""
+        for folder in self.folders:
+            if directory == folder:
+                return True
+            if self.recursive and directory.startswith(folder + os.sep):
+                parts = directory[len(folder) + 1:].split(os.sep)
+                if not any(part.startswith('.') for part in parts):
+                    return True
+        return False
+
+    def all_files(self) -> Set[str]:
+        """Every watched markdown file that exists now."""
+        with self._lock:
+            found = {path for path in self.files if os.path.exists(path)}
+            for folder in self.folders:
+                found.update(discover(folder, self.pattern, self.recursive))
+        return found
+
+    def _run(self) -> None:
+        pending: Set[str] = set()
+        first = last = 0.0
+        while not self._stopped.is_set():
+            if pending:
+                timeout = max(0.0, min(last + self.debounce, first + self.max_delay) - time.monotonic())
+            else:
+                timeout = None
+            changed = self._backend.wait(timeout)
+            if self._stopped.is_set():
+                break
+            now = time.monotonic()
+            if changed:
+                self.metrics.count(events=len(changed))
+                if not pending:
+                    first = now
+                pending |= changed
+                last = now
+            if pending and (now - last >= self.debounce or now - first >= self.max_delay):
+                self._deliver(pending, first)
+                pending = set()
+
+    def _deliver(self, paths: Set[str], first: float) -> None:
+        started = time.monotonic()
+        try:
+            self.callback(paths)
+        except Exception as e:
+            self.error = e
+            self.metrics.count(errors=1)
+            return
+        finished = time.monotonic()
+        self.metrics.record(len(paths), finished - first, finished - started)
+
+
+class _InotifyBackend:
+    """Directory watches on one inotify descriptor."""
+
+    name = 'inotify'
+
+    def __init__(self, watcher: FileWatcher):
+        self.watcher = watcher
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            _raise_errno('inotify_init1')
+        self.directories: Dict[int, str] = {}
+        self._wake_read, self._wake_write = os.pipe()
+
+    def add(self, path: str) -> None:
+        if os.path.isdir(path):
+            self._watch_tree(path)
+        else:
+            self._watch(os.path.dirname(path))
+
+    def _watch_tree(self, folder: str) -> None:
+        if not self.watcher.recursive:
+            self._watch(folder)
+            return
+        for dirpath, dirnames, _ in os.walk(folder):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            self._watch(dirpath)
+
+    def _watch(self, directory: str) -> None:
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOENT:
+                return
+            _raise_errno(f"inotify_add_watch {directory}")
+        self.directories[wd] = directory
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        ready, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if self.fd not in ready:
+            return set()
+        data = b''
+        while True:
+            try:
+                data += os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+
+        changed: Set[str] = set()
+        watcher = self.watcher
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: report everything, refreshes skip what is unchanged
+                changed |= watcher.all_files()
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if watcher._in_folder(path):
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        with watcher._lock:
+                            self._watch_tree(path)
+                    changed.add(path)
+                continue
+            target = watcher.target(path)
+            if target is not None:
+                changed.add(target)
+        return changed
+
+    def wake(self) -> None:
+        os.write(self._wake_write, b'x')
+
+    def close(self) -> None:
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class _PollBackend:
+    """Compares file versions (and their logs') every poll_interval seconds."""
+
+    name = 'poll'
+
+    def __init__(self, watcher: FileWatcher):
+        self.watcher = watcher
+        self.versions: Dict[str, Any] = {}
+        self._wake = threading.Event()
+
+    def add(self, path: str) -> None:
+        files = discover(path, self.watcher.pattern, self.watcher.recursive) if os.path.isdir(path) else [path]
+        self.versions.update(self._versions(files))
+
+    def _versions(self, files: Iterable[str]) -> Dict[str, Any]:
+        return {path: (file_version(path), file_version(path + WAL_SUFFIX)) for path in files}
+
+    def wait(self, timeout: Optional[float]) -> Set[str]:
+        if self._wake.wait(self.watcher.poll_interval if timeout is None else min(timeout, self.watcher.poll_interval)):
+            return set()
+        watcher = self.watcher
+        with watcher._lock:
+            files = list(watcher.files)
+            folders = list(watcher.folders)
+        current = self._versions(files)
+        for folder in folders:
+            current.update(self._versions(discover(folder, watcher.pattern, watcher.recursive)))
+        changed = {path for path in current.keys() | self.versions.keys()
+                   if current.get(path) != self.versions.get(path)}
+        # A missing single file stays watched, in case it comes back
+        self.versions = {path: version for path, version in current.items() if version != (None, None)}
+        return changed
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def close(self) -> None:
+        pass
+
+
+def _raise_errno(what: str) -> None:
+    code = ctypes.get_errno()
+    raise OSError(code, f"{what}: {os.strerror(code)}")
+
+
+def watch(source: Any, lock: Optional[Any] = None, **options) -> FileWatcher:
+    """
+    Keep an MDQL or MDQLCatalog current: start a FileWatcher that refreshes
+    it after every change. Refreshes run on the watcher's thread, holding
+    `lock` (such as a threading.Lock) when one is given, so queries made
+    under the same lock never see a half-loaded state. Options are passed
+    on to FileWatcher.
+    """
+    if isinstance(source, MDQLCatalog):
+        paths = [source.root]
+        options.setdefault('pattern', source.pattern)
+        options.setdefault('recursive', source.recursive)
+
+        def refresh(changed: Set[str]) -> List[str]:
+            return source.refresh(changed)
+    else:
+        paths = [source.filepath]
+
+        def refresh(changed: Set[str]) -> bool:
+            return source.refresh()
+
+    def callback(changed: Set[str]) -> None:
+        if lock is None:
+            refresh(changed)
+        else:
+            with lock:
+                refresh(changed)
+
+    return FileWatcher(paths, callback, **options).start()
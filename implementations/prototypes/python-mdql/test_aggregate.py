@@ -0,0 +1,109 @@
+"""Tests for mdql_aggregate: GROUP BY, aggregates, HAVING and merged folder results."""
+
+import random
+
+import pytest
+
+from mdql import MDQL, MDQLParser
+from mdql_aggregate import aggregate_folder, aggregate_query
+from mdql_catalog import PARALLEL_THRESHOLD, discover
+from mdql_sql import MDQLSyntaxError
+
+
+TODO = """## Inbox
+**Priority:** High
+
+- [ ] Call venue
+  - [x] Find the number
+- [x] Send invoice
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+
+## Errands
+**Priority:** High
+
+- [x] Buy stamps
+"""
+
+SUMMARY = ("SELECT section, COUNT(*) AS n, SUM(completed) AS done, AVG(indent_level) AS depth, "
+           "MIN(text) AS first, MAX(line) AS last FROM todo.md GROUP BY section ORDER BY section")
+
+
+@pytest.fixture
+def mdql(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return MDQL(str(path))
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """More files than PARALLEL_THRESHOLD, so folders are aggregated in workers."""
+    rng = random.Random(3)
+    root = tmp_path / 'vault'
+    root.mkdir()
+    for i in range(PARALLEL_THRESHOLD + 4):
+        lines = []
+        for section in rng.sample(['Inbox', 'Someday', 'Errands', 'Work'], 3):
+            lines += [f"## {section}", f"**Priority:** {rng.choice(['High', 'Low'])}", ""]
+            for j in range(rng.randint(0, 6)):
+                check = 'x' if rng.random() < 0.4 else ' '
+                lines.append(f"{'  ' * rng.randint(0, 1)}- [{check}] task {i}.{j}")
+            lines.append("")
+        (root / f"note-{i:02}.md").write_text("\n".join(lines))
+    return str(root)
+
+
+def naive_summary(files):
+    """The SUMMARY rows computed directly from parsed tasks."""
+    groups = {}
+    for path in files:
+        for task in MDQLParser().parse_file(path)['tasks']:
+            groups.setdefault(task.section, []).append(task)
+    return [
+        {'section': section, 'n': len(tasks), 'done': sum(t.completed for t in tasks),
+         'depth': sum(t.indent_level for t in tasks) / len(tasks),
+         'first': min(t.text for t in tasks), 'last': max(t.line_number for t in tasks)}
+        for section, tasks in sorted(groups.items())
+    ]
+
+
+def test_group_by_computes_every_aggregate(mdql):
+    assert aggregate_query(SUMMARY, mdql) == naive_summary([mdql.filepath])
+
+
+def test_sum_of_booleans_is_a_count_in_any_group_size(mdql):
+    rows = aggregate_query("SELECT section, SUM(completed) AS done FROM todo.md GROUP BY section", mdql)
+    assert rows == [{'section': 'Inbox', 'done': 2}, {'section': 'Someday', 'done': 0},
+                    {'section': 'Errands', 'done': 1}]
+    assert all(type(row['done']) is int for row in rows)
+
+
+def test_having_and_where_filter_groups_and_rows(mdql):
+    rows = aggregate_query("SELECT priority, COUNT(*) AS n FROM todo.md WHERE indent_level = 0 "
+                           "GROUP BY priority HAVING COUNT(*) > 1 ORDER BY n DESC", mdql)
+    assert rows == [{'priority': 'High', 'n': 3}]
+
+
+def test_aggregate_without_group_by_yields_one_row(mdql):
+    assert aggregate_query("SELECT COUNT(*) AS n, MAX(indent_level) AS deepest FROM todo.md", mdql) == [
+        {'n': 5, 'deepest': 1}]
+    assert aggregate_query("SELECT COUNT(*) AS n, SUM(indent_level) AS s FROM todo.md "
+                           "WHERE text = 'nothing'", mdql) == [{'n': 0, 's': None}]
+
+
+def test_count_distinct(mdql):
+    assert aggregate_query("SELECT COUNT(DISTINCT priority) AS kinds FROM todo.md", mdql) == [{'kinds': 2}]
+
+
+def test_ungrouped_column_is_an_error(mdql):
+    with pytest.raises(MDQLSyntaxError, match='GROUP BY'):
+        aggregate_query("SELECT section, text, COUNT(*) FROM todo.md GROUP BY section", mdql)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_folder_partials_merge_to_the_naive_result(vault, workers):
+    assert aggregate_folder(SUMMARY, vault, workers=workers) == naive_summary(discover(vault))
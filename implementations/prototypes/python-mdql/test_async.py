@@ -0,0 +1,194 @@
+"""Tests for mdql_async: awaited calls give what the blocking ones do, within the executor's bounds."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mdql import MDQL
+from mdql_aggregate import aggregate_query
+from mdql_async import AsyncCatalog, AsyncMDQL, BoundedExecutor
+from mdql_catalog import MDQLCatalog
+from mdql_sql import parse_mdql_query, stream_query
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+
+- [ ] Call venue
+  - Ask about parking
+- [x] Send invoice
+- [ ] Book room
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.fixture
+def executor():
+    executor = BoundedExecutor(workers=2)
+    yield executor
+    executor.shutdown()
+
+
+def rows(tasks):
+    return [(t.line_number, t.text, t.completed, t.section) for t in tasks]
+
+
+def test_queries_match_the_blocking_calls(todo, executor):
+    query = "SELECT * FROM todo.md WHERE section = ? AND completed = ?"
+    aggregate = "SELECT section, COUNT(*) AS n FROM todo.md GROUP BY section"
+
+    async def main():
+        mdql = await AsyncMDQL.load(todo, executor)
+        return (await mdql.query(priority='High'), await mdql.execute(query, 'Inbox', False),
+                await mdql.execute(aggregate), await mdql.tasks())
+
+    found, executed, grouped, tasks = asyncio.run(main())
+    mdql = MDQL(todo)
+    assert rows(found) == rows(mdql.query(priority='High'))
+    assert rows(executed) == rows(mdql.prepare(query).execute('Inbox', False))
+    assert grouped == aggregate_query(parse_mdql_query(aggregate), mdql)
+    assert rows(tasks) == rows(mdql.tasks)
+
+
+def test_edits_and_save(todo, executor):
+    async def main():
+        mdql = await AsyncMDQL.load(todo, executor)
+        first = (await mdql.query(text_contains='Call venue'))[0]
+        await mdql.mark_complete(first.line_number)
+        await mdql.add_task('Someday', 'Buy a keyboard')
+        await mdql.save()
+
+    asyncio.run(main())
+    expected = MDQL(todo)
+    assert [(t.text, t.completed) for t in expected.tasks] == [
+        ('Call venue', True), ('Send invoice', True), ('Book room', False), ('Learn piano', False),
+        ('Buy a keyboard', False)]
+
+
+def test_transaction_rolls_back_when_func_raises(todo, executor):
+    def book(mdql):
+        mdql.mark_complete(mdql.query(text_contains='Book room')[0].line_number)
+        return 'done'
+
+    def fail(mdql):
+        book(mdql)
+        raise RuntimeError('abandon')
+
+    async def main():
+        mdql = await AsyncMDQL.load(todo, executor)
+        with pytest.raises(RuntimeError):
+            await mdql.transaction(fail)
+        assert not (await mdql.query(text_contains='Book room'))[0].completed
+        return await mdql.transaction(book)
+
+    assert asyncio.run(main()) == 'done'
+    with open(todo) as f:
+        assert '- [x] Book room' in f.read()
+
+
+def test_catalog_matches_stream_query(tmp_path, executor):
+    for i in range(3):
+        (tmp_path / f"note-{i}.md").write_text(TODO)
+    query = "SELECT * FROM . WHERE priority = ? ORDER BY text"
+
+    async def main():
+        catalog = await AsyncCatalog.load(str(tmp_path), executor, workers=1)
+        return await catalog.execute(query, 'High'), await catalog.query(completed=False)
+
+    executed, found = asyncio.run(main())
+    catalog = MDQLCatalog(str(tmp_path), workers=1)
+    assert rows(executed) == rows(stream_query(query, catalog, ['High']))
+    assert rows(found) == rows(catalog.query(completed=False))
+
+
+def test_calls_in_flight_stay_within_the_limit():
+    executor = BoundedExecutor(workers=4, limit=2)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def work(i):
+        with lock:
+            active.append(i)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(i)
+        return i
+
+    async def main():
+        results = await asyncio.gather(*(executor.run(work, i) for i in range(20)))
+        return results, executor.stats()
+
+    try:
+        results, stats = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert results == list(range(20))
+    assert max(peak) <= 2
+    assert stats['running'] == 0 and stats['waiting'] == 0
+
+
+def test_calls_on_one_source_run_one_at_a_time(todo, executor):
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def work(mdql):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.pop()
+        return len(mdql.tasks)
+
+    async def main():
+        mdql = await AsyncMDQL.load(todo, executor)
+        return await asyncio.gather(*(mdql.run(work) for _ in range(6)))
+
+    assert asyncio.run(main()) == [4] * 6
+    assert max(peak) == 1
+
+
+def test_cancelled_waiters_free_their_slot():
+    executor = BoundedExecutor(workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return 'first'
+
+    async def main():
+        first = asyncio.ensure_future(executor.run(block))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        waiting = asyncio.ensure_future(executor.run(lambda: 'never'))
+        await asyncio.sleep(0.01)
+        assert executor.stats()['waiting'] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        release.set()
+        return await first, await executor.run(lambda: 'after')
+
+    try:
+        assert asyncio.run(main()) == ('first', 'after')
+    finally:
+        executor.shutdown()
@@ -0,0 +1,107 @@
+"""Tests for bench_vault and bench_suite: generated vaults are deterministic and the suite runs end to end."""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+from dataclasses import replace
+
+from bench_suite import CLI_QUERIES, QUERY_FILTERS, Suite, compare
+from bench_vault import PRESETS, VaultSpec, add_spec_arguments, describe, file_path, generate_vault, spec_from_args
+from mdql import MDQL
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SPEC = VaultSpec(files=5, sections=3, tasks=6, files_per_folder=2)
+
+
+def contents(root):
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def test_vaults_are_deterministic(tmp_path):
+    first = generate_vault(str(tmp_path / 'a'), SPEC)
+    second = generate_vault(str(tmp_path / 'b'), SPEC)
+    assert first == second
+    assert contents(tmp_path / 'a') == contents(tmp_path / 'b')
+    generate_vault(str(tmp_path / 'c'), replace(SPEC, seed=7))
+    assert contents(tmp_path / 'a') != contents(tmp_path / 'c')
+
+
+def test_a_smaller_vault_is_a_prefix(tmp_path):
+    generate_vault(str(tmp_path / 'big'), SPEC)
+    generate_vault(str(tmp_path / 'small'), replace(SPEC, files=2))
+    big, small = contents(tmp_path / 'big'), contents(tmp_path / 'small')
+    assert small == {name: data for name, data in big.items() if name in small}
+    assert len(small) == 2
+
+
+def test_counts_match_the_parsed_files(tmp_path):
+    root = str(tmp_path / 'vault')
+    counts = generate_vault(root, SPEC)
+    paths = [file_path(root, SPEC, index) for index in range(SPEC.files)]
+    assert len({os.path.dirname(path) for path in paths}) == 3
+    assert counts == dict(describe(paths), tasks=sum(len(MDQL(path).tasks) for path in paths))
+    for path in paths:
+        mdql = MDQL(path)
+        assert len(mdql.sections) >= SPEC.sections
+        assert max(task.indent_level for task in mdql.tasks) <= SPEC.depth
+        for task in mdql.tasks:
+            assert task.parent_line is None or task.indent_level > 0
+
+
+def test_spec_arguments():
+    parser = argparse.ArgumentParser()
+    add_spec_arguments(parser, default_preset='medium')
+    assert spec_from_args(parser.parse_args([])) == PRESETS['medium']
+    spec = spec_from_args(parser.parse_args(['--preset', 'small', '--files', '3', '--notes', '0.5']))
+    assert spec == replace(PRESETS['small'], files=3, notes=0.5)
+
+
+def test_measure_records_each_result(tmp_path, capsys):
+    suite = Suite(str(tmp_path), repeat=3, only=['query.'])
+    calls = []
+    suite.measure('query.test', lambda: calls.append(1), ops=10, unit='row', matches=4)
+    suite.measure('parse.skipped', lambda: calls.append(2))
+    result = suite.results['query.test']
+    assert list(suite.results) == ['query.test']
+    assert 2 not in calls
+    assert result['runs'] == 3 and result['matches'] == 4 and result['unit'] == 'row'
+    assert len(calls) == 1 + 3 * result['loops']
+    assert result['min'] <= result['median'] <= result['max']
+    assert 'query.test' in capsys.readouterr().out
+
+
+def test_compare_flags_regressions(tmp_path):
+    def run(**mins):
+        return {'spec': {}, 'results': {name: {'min': value} for name, value in mins.items()}}
+
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(run(a=1.0, b=1.0, c=1.0)))
+    out = io.StringIO()
+    assert compare(run(a=1.5, b=1.0, c=0.5, d=1.0), str(baseline), 1.2, out) == 1
+    report = dict(line.split(None, 1) for line in out.getvalue().splitlines()[2:])
+    assert report == {'a': '1.50x  REGRESSION', 'b': '1.00x', 'c': '0.50x  faster', 'd': 'new'}
+
+
+def test_suite_runs_end_to_end(tmp_path):
+    out = tmp_path / 'results.json'
+    result = subprocess.run([sys.executable, os.path.join(HERE, 'bench_suite.py'), '--files', '2',
+                             '--sections', '2', '--tasks', '5', '--repeat', '1', '--json', str(out)],
+                            capture_output=True, text=True, cwd=str(tmp_path))
+    assert result.returncode == 0, result.stderr
+    results = json.loads(out.read_text())
+    names = set(results['results'])
+    assert {f"query.{label}" for label in QUERY_FILTERS} <= names
+    assert {f"cli.{label}" for label in CLI_QUERIES} <= names
+    assert {'parse.file', 'load.cache', 'mutate.delete', 'save.after_edits'} <= names
+    assert results['vault']['files'] == 2
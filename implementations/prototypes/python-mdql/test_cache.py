@@ -0,0 +1,96 @@
+"""Tests for mdql_cache: packed parse entries round-trip and go stale."""
+
+import os
+
+from mdql import MDQL, MDQLParser
+from mdql_cache import ParseCache
+
+
+TODO = """Loose line
+- [ ] Before any heading
+
+# Todo
+
+## Inbox
+*Source: inbox.md (2024-01-15 10:30)*
+**Priority:** High
+**Owner:** Ana
+
+- [ ] Call venue
+  - Ask about parking
+  - [x] Find the number
+    - [ ] Nested deeper
+- [x] Send invoice
+
+### Inbox
+- [ ] Same name, new section
+"""
+
+
+def write(tmp_path, text=TODO):
+    path = tmp_path / 'todo.md'
+    path.write_text(text)
+    return str(path)
+
+
+def snapshot(data):
+    """Everything a parse produced, as comparable plain values."""
+    return {
+        'tasks': [vars(task) | {'children': [c.line_number for c in task.children]} for task in data['tasks']],
+        'sections': {name: vars(meta) for name, meta in data['sections'].items()},
+        'spans': [(span.start_line, span.metadata and span.metadata.line_number,
+                   [task.line_number for task in span.tasks]) for span in data['spans']],
+        'lines': data['lines'],
+    }
+
+
+def test_cached_parse_matches_a_fresh_one(tmp_path):
+    path = write(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    cache.store(path, MDQLParser().parse_file(path))
+
+    cached = cache.load(path)
+    assert cache.stats() == {'hits': 1, 'misses': 0}
+    assert snapshot(cached) == snapshot(MDQLParser().parse_file(path))
+    # Children are the same objects as the tasks list holds
+    call = cached['tasks'][1]
+    assert call.children[0] is cached['tasks'][2]
+
+
+def test_entry_is_smaller_than_a_pickle_of_the_objects(tmp_path):
+    path = write(tmp_path, TODO * 50)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    cache.store(path, MDQLParser().parse_file(path))
+    assert os.path.getsize(cache._entry_path(path)) < 2 * os.path.getsize(path)
+
+
+def test_changed_file_is_a_miss(tmp_path):
+    path = write(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    MDQL(path, cache=cache)
+    with open(path, 'a') as f:
+        f.write("- [ ] One more\n")
+    assert cache.load(path) is None
+    assert cache.stats()['misses'] == 2
+
+
+def test_mdql_loads_from_the_cache_and_edits_work(tmp_path):
+    path = write(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    MDQL(path, cache=cache)
+    mdql = MDQL(path, cache=cache)
+    assert cache.stats()['hits'] == 1
+    task = mdql.query(section='Inbox', completed=False, indent_level=0)[0]
+    mdql.mark_complete(task.line_number)
+    mdql.save()
+    assert '- [x] Call venue' in open(path).read()
+    assert MDQL(path, cache=cache).query(text_contains='Call venue')[0].completed
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    path = write(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    cache.store(path, MDQLParser().parse_file(path))
+    with open(cache._entry_path(path), 'wb') as f:
+        f.write(b'\x00garbage')
+    assert cache.load(path) is None
@@ -0,0 +1,89 @@
+"""Tests for mdql_catalog: a folder queried as one table, parsed serially or in workers."""
+
+import os
+
+import pytest
+
+from mdql import MDQL
+from mdql_catalog import PARALLEL_THRESHOLD, MDQLCatalog, discover
+from mdql_sql import stream_query
+
+
+def note(i):
+    priority = 'High' if i % 3 == 0 else 'Low'
+    return (f"## Inbox\n**Priority:** {priority}\n\n"
+            f"- [ ] task {i}.1\n  - note {i}\n- [{'x' if i % 2 else ' '}] task {i}.2\n\n"
+            f"## Later\n\n- [ ] task {i}.3\n")
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / 'vault'
+    (root / 'sub').mkdir(parents=True)
+    (root / '.hidden').mkdir()
+    for i in range(PARALLEL_THRESHOLD + 2):
+        folder = root / 'sub' if i % 4 == 0 else root
+        (folder / f"note-{i:02}.md").write_text(note(i))
+    (root / '.hidden' / 'skipped.md').write_text(note(99))
+    (root / 'readme.txt').write_text(note(98))
+    return str(root)
+
+
+def rows(tasks):
+    return [(os.path.relpath(t.source_file), t.line_number, t.text, t.completed, t.section) for t in tasks]
+
+
+def expected(files, **filters):
+    """The catalog's answer, file by file through MDQL."""
+    result = []
+    for path in files:
+        for task in MDQL(path).query(**filters):
+            task.source_file = path
+            result.append(task)
+    return rows(result)
+
+
+def test_discover_skips_hidden_folders_and_other_files(vault):
+    files = discover(vault)
+    assert len(files) == PARALLEL_THRESHOLD + 2
+    assert files == sorted(files)
+    assert not any('.hidden' in path or path.endswith('.txt') for path in files)
+    assert len(discover(vault, recursive=False)) == len([f for f in files if '/sub/' not in f])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_catalog_matches_each_file_loaded_alone(vault, workers):
+    catalog = MDQLCatalog(vault, workers=workers)
+    files = discover(vault)
+    assert rows(catalog.tasks) == expected(files)
+    for filters in [{'completed': False}, {'priority': 'High'}, {'section': 'Later', 'text_like': '%1_.3'},
+                    {'has_notes': True, 'priority': 'Low'}]:
+        assert rows(catalog.query(**filters)) == expected(files, **filters)
+    assert rows(catalog.query(source_file=files[0])) == expected(files[:1])
+
+
+def test_priority_resolves_within_each_file(vault):
+    # Every file has an Inbox, with its own priority
+    catalog = MDQLCatalog(vault, workers=1)
+    high = stream_query("SELECT * FROM vault WHERE priority = 'High' AND section = 'Inbox'", catalog)
+    assert rows(high) == expected(discover(vault), priority='High', section='Inbox')
+
+
+def test_refresh_reparses_adds_and_drops_files(vault):
+    catalog = MDQLCatalog(vault, workers=1)
+    files = list(catalog.files)
+    with open(files[1], 'a') as f:
+        f.write("- [ ] appended\n")
+    os.remove(files[2])
+    added = os.path.join(vault, 'sub', 'new.md')
+    with open(added, 'w') as f:
+        f.write(note(50))
+    assert catalog.refresh() == sorted([files[1], files[2], added])
+    assert rows(catalog.tasks) == expected(discover(vault))
+    assert catalog.refresh() == []
+
+    # Given paths, only those are checked
+    with open(added, 'a') as f:
+        f.write("- [ ] appended too\n")
+    assert catalog.refresh([os.path.join(vault, 'sub')]) == [added]
+    assert rows(catalog.tasks) == expected(discover(vault))
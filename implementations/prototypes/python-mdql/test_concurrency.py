@@ -0,0 +1,158 @@
+"""Tests for mdql_concurrency: three-way merges, conflicting saves and file locks."""
+
+import json
+import os
+
+import pytest
+
+from mdql import MDQL
+from mdql_cache import file_digest
+from mdql_concurrency import ConflictError, FileLock, merge3
+from mdql_wal import wal_path
+
+
+TODO = """## Inbox
+
+- [ ] Call venue
+- [ ] Send invoice
+- [ ] Book room
+"""
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'locks'
+    monkeypatch.setenv('MDQL_LOCK_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'notes' / 'todo.md'
+    path.parent.mkdir()
+    path.write_text(TODO)
+    return str(path)
+
+
+def visible(mdql):
+    return [(t.text, t.completed) for t in mdql.tasks]
+
+
+def test_merge3_applies_changes_to_separate_lines():
+    base = ['a\n', 'b\n', 'c\n', 'd\n']
+    ours = ['a\n', 'B\n', 'c\n', 'd\n']
+    theirs = ['a\n', 'b\n', 'c\n', 'd\n', 'e\n']
+    assert merge3(base, ours, theirs) == ['a\n', 'B\n', 'c\n', 'd\n', 'e\n']
+    # The same change on both sides is taken once
+    assert merge3(base, ours, ours) == ours
+
+
+def test_merge3_keeps_both_insertions_at_one_place():
+    base = ['a\n', 'b\n']
+    assert merge3(base, ['a\n', 'ours\n', 'b\n'], ['a\n', 'theirs\n', 'b\n']) == [
+        'a\n', 'theirs\n', 'ours\n', 'b\n']
+
+
+def test_merge3_conflict_names_the_line():
+    base = ['a\n', 'b\n', 'c\n']
+    with pytest.raises(ConflictError, match='line 2'):
+        merge3(base, ['a\n', 'ours\n', 'c\n'], ['a\n', 'theirs\n', 'c\n'])
+    with pytest.raises(ConflictError):
+        merge3(base, ['a\n', 'c\n'], ['a\n', 'B\n', 'c\n'])
+
+
+def test_concurrent_saves_merge(todo):
+    first, second = MDQL(todo), MDQL(todo)
+    first.mark_complete(3)
+    first.save()
+    second.update_text(5, 'Book a bigger room')
+    second.add_task('Inbox', 'Order cake')
+    second.save()
+
+    expected = [('Call venue', True), ('Send invoice', False),
+                ('Book a bigger room', False), ('Order cake', False)]
+    assert visible(MDQL(todo)) == expected
+    # The saver's own state now includes the other writer's edit
+    assert visible(second) == expected
+
+
+def test_conflicting_save_leaves_the_file_alone(todo):
+    first, second = MDQL(todo), MDQL(todo)
+    first.update_text(4, 'Send the invoice')
+    first.save()
+    saved = open(todo).read()
+    second.update_text(4, 'Email the invoice')
+    with pytest.raises(ConflictError, match='line 4'):
+        second.save()
+    assert open(todo).read() == saved
+
+    # Refreshing cannot merge it either, and keeps the unsaved edit
+    with pytest.raises(ConflictError):
+        second.refresh()
+    assert [t.text for t in second.tasks][1] == 'Email the invoice'
+
+
+def test_refresh_merges_unsaved_edits(todo):
+    first, second = MDQL(todo), MDQL(todo)
+    first.mark_complete(5)
+    first.save()
+    second.mark_complete(3)
+    assert second.refresh()
+    assert [t.completed for t in second.tasks] == [True, False, True]
+    second.save()
+    assert [t.completed for t in MDQL(todo).tasks] == [True, False, True]
+
+
+def test_save_refuses_to_drop_log_edits_it_has_not_loaded(todo):
+    # A log left by a writer that crashed, replayed on load
+    with open(wal_path(todo), 'w') as f:
+        f.write(json.dumps({'base': file_digest(todo), 'holes': []}) + '\n')
+        f.write('["x",3]\n')
+    mdql = MDQL(todo)
+    assert mdql.tasks[0].completed
+
+    # It changes before this instance saves (and would delete it)
+    with open(wal_path(todo), 'a') as f:
+        f.write('["x",4]\n')
+    mdql.mark_complete(5)
+    with pytest.raises(ConflictError, match='refresh'):
+        mdql.save()
+    assert open(todo).read() == TODO
+
+    mdql.refresh()
+    mdql.save()
+    assert [t.completed for t in MDQL(todo).tasks] == [True, True, True]
+    assert not os.path.exists(wal_path(todo))
+
+
+def test_save_leaves_an_owned_log_to_its_owner(todo):
+    with MDQL(todo, wal=True) as owner:
+        owner.mark_complete(3)
+        owner.save()
+        other = MDQL(todo)
+        other.mark_complete(5)
+        other.save()
+        assert os.path.exists(wal_path(todo))
+    # The owner's checkpoint merged with the other save
+    assert [t.completed for t in MDQL(todo).tasks] == [True, False, True]
+
+
+def test_locks_live_outside_the_markdown_directory(todo, lock_dir):
+    mdql = MDQL(todo)
+    mdql.mark_complete(3)
+    mdql.save()
+    assert os.listdir(os.path.dirname(todo)) == ['todo.md']
+    assert os.listdir(lock_dir)
+
+
+def test_exclusive_lock_excludes_everyone_shared_locks_share(todo):
+    with FileLock(todo, shared=True), FileLock(todo, shared=True, timeout=0) as reader:
+        assert reader.held
+        with pytest.raises(TimeoutError):
+            FileLock(todo, timeout=0).acquire()
+    with FileLock(todo):
+        with pytest.raises(TimeoutError):
+            FileLock(todo, shared=True, timeout=0).acquire()
+        # A separately named lock on the same file is independent
+        with FileLock(todo, timeout=0, name='wal-owner') as owner:
+            assert owner.held
@@ -0,0 +1,141 @@
+"""Tests for incremental re-parse: edits leave MDQL as a full parse of its lines would."""
+
+import random
+
+import pytest
+
+from mdql import MDQL, MDQLParser
+
+
+TODO = """Loose line
+- [ ] Before any heading
+
+# Todo
+
+## Inbox
+**Priority:** High
+
+- [ ] Call venue
+  - Ask about parking
+  - [x] Find the number
+    - [ ] Nested deeper
+- [x] Send invoice
+
+## Someday
+**Status:** Later
+
+- [ ] Learn piano
+
+### Errands
+- [ ] Buy stamps
+  - [ ] Post letter
+
+## Empty
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+def state(tasks, sections):
+    """Everything queries can see, as comparable plain values."""
+    return (
+        [(t.line_number, t.text, t.completed, t.section, t.section_level, t.indent_level,
+          t.parent_line, t.has_children, list(t.notes), [c.line_number for c in t.children])
+         for t in tasks],
+        {name: (meta.line_number, meta.priority, meta.status) for name, meta in sections.items()},
+    )
+
+
+def assert_matches_full_parse(mdql):
+    data = MDQLParser().parse_lines(list(mdql.writer.lines))
+    assert state(mdql.tasks, mdql.sections) == state(data['tasks'], data['sections'])
+
+
+def test_each_mutator_matches_a_full_parse(todo):
+    mdql = MDQL(todo)
+    mdql.mark_complete(mdql.query(text_contains='Call venue')[0].line_number)
+    assert_matches_full_parse(mdql)
+    mdql.update_text(mdql.query(text_contains='piano')[0].line_number, 'Learn the piano')
+    assert_matches_full_parse(mdql)
+    mdql.add_task('Inbox', 'Book a room', indent_level=1)
+    assert_matches_full_parse(mdql)
+    mdql.delete(mdql.query(text_contains='Nested deeper')[0].line_number)
+    assert_matches_full_parse(mdql)
+    mdql.add_task('Empty', 'No longer empty')
+    assert_matches_full_parse(mdql)
+
+
+def test_adding_shifts_later_sections_lazily(todo):
+    mdql = MDQL(todo)
+    before = mdql.query(text_contains='Buy stamps')[0].line_number
+    for i in range(3):
+        mdql.add_task('Inbox', f"New {i}")
+    assert mdql.query(text_contains='Buy stamps')[0].line_number == before + 3
+    assert mdql.writer.lines[before + 3 - 1] == '- [ ] Buy stamps\n'
+    assert_matches_full_parse(mdql)
+
+
+def test_random_edits_match_a_full_parse_and_survive_a_save(todo):
+    rng = random.Random(7)
+    mdql = MDQL(todo)
+    sections = ['Inbox', 'Someday', 'Errands', 'Empty']
+    for step in range(200):
+        tasks = mdql.tasks
+        op = rng.choice(['toggle', 'text', 'add', 'delete'] if tasks else ['add'])
+        if op == 'add':
+            mdql.add_task(rng.choice(sections), f"task {step}", indent_level=rng.randint(0, 2))
+        else:
+            line = rng.choice(tasks).line_number
+            if op == 'toggle':
+                (mdql.mark_complete if rng.random() < 0.5 else mdql.mark_incomplete)(line)
+            elif op == 'text':
+                mdql.update_text(line, f"renamed {step}")
+            else:
+                mdql.delete(line)
+        if step % 10 == 0:
+            assert_matches_full_parse(mdql)
+    assert_matches_full_parse(mdql)
+
+    expected = [(t.text, t.completed, t.section, t.indent_level) for t in mdql.tasks]
+    mdql.save()
+    reloaded = MDQL(todo)
+    assert [(t.text, t.completed, t.section, t.indent_level) for t in reloaded.tasks] == expected
+
+
+def test_deleting_a_heading_joins_the_previous_section(todo):
+    mdql = MDQL(todo)
+    heading = mdql.sections['Someday'].line_number
+    mdql.delete(heading)
+    assert_matches_full_parse(mdql)
+    assert 'Someday' not in mdql.sections
+    assert mdql.query(text_contains='piano')[0].section == 'Inbox'
+    assert [t.text for t in mdql.query(priority='High')][-1] == 'Learn piano'
+    # Its property lines now describe the section above
+    assert mdql.sections['Inbox'].status == 'Later'
+    assert len(mdql.query(status='Later')) == len(mdql.query(section='Inbox'))
+
+    # Edits after the merge still land in the right spans
+    mdql.add_task('Inbox', 'After the merge')
+    mdql.delete(mdql.sections['Todo'].line_number)
+    mdql.delete(mdql.sections['Errands'].line_number)
+    assert_matches_full_parse(mdql)
+    expected = [(t.text, t.section, t.indent_level) for t in mdql.tasks]
+    mdql.save()
+    assert [(t.text, t.section, t.indent_level) for t in MDQL(todo).tasks] == expected
+
+
+def test_inserted_heading_splits_its_section(todo):
+    mdql = MDQL(todo)
+    line = mdql.query(text_contains='Send invoice')[0].line_number
+    mdql.writer.lines.insert(line - 1, '## Billing\n')
+    mdql._reparse(mdql._span_index(line), delta=1)
+    assert_matches_full_parse(mdql)
+    assert mdql.query(text_contains='Send invoice')[0].section == 'Billing'
+    mdql.add_task('Billing', 'Chase payment')
+    mdql.add_task('Errands', 'Buy envelopes')
+    assert_matches_full_parse(mdql)
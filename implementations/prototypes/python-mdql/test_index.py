@@ -0,0 +1,255 @@
+"""Tests for TaskIndex maintenance: indexes and counts stay exact through edits."""
+
+import random
+
+import pytest
+
+from mdql import MDQL, TaskIndex
+from mdql_text import SEARCH_KINDS, value_matcher
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+**Status:** Active
+
+- [ ] Call venue
+  - Ask about parking
+  - [x] Find the number
+- [x] Send invoice
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+  - [ ] Buy a keyboard
+
+## Errands
+**Status:** Active
+
+- [ ] Buy stamps
+"""
+
+
+@pytest.fixture
+def mdql(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return MDQL(str(path))
+
+
+def snapshot(index):
+    """An index's contents by line number, comparable across instances."""
+    def lines(buckets):
+        return {key: sorted(t.line_number for t in bucket.values()) for key, bucket in buckets.items() if bucket}
+
+    return {
+        'by_line': {line: (t.text, t.line_number) for line, t in index.by_line.items()},
+        'by_section': lines(index.by_section),
+        'by_completed': lines(index.by_completed),
+        'by_indent': lines(index.by_indent),
+        'counts': {name: vars(counts) for name, counts in index.counts.items()},
+    }
+
+
+def assert_index_exact(mdql):
+    tasks = mdql.tasks
+    assert snapshot(mdql.index) == snapshot(TaskIndex(tasks))
+
+
+def brute_force(mdql, **filters):
+    """What MDQL.query(**filters) must return, by scanning every task."""
+    result = []
+    for task in mdql.tasks:
+        meta = mdql.sections.get(task.section)
+        if 'section' in filters and task.section != filters['section']:
+            continue
+        if 'completed' in filters and task.completed != filters['completed']:
+            continue
+        if 'indent_level' in filters and task.indent_level != filters['indent_level']:
+            continue
+        if 'priority' in filters and getattr(meta, 'priority', None) != filters['priority']:
+            continue
+        if 'status' in filters and getattr(meta, 'status', None) != filters['status']:
+            continue
+        result.append(task.line_number)
+    return result
+
+
+FILTERS = [
+    {'completed': False}, {'section': 'Inbox'}, {'priority': 'High', 'completed': False},
+    {'status': 'Active', 'indent_level': 0}, {'indent_level': 1, 'completed': True},
+]
+
+
+def test_index_built_on_load(mdql):
+    assert_index_exact(mdql)
+    assert vars(mdql.index.counts['Inbox']) == {
+        'total': 3, 'completed': 2, 'top_level': 2, 'top_level_completed': 1}
+
+
+def test_index_follows_edits(mdql):
+    mdql.mark_complete(mdql.query(text_contains='Call venue')[0].line_number)
+    assert_index_exact(mdql)
+    mdql.add_task('Inbox', 'Book a room')    # shifts every later line
+    assert_index_exact(mdql)
+    mdql.delete(mdql.query(text_contains='Buy a keyboard')[0].line_number)
+    assert_index_exact(mdql)
+    mdql.mark_incomplete(mdql.query(text_contains='Send invoice')[0].line_number)
+    assert_index_exact(mdql)
+    assert vars(mdql.index.counts['Inbox']) == {
+        'total': 4, 'completed': 2, 'top_level': 3, 'top_level_completed': 1}
+
+
+def test_lookup_by_line_after_pending_shifts(mdql):
+    stamps = mdql.query(text_contains='Buy stamps')[0].line_number
+    mdql.add_task('Someday', 'Practice scales')
+    # The shift is still pending here: the edit must find the moved task
+    mdql.mark_complete(stamps + 1)
+    assert mdql.query(text_contains='Buy stamps')[0].completed
+    assert_index_exact(mdql)
+
+
+def test_random_edits_keep_queries_equal_to_a_scan(mdql):
+    rng = random.Random(3)
+    for step in range(150):
+        tasks = mdql.tasks
+        op = rng.choice(['toggle', 'add', 'delete'] if tasks else ['add'])
+        if op == 'add':
+            mdql.add_task(rng.choice(['Inbox', 'Someday', 'Errands']), f"task {step}",
+                          indent_level=rng.randint(0, 1), completed=rng.random() < 0.3)
+        else:
+            task = rng.choice(tasks)
+            if op == 'delete':
+                mdql.delete(task.line_number)
+            elif task.completed:
+                mdql.mark_incomplete(task.line_number)
+            else:
+                mdql.mark_complete(task.line_number)
+        if step % 15 == 0:
+            assert_index_exact(mdql)
+            for filters in FILTERS:
+                assert [t.line_number for t in mdql.query(**filters)] == brute_force(mdql, **filters)
+    assert_index_exact(mdql)
+    summary = mdql.get_section_summary()
+    mdql.save()
+    assert summary == MDQL(mdql.filepath).get_section_summary()
+
+
+def test_plan_drives_from_the_smallest_index(mdql):
+    plan = mdql.explain(section='Errands', completed=False)
+    assert plan.driver_rows == 1
+    assert 'section' in plan.driver
+
+
+WORDS = ['Call', 'venue', 'INVOICE', 'piano', 'Stamps', 'café', 'book', 'Room', 'email', 'ORDER', 'cake', 'x']
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """A file large enough that every index can drive a query."""
+    rng = random.Random(5)
+    lines = []
+    for section in ['Inbox', 'Someday', 'Errands', 'Work', 'Home']:
+        lines += [f"## {section}", f"**Priority:** {rng.choice(['High', 'Low'])}",
+                  f"**Status:** {rng.choice(['Active', 'Later'])}", ""]
+        for _ in range(60):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            lines.append(f"{'  ' * rng.randint(0, 2)}- [{'x' if rng.random() < 0.3 else ' '}] {text}")
+            if rng.random() < 0.3:
+                lines.append(f"{'  ' * 3}- {rng.choice(WORDS)} {rng.choice(WORDS).lower()}")
+        lines.append("")
+    path = tmp_path / 'vault.md'
+    path.write_text("\n".join(lines))
+    return MDQL(str(path))
+
+
+def scan(mdql, **filters):
+    """What MDQL.query(**filters) must return, checking every filter on every task."""
+    tests = []
+    for name, value in filters.items():
+        field, _, kind = name.rpartition('_')
+        if kind in SEARCH_KINDS:
+            matcher = value_matcher(kind, value)
+            tests.append(lambda t, field=field, matcher=matcher: matcher(getattr(t, field)))
+        elif name in ('priority', 'status'):
+            tests.append(lambda t, name=name, value=value: getattr(mdql.sections.get(t.section), name) == value)
+        elif name == 'has_notes':
+            tests.append(lambda t, value=value: bool(t.notes) == value)
+        else:
+            tests.append(lambda t, name=name, value=value: getattr(t, name) == value)
+    return [t.line_number for t in mdql.tasks if all(test(t) for test in tests)]
+
+
+@pytest.mark.parametrize('filters', [
+    {'section': 'Work', 'completed': True},
+    {'priority': 'High', 'indent_level': 2},
+    {'status': 'Later', 'has_notes': True},
+    {'text_contains': 'café', 'completed': False},
+    {'text_contains': 'x'},
+    {'text_contains': 'INVOICE book', 'section': 'Home'},
+    {'text_match': 'call venue', 'indent_level': 0},
+    {'text_match': 'ord*'},
+    {'text_like': '%STAMP%', 'priority': 'Low'},
+    {'text_like': '_all%'},
+    {'text_regexp': 'ca(ke|fé)$'},
+    {'text_regexp': '.'},
+    {'notes_contains': 'room'},
+    {'notes_like': '%e%'},
+    {'section_regexp': '^(inbox|home)$', 'completed': False},
+    {'section_like': 'W%', 'text_contains': 'Email'},
+])
+def test_every_driver_matches_a_scan(vault, filters):
+    assert [t.line_number for t in vault.query(**filters)] == scan(vault, **filters)
+
+
+def test_indexes_drive_selective_queries(vault):
+    assert vault.explain(text_match='piano venue').driver != 'scan'
+    assert vault.explain(text_like='%stamps book%').driver != 'scan'
+    assert vault.explain(has_notes=True).driver == 'scan'
+
+
+def recount(mdql):
+    """get_section_summary() computed from the task list, as before the counters."""
+    summary = []
+    for name, meta in mdql.sections.items():
+        top = [t for t in mdql.tasks if t.section == name and t.indent_level == 0]
+        if top:
+            done = sum(t.completed for t in top)
+            summary.append({'section': name, 'priority': meta.priority, 'status': meta.status,
+                            'total_tasks': len(top), 'completed': done, 'remaining': len(top) - done,
+                            'completion_pct': round(100 * done / len(top), 1)})
+    return summary
+
+
+def test_summary_counters_match_a_recount(mdql):
+    rng = random.Random(8)
+    assert mdql.get_section_summary() == recount(mdql)
+    for step in range(100):
+        tasks = mdql.tasks
+        op = rng.choice(['toggle', 'add', 'delete', 'text'])
+        if op == 'add' or not tasks:
+            mdql.add_task(rng.choice(list(mdql.sections)), f"task {step}", indent_level=rng.randint(0, 1),
+                          completed=rng.random() < 0.5)
+        else:
+            task = rng.choice(tasks)
+            if op == 'delete':
+                mdql.delete(task.line_number)
+            elif op == 'text':
+                mdql.update_text(task.line_number, f"renamed {step}")
+            elif task.completed:
+                mdql.mark_incomplete(task.line_number)
+            else:
+                mdql.mark_complete(task.line_number)
+        assert mdql.get_section_summary() == recount(mdql)
+
+    # Deleting a heading moves its tasks into the section above
+    mdql.delete(mdql.sections['Someday'].line_number)
+    assert mdql.get_section_summary() == recount(mdql)
+    before = mdql.get_section_summary()
+    with pytest.raises(RuntimeError):
+        with mdql.transaction():
+            mdql.add_task('Inbox', 'rolled back', completed=True)
+            raise RuntimeError
+    assert mdql.get_section_summary() == recount(mdql) == before
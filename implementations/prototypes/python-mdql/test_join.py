@@ -0,0 +1,120 @@
+"""Tests for mdql_join: join methods, outer joins, pushdown and folder sources."""
+
+import pytest
+
+from mdql import MDQL
+from mdql_catalog import MDQLCatalog
+from mdql_join import JoinQuery
+from mdql_sql import MDQLSyntaxError
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+
+- [ ] Call venue
+- [x] Send invoice
+
+## Someday
+
+- [ ] Learn piano
+
+## Empty
+**Priority:** Low
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / 'notes'
+    root.mkdir()
+    (root / 'a.md').write_text("## Inbox\n**Priority:** High\n\n- [ ] a task\n")
+    (root / 'b.md').write_text("## Inbox\n**Priority:** Low\n\n- [ ] b task\n")
+    return str(root)
+
+
+def open_catalog(path):
+    return MDQLCatalog(path, workers=1)
+
+
+def rows(query, *params):
+    return [query.project(row) for row in query.execute(*params)]
+
+
+def test_inner_hash_join(todo):
+    query = JoinQuery(f"SELECT t.text, m.priority FROM '{todo}' t "
+                      f"JOIN '{todo}'::section_metadata m ON t.section = m.section_name", MDQL)
+    assert rows(query) == [
+        {'t.text': 'Call venue', 'm.priority': 'High'},
+        {'t.text': 'Send invoice', 'm.priority': 'High'},
+        {'t.text': 'Learn piano', 'm.priority': None},
+    ]
+    assert query.join_steps[0].method == 'Hash join'
+
+
+def test_left_join_pads_missing_side_with_null(todo):
+    query = JoinQuery(f"SELECT t.text, m.priority FROM '{todo}' t "
+                      f"LEFT JOIN '{todo}'::section_metadata m "
+                      f"ON t.section = m.section_name AND m.priority = 'Low'", MDQL)
+    result = query.execute()
+    assert len(result) == 3
+    assert all(row[1] is None for row in result)
+    assert [query.project(row)['m.priority'] for row in result] == [None, None, None]
+
+
+def test_right_and_full_join_keep_unmatched_sections(todo):
+    right = JoinQuery(f"SELECT t.text, m.section_name FROM '{todo}' t "
+                      f"RIGHT JOIN '{todo}'::section_metadata m ON t.section = m.section_name", MDQL)
+    unmatched = [row for row in rows(right) if row['t.text'] is None]
+    assert [row['m.section_name'] for row in unmatched] == ['Todo', 'Empty']
+
+    full = JoinQuery(f"SELECT t.text, m.section_name FROM '{todo}' t "
+                     f"FULL JOIN '{todo}'::section_metadata m ON t.section = m.section_name", MDQL)
+    assert len(full.execute()) == 3 + 2
+
+
+def test_range_condition_uses_sort_merge_join(todo):
+    query = JoinQuery(f"SELECT t.text, m.section_name FROM '{todo}' t "
+                      f"JOIN '{todo}'::section_metadata m ON t.line > m.line "
+                      f"WHERE m.section_name = 'Someday'", MDQL)
+    assert query.join_steps[0].method == 'Sort-merge join'
+    assert rows(query) == [{'t.text': 'Learn piano', 'm.section_name': 'Someday'}]
+
+
+def test_single_table_terms_are_pushed_into_scans(todo):
+    query = JoinQuery(f"SELECT t.text FROM '{todo}' t "
+                      f"JOIN '{todo}'::section_metadata m ON t.section = m.section_name "
+                      f"WHERE t.completed = ? AND m.priority = 'High'", MDQL)
+    assert query.where is None
+    assert rows(query, False) == [{'t.text': 'Call venue'}]
+    assert any(step.startswith('Scan t') and step.endswith('-> 2 rows') for step in query.steps)
+    assert any(step.startswith('Scan m') and step.endswith('-> 1 rows') for step in query.steps)
+
+
+def test_folder_join_matches_sections_within_each_file(folder):
+    query = JoinQuery(f"SELECT t.text, m.priority, m.file FROM '{folder}' t "
+                      f"JOIN '{folder}'::section_metadata m "
+                      f"ON t.file = m.file AND t.section = m.section_name", open_catalog)
+    result = rows(query)
+    assert [(row['t.text'], row['m.priority']) for row in result] == [('a task', 'High'), ('b task', 'Low')]
+    assert [row['m.file'].rsplit('/', 1)[-1] for row in result] == ['a.md', 'b.md']
+
+
+def test_folder_join_on_section_name_alone_crosses_files(folder):
+    query = JoinQuery(f"SELECT t.text FROM '{folder}' t "
+                      f"JOIN '{folder}'::section_metadata m ON t.section = m.section_name", open_catalog)
+    assert len(query.execute()) == 4
+
+
+def test_unknown_column_is_rejected(todo):
+    with pytest.raises(MDQLSyntaxError):
+        JoinQuery(f"SELECT t.text FROM '{todo}' t "
+                  f"JOIN '{todo}'::section_metadata m ON t.section = m.nope", MDQL)
@@ -0,0 +1,142 @@
+"""Tests for mdql_mmap: mapped parses match MDQL, in-place edits round-trip safely."""
+
+import os
+
+import pytest
+
+from mdql import MDQL
+from mdql_cache import ParseCache
+from mdql_concurrency import ConflictError, file_version
+from mdql_mmap import MappedTaskFile
+from mdql_wal import wal_path
+
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'samples', 'notes-app', 'todo-test.md')
+
+TODO = """Loose line
+- [ ] Before any heading
+
+# Todo
+
+## Inbox
+*Source: notes-2025-12-20.md (2025-12-20 09:15)*
+**Priority:** High
+**Owner:** Sam
+
+- [ ] Call venue
+  - Ask about parking
+  - [X] Find the number
+    - [ ] Nested deeper
+\t- [ ] Tab indented
+- [x] Send invoice — café
+  * not a note
+   - odd indent note
+#NoSpace heading
+  # indented hash
+
+### Errands
+*Updated: notes-2025-12-28.md (2025-12-28)*
+- [ ] Buy stamps
+-  [ ] Not a task
+- []  Not a task either
+- [ ] Last line without newline"""
+
+
+def state(tasks, sections):
+    """Everything queries can see, as comparable plain values."""
+    return (
+        [(t.line_number, t.text, t.completed, t.section, t.section_level, t.indent_level,
+          t.parent_line, t.has_children, list(t.notes), [c.line_number for c in t.children])
+         for t in tasks],
+        {name: (meta.line_number, meta.priority, meta.status, meta.properties, meta.source_file,
+                meta.source_date, meta.updated_file) for name, meta in sections.items()},
+    )
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_parse_matches_mdql(tmp_path, newline):
+    path = tmp_path / 'todo.md'
+    with open(path, 'w', newline=newline) as f:
+        f.write(TODO)
+    with MappedTaskFile(str(path)) as mapped:
+        assert state(mapped.tasks, mapped.sections) == state(MDQL(str(path)).tasks, MDQL(str(path)).sections)
+
+
+def test_sample_matches_mdql():
+    with MappedTaskFile(SAMPLE) as mapped:
+        mdql = MDQL(SAMPLE)
+        assert state(mapped.tasks, mapped.sections) == state(mdql.tasks, mdql.sections)
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.md'
+    path.write_text('')
+    with MappedTaskFile(str(path)) as mapped:
+        assert mapped.tasks == [] and mapped.sections == {}
+
+
+def test_toggles_round_trip(todo):
+    with MappedTaskFile(todo, writable=True) as mapped:
+        mapped.mark_complete(11)
+        mapped.mark_incomplete(13)
+        mapped.update_text(16, 'Send invoice — CAFÉ')
+    mdql = MDQL(todo)
+    assert [(t.line_number, t.text, t.completed) for t in mdql.tasks
+            if t.line_number in (11, 13, 16)] == [(11, 'Call venue', True), (13, 'Find the number', False),
+                                                  (16, 'Send invoice — CAFÉ', True)]
+
+    with MappedTaskFile(todo, writable=True) as mapped:
+        mapped.mark_incomplete(11)
+        mapped.mark_complete(13)
+        mapped.update_text(16, 'Send invoice — café')
+    assert open(todo).read() == TODO.replace('[X] Find', '[x] Find')
+
+
+def test_same_length_text_only(todo):
+    with MappedTaskFile(todo, writable=True) as mapped:
+        with pytest.raises(ValueError, match='MDQL.update_text'):
+            mapped.update_text(24, 'Buy more stamps')
+    with MappedTaskFile(todo) as mapped:
+        with pytest.raises(ValueError, match='not mapped for writing'):
+            mapped.mark_complete(11)
+
+
+def test_edits_give_the_file_a_new_version(todo, tmp_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    mdql = MDQL(todo, cache=cache)
+    with MappedTaskFile(todo, writable=True, cache=cache) as mapped:
+        versions = [file_version(todo)]
+        for _ in range(3):
+            mapped.mark_complete(11)
+            versions.append(file_version(todo))
+        assert len(set(versions)) == 4
+    assert cache.load(todo) is None
+    assert mdql.refresh()
+    assert mdql.query(text_contains='Call venue')[0].completed
+    assert MDQL(todo, cache=cache).query(text_contains='Call venue')[0].completed
+
+
+def test_writing_a_replaced_file_is_a_conflict(todo):
+    with MappedTaskFile(todo, writable=True) as mapped:
+        mdql = MDQL(todo)
+        mdql.mark_complete(24)
+        mdql.save()
+        with pytest.raises(ConflictError):
+            mapped.mark_complete(11)
+    assert not MDQL(todo).query(text_contains='Call venue')[0].completed
+
+
+def test_file_with_a_log_is_not_opened_for_writing(todo):
+    with MDQL(todo, wal=True) as mdql:
+        mdql.mark_complete(11)
+        mdql.save()
+        with pytest.raises(ConflictError, match='write-ahead log'):
+            MappedTaskFile(todo, writable=True)
+        assert os.path.exists(wal_path(todo))
@@ -0,0 +1,69 @@
+"""Tests for mdql_scan: LineScanner classifies every line exactly as RegexTokenizer does."""
+
+import glob
+import os
+import random
+
+import pytest
+
+from mdql import MDQL, MDQLParser
+from mdql_scan import LineScanner, RegexTokenizer
+
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'samples', '**', '*.md'),
+                           recursive=True))
+
+EDGE_CASES = [
+    '', '\n', '\r\n', ' \n', '\t\n',
+    '- [ ] task\n', '- [x] done\n', '- [X] DONE\n', '- [ ] trailing spaces   \n', '- [ ]   extra gap\n',
+    '  - [ ] indented\n', '   - [ ] odd indent\n', '\t- [ ] tab\n', ' - [ ] no-break space\n',
+    '    - [x] deep\n', '- [ ]\n', '- [ ] \n', '- []  no space\n', '-  [ ] two spaces\n', '- [y] other mark\n',
+    '- [ ] crlf\r\n', '- plain bullet\n', '  - indented bullet\n', '- \n', '-\n', '* star bullet\n',
+    '# Heading\n', '###### Six\n', '####### Seven\n', '#NoSpace\n', '# \n', '#\n', '  # indented\n',
+    '## Heading with trailing   \n', '## crlf heading\r\n', '# a # b\n',
+    '**Priority:** High\n', '**Status:**   Spaced\n', '**Key:**\n', '**Key:** \n', '**a:** b:** c\n',
+    '*Source: notes.md (2025-12-20 09:15)*\n', '*Updated: notes.md (2025-12-28)*\n',
+    '*Source:notes.md(2025-12-20)*\n', '*Source: notes.txt (2025-12-20)*\n', '*Source: notes.md (x)* \n',
+    '*Other: notes.md (2025-12-20)*\n', '*emphasis*\n', '**bold**\n', 'plain text\n', '> quote\n',
+    'last line without newline', '- [ ] no newline', '# no newline',
+]
+
+FRAGMENTS = ['', ' ', '  ', '\t', '-', '- ', '[', ']', '[ ]', '[x]', '[X]', '#', '## ', '*', '**', ':',
+             ':**', 'Source:', 'Updated:', 'a.md', '(', ')', 'text', 'é', '\r', ' ']
+
+
+def assert_same(lines):
+    scanner, reference = LineScanner(), RegexTokenizer()
+    for line in lines:
+        assert scanner.scan(line) == reference.scan(line), repr(line)
+
+
+def test_edge_cases():
+    assert_same(EDGE_CASES)
+
+
+def test_fuzzed_lines():
+    rng = random.Random(11)
+    lines = [''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 8))) + rng.choice(['\n', '\r\n', ''])
+             for _ in range(20000)]
+    assert_same(lines)
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples(path):
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    assert_same(lines)
+    fast = MDQLParser().parse_lines(lines)
+    slow = MDQLParser(tokenizer=RegexTokenizer()).parse_lines(list(lines))
+    assert fast['tasks'] == slow['tasks']
+    assert fast['sections'] == slow['sections']
+
+
+def test_parser_uses_the_scanner_by_default(tmp_path):
+    assert isinstance(MDQLParser().tokenizer, LineScanner)
+    path = tmp_path / 'todo.md'
+    path.write_text(''.join(line if line.endswith('\n') else line + '\n' for line in EDGE_CASES))
+    with open(path, encoding='utf-8') as f:
+        reference = MDQLParser(tokenizer=RegexTokenizer()).parse_lines(f.readlines())
+    assert MDQL(str(path)).tasks == reference['tasks']
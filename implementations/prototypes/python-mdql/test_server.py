@@ -0,0 +1,147 @@
+"""Tests for mdql_server and mdql_client: served queries match a fresh load, before and after edits."""
+
+import os
+import threading
+
+import pytest
+
+from mdql import MDQL
+from mdql_client import MDQLClient
+from mdql_server import QueryService, make_server
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+**Status:** Active
+
+- [ ] Call venue
+  - Ask about parking
+- [x] Send invoice
+- [ ] Book room
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+"""
+
+QUERIES = [
+    ("SELECT text FROM todo.md WHERE completed = ?", [False]),
+    ("SELECT text FROM todo.md WHERE status = ?", ['Active']),
+    ("SELECT text, section FROM todo.md WHERE priority IN ('High') AND text LIKE ?", ['%o%']),
+    ("SELECT * FROM todo.md WHERE has_notes OR section = 'Someday' ORDER BY text", []),
+    ("SELECT text FROM todo.md WHERE priority IN ('High') AND completed = ?", [False]),
+    ("SELECT text FROM todo.md WHERE priority = 'High' OR status = ?", ['Active']),
+]
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = QueryService(cache_dir=str(tmp_path / 'cache'))
+    yield service
+    service.close()
+
+
+def expected(todo, query, params):
+    """What a fresh load of the file answers."""
+    return [t.text for t in MDQL(todo).prepare(query).execute(*params)]
+
+
+def served(service, todo, query, params):
+    response = service.handle({'file': todo, 'query': query, 'params': params})
+    assert response['ok'], response
+    return [row['text'] for row in response['rows']]
+
+
+def edit(todo):
+    """Change tasks, a section's metadata, and add a section, as an editor would."""
+    with open(todo) as f:
+        text = f.read()
+    text = text.replace('- [ ] Call venue', '- [x] Call venue').replace('**Status:** Active', '**Status:** Done')
+    text = text.replace('**Priority:** High', '**Priority:** Medium').replace('**Priority:** Low', '**Priority:** High')
+    with open(todo, 'w') as f:
+        f.write(text + "- [ ] Buy a keyboard\n\n## Errands\n**Status:** Active\n\n- [ ] Post a book\n")
+
+
+@pytest.mark.parametrize('query, params', QUERIES)
+def test_query_refresh_and_requery(service, todo, query, params):
+    assert served(service, todo, query, params) == expected(todo, query, params)
+    edit(todo)
+    # The prepared statement the first query cached must see the reloaded sections
+    assert served(service, todo, query, params) == expected(todo, query, params)
+    assert service.stats()['reloads'] == 1
+
+
+def test_requery_after_edits_between_queries(service, todo):
+    query, params = QUERIES[2]
+    before = served(service, todo, query, params)
+    assert before == ['Send invoice', 'Book room']
+    edit(todo)
+    # The priorities of Inbox and Someday swapped
+    assert served(service, todo, query, params) == ['Learn piano', 'Buy a keyboard']
+    assert served(service, todo, "SELECT text FROM todo.md WHERE status = ?", ['Active']) == ['Post a book']
+
+
+def test_folder_query_refreshes_only_changed_files(service, tmp_path, todo):
+    other = tmp_path / 'other.md'
+    other.write_text("## Inbox\n**Priority:** High\n\n- [ ] Other task\n")
+    query = "SELECT text, source_file FROM . WHERE priority = 'High' ORDER BY text"
+    request = {'file': str(tmp_path), 'query': query, 'cwd': str(tmp_path)}
+    assert [row['text'] for row in service.handle(request)['rows']] == ['Book room', 'Call venue', 'Other task',
+                                                                        'Send invoice']
+    edit(todo)
+    assert [row['text'] for row in service.handle(request)['rows']] == ['Buy a keyboard', 'Learn piano', 'Other task']
+
+
+def test_aggregates_follow_edits(service, todo):
+    query = "SELECT section, COUNT(*) AS n FROM todo.md GROUP BY section ORDER BY section"
+    rows = service.handle({'file': todo, 'query': query})['rows']
+    assert rows == [{'section': 'Inbox', 'n': 3}, {'section': 'Someday', 'n': 1}]
+    edit(todo)
+    rows = service.handle({'file': todo, 'query': query})['rows']
+    assert rows == [{'section': 'Errands', 'n': 1}, {'section': 'Inbox', 'n': 3}, {'section': 'Someday', 'n': 2}]
+
+
+def test_errors_are_returned(service, todo):
+    assert service.handle({'op': 'nope'})['ok'] is False
+    assert 'error' in service.handle({'file': todo, 'query': "SELECT FROM"})
+    assert service.handle({'query': "SELECT * FROM missing.md", 'cwd': os.path.dirname(todo)})['ok'] is False
+    assert service.handle({'op': 'ping'}) == {'ok': True}
+
+
+def test_client_over_a_unix_socket(service, todo, tmp_path):
+    socket_path = str(tmp_path / 's.sock')
+    server = make_server(service, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with MDQLClient(socket_path) as client:
+            for query, params in QUERIES:
+                result = client.query(todo, query, params)
+                assert [row['text'] for row in result['rows']] == expected(todo, query, params)
+                assert result['count'] == len(result['rows'])
+            edit(todo)
+            for query, params in QUERIES:
+                assert [row['text'] for row in client.query(todo, query, params)['rows']] == \
+                    expected(todo, query, params)
+            assert client.query(todo, QUERIES[0][0], QUERIES[0][1], limit=1)['count'] == 1
+            plan = client.explain(todo, "SELECT text FROM todo.md WHERE status = 'Done'")
+            assert "status = 'Done' (3 of 6 rows)" in plan
+            with pytest.raises(ValueError):
+                client.query(todo, "SELECT * FROM todo.md WHERE")
+            stats = client.stats()
+            assert stats['files'][os.path.abspath(todo)]['tasks'] == len(MDQL(todo).tasks)
+            assert stats['reloads'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
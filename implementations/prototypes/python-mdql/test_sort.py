@@ -0,0 +1,80 @@
+"""Tests for mdql_sort: bounded-heap top-k and the spilling sort agree with sorted()."""
+
+import random
+
+import pytest
+
+from mdql import MDQL
+from mdql_sort import Descending, external_sort, sort_rows, top_k
+from mdql_sql import column_getter, execute_query, order_key, parse_mdql_query, resolve_column, stream_query
+
+
+@pytest.fixture
+def rows():
+    rng = random.Random(2)
+    # Few distinct keys, so ties (and stability) matter
+    return [{'id': i, 'a': rng.randint(0, 9), 'b': rng.choice(['x', 'y', 'z', None])} for i in range(500)]
+
+
+def key_a(row):
+    return row['a']
+
+
+@pytest.mark.parametrize('buffer_rows', [1, 7, 100, 1000])
+def test_external_sort_matches_sorted(rows, buffer_rows, tmp_path):
+    assert list(external_sort(rows, key_a, buffer_rows, tmpdir=str(tmp_path))) == sorted(rows, key=key_a)
+
+
+def test_external_sort_is_lazy_and_cleans_up(rows, tmp_path):
+    merged = external_sort(iter(rows), key_a, buffer_rows=50, tmpdir=str(tmp_path))
+    assert next(merged) == sorted(rows, key=key_a)[0]
+    merged.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('k', [0, 1, 5, 499, 500, 600])
+def test_top_k_matches_sorted_prefix(rows, k):
+    assert top_k(rows, k, key_a) == sorted(rows, key=key_a)[:k]
+    assert list(sort_rows(iter(rows), key_a, limit=k)) == sorted(rows, key=key_a)[:k]
+
+
+def test_composite_keys_with_descending_and_nulls(rows):
+    key = order_key([(lambda r: r['b'], False), (lambda r: r['a'], True)])
+    expected = sorted(rows, key=lambda r: (r['b'] is None, r['b'] or '', -r['a']))
+    assert list(external_sort(rows, key, buffer_rows=16)) == expected
+    assert top_k(rows, 40, key) == expected[:40]
+    assert sorted([Descending(1), Descending(3), Descending(2)]) == [Descending(3), Descending(2), Descending(1)]
+
+
+@pytest.fixture
+def todo(tmp_path):
+    rng = random.Random(1)
+    lines = []
+    for section in ['Inbox', 'Someday', 'Errands']:
+        lines += [f"## {section}", f"**Priority:** {rng.choice(['High', 'Low'])}", ""]
+        lines += [f"{'  ' * rng.randint(0, 2)}- [{rng.choice(' x')}] task {rng.randint(0, 20)}" for _ in range(40)]
+        lines.append("")
+    path = tmp_path / 'todo.md'
+    path.write_text("\n".join(lines))
+    return str(path)
+
+
+@pytest.mark.parametrize('order', [
+    "ORDER BY text",
+    "ORDER BY indent_level DESC, text",
+    "ORDER BY priority, completed DESC, line DESC",
+    "ORDER BY text LIMIT 7",
+    "ORDER BY section DESC, indent_level LIMIT 50",
+])
+def test_streamed_order_by_matches_a_full_sort(todo, order):
+    query = parse_mdql_query(f"SELECT * FROM todo.md WHERE completed = false {order}")
+    mdql = MDQL(todo)
+    expected = [t.line_number for t in execute_query(query, mdql)]
+    assert [t.line_number for t in stream_query(query, todo, sort_buffer=5)] == expected
+
+    # And both agree with sorted() on the same key
+    key = order_key([(column_getter(resolve_column(item.column), mdql), item.descending)
+                     for item in query.order_by])
+    matches = [t for t in mdql.tasks if not t.completed]
+    full = sorted(matches, key=key)
+    assert expected == [t.line_number for t in full][:query.limit]
@@ -0,0 +1,181 @@
+"""Tests for mdql_sql: tokenizer, parser and compiled execution."""
+
+import pytest
+
+from mdql import MDQL
+from mdql_sql import (
+    And, Column, Compare, InList, Like, Literal, MDQLSyntaxError, Not, Or, Param, compile_predicate,
+    execute_query, parse_mdql_query, stream_query, tokenize,
+)
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+
+- [ ] Call venue AND caterer
+  - Ask about parking
+- [x] Send invoice
+- [ ] It's done or not
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+  - [ ] Buy a keyboard
+"""
+
+
+@pytest.fixture
+def mdql(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return MDQL(str(path))
+
+
+def texts(tasks):
+    return [task.text for task in tasks]
+
+
+def test_keywords_inside_strings_stay_strings():
+    tokens = tokenize("WHERE text = 'Call venue AND caterer' and completed = false")
+    assert [(t.kind, t.value) for t in tokens[:4]] == [
+        ('keyword', 'WHERE'), ('ident', 'text'), ('op', '='), ('string', 'Call venue AND caterer')]
+    assert [t.value for t in tokens if t.kind == 'keyword'] == ['WHERE', 'AND', 'FALSE']
+
+
+def test_doubled_quotes_escape_a_quote():
+    assert tokenize("'It''s done'")[0].value == "It's done"
+    assert tokenize('"say ""hi"""')[0].value == 'say "hi"'
+
+
+def test_unexpected_character_reports_its_position():
+    with pytest.raises(MDQLSyntaxError, match='position 7'):
+        tokenize("text = @x")
+
+
+def test_and_binds_tighter_than_or():
+    parsed = parse_mdql_query("SELECT * FROM todo.md WHERE completed = false OR priority = 'High' AND indent_level = 0")
+    assert isinstance(parsed.where, Or)
+    assert isinstance(parsed.where.items[1], And)
+
+
+def test_parses_every_clause():
+    parsed = parse_mdql_query("SELECT text AS task, line FROM 'my notes/todo.md' t "
+                              "WHERE section IN ('Inbox', ?) AND NOT text LIKE '%piano%' "
+                              "ORDER BY line DESC LIMIT 5")
+    assert parsed.columns == ['task', 'line']
+    assert (parsed.source, parsed.alias) == ('my notes/todo.md', 't')
+    assert isinstance(parsed.where.items[0], InList)
+    assert isinstance(parsed.where.items[0].values[1], Param)
+    assert parsed.where.items[1] == Not(Like(Column('text'), Literal('%piano%')))
+    assert [(str(item.column), item.descending) for item in parsed.order_by] == [('line', True)]
+    assert parsed.limit == 5 and parsed.param_count == 1
+
+
+def test_bare_path_with_slashes_and_dashes():
+    assert parse_mdql_query("SELECT * FROM samples/notes-app/todo.md").source == 'samples/notes-app/todo.md'
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT FROM todo.md",
+    "SELECT * todo.md",
+    "SELECT * FROM",
+    "SELECT * FROM todo.md WHERE",
+    "SELECT * FROM todo.md WHERE text = 'unterminated",
+    "SELECT * FROM todo.md LIMIT many",
+    "SELECT * FROM todo.md WHERE completed = false trailing",
+])
+def test_malformed_queries_raise_syntax_errors(query):
+    with pytest.raises(MDQLSyntaxError):
+        parse_mdql_query(query)
+
+
+def test_unknown_column_is_an_error(mdql):
+    with pytest.raises(MDQLSyntaxError, match="Unknown column 'nope'"):
+        execute_query(parse_mdql_query("SELECT * FROM todo.md WHERE nope = 1"), mdql)
+    with pytest.raises(MDQLSyntaxError):
+        mdql.prepare("SELECT * FROM todo.md ORDER BY nope").execute()
+
+
+def test_quoted_and_matches_literally(mdql):
+    query = parse_mdql_query("SELECT * FROM todo.md WHERE text = 'Call venue AND caterer'")
+    assert isinstance(query.where, Compare)
+    assert texts(execute_query(query, mdql)) == ['Call venue AND caterer']
+
+
+def test_execution_matches_streaming(mdql):
+    query = ("SELECT * FROM todo.md WHERE (priority = 'High' OR indent_level > 0) "
+             "AND NOT completed ORDER BY line DESC")
+    expected = ['Buy a keyboard', "It's done or not", 'Call venue AND caterer']
+    assert texts(execute_query(parse_mdql_query(query), mdql)) == expected
+    assert texts(stream_query(query, mdql.filepath)) == expected
+
+
+def test_parameters_bind_at_execution(mdql):
+    statement = mdql.prepare("SELECT * FROM todo.md WHERE section = ? AND completed = ? LIMIT ?")
+    assert texts(statement.execute('Inbox', False, 1)) == ['Call venue AND caterer']
+    assert texts(statement.execute('Someday', False, 5)) == ['Learn piano', 'Buy a keyboard']
+
+
+def test_like_in_and_null_checks(mdql):
+    def run(where):
+        return texts(execute_query(parse_mdql_query(f"SELECT * FROM todo.md WHERE {where}"), mdql))
+
+    assert run("text LIKE '%piano'") == ['Learn piano']
+    assert run("text NOT LIKE '%a%'") == ['Send invoice', "It's done or not"]
+    assert run("section IN ('Someday') AND parent_line IS NOT NULL") == ['Buy a keyboard']
+    assert run("has_notes") == ['Call venue AND caterer']
+
+
+def test_prepared_statement_sees_a_refreshed_file(mdql):
+    query = "SELECT * FROM todo.md WHERE priority IN ('High') AND status = ?"
+    mdql.prepare(query)
+    with open(mdql.filepath, 'w') as f:
+        f.write("## Inbox\n**Priority:** Low\n\n- [ ] one\n\n"
+                "## Later\n**Priority:** High\n**Status:** Open\n\n- [ ] three\n")
+    assert mdql.refresh()
+    assert texts(mdql.prepare(query).execute('Open')) == ['three']
+
+
+@pytest.mark.parametrize('where', [
+    "completed = false AND priority = 'High'",
+    "section = 'Someday' AND text LIKE '%piano%'",
+    "text LIKE '%AND%' AND completed = false",
+    "text LIKE '___l%'",
+    "text LIKE '%'",
+    "text MATCH 'call' OR text REGEXP 'PIANO$'",
+    "text REGEXP '(venue|invoice)' AND indent_level = 0",
+    "notes LIKE '%parking%' AND NOT completed",
+    "priority = 'Low' AND status IS NULL AND text NOT LIKE '%keyboard%'",
+    "section LIKE 'in%' AND has_notes = true",
+])
+def test_pushdown_matches_a_full_scan(mdql, where):
+    query = parse_mdql_query(f"SELECT * FROM todo.md WHERE {where}")
+    predicate = compile_predicate(query.where, mdql)
+    assert texts(execute_query(query, mdql)) == texts(t for t in mdql.tasks if predicate(t))
+
+
+def test_statement_cache_reuses_and_evicts(mdql):
+    query = "SELECT * FROM todo.md WHERE section = ? AND completed = false"
+    statement = mdql.prepare(query)
+    assert mdql.prepare(query) is statement
+    assert (mdql._statements.hits, mdql._statements.misses) == (1, 1)
+
+    mdql._statements.maxsize = 2
+    mdql.prepare("SELECT * FROM todo.md LIMIT 1")
+    mdql.prepare("SELECT * FROM todo.md LIMIT 2")
+    assert mdql.prepare(query) is not statement
+    assert list(mdql._statements.statements) == ["SELECT * FROM todo.md LIMIT 2", query]
+
+
+def test_prepared_statement_follows_edits(mdql):
+    statement = mdql.prepare("SELECT * FROM todo.md WHERE priority = 'Low' AND completed = ?")
+    assert texts(statement.execute(False)) == ['Learn piano', 'Buy a keyboard']
+    mdql.mark_complete(mdql.query(text_contains='piano')[0].line_number)
+    mdql.add_task('Someday', 'Tune the piano')
+    assert texts(statement.execute(False)) == ['Buy a keyboard', 'Tune the piano']
+    assert texts(statement.execute(True)) == ['Learn piano']
+    with pytest.raises(ValueError, match='Expected 1 parameter'):
+        statement.execute()
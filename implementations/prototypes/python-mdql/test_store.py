@@ -0,0 +1,102 @@
+"""Tests for mdql_store: CompactMDQL answers like MDQL from its columnar store."""
+
+import pytest
+
+from mdql import MDQL, TaskItem
+from mdql_aggregate import aggregate_query
+from mdql_sql import execute_query, stream_query
+from mdql_store import MAX_INDENT, CompactMDQL, TaskStore
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+**Status:** Active
+
+- [ ] Call venue
+  - Ask about parking
+  - [x] Find the number
+    - [ ] Nested deeper
+- [x] Send invoice
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+  - Weekly
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+def fields(task):
+    return (task.line_number, task.text, task.completed, task.section, task.section_level,
+            task.indent_level, task.parent_line, task.has_children, list(task.notes))
+
+
+@pytest.mark.parametrize('filters', [
+    {}, {'completed': False}, {'priority': 'High'}, {'section': 'Someday'},
+    {'indent_level': 1}, {'has_notes': True}, {'text_contains': 'venue'},
+])
+def test_query_matches_mdql(todo, filters):
+    compact, mdql = CompactMDQL(todo), MDQL(todo)
+    assert [fields(t) for t in compact.query(**filters)] == [fields(t) for t in mdql.query(**filters)]
+
+
+def test_children_and_summary_match_mdql(todo):
+    compact, mdql = CompactMDQL(todo), MDQL(todo)
+    assert [[c.line_number for c in t.children] for t in compact.tasks] == \
+           [[c.line_number for c in t.children] for t in mdql.tasks]
+    assert compact.get_section_summary() == mdql.get_section_summary()
+
+
+def test_sql_runs_over_the_compact_store(todo):
+    compact, mdql = CompactMDQL(todo), MDQL(todo)
+    query = "SELECT text FROM todo.md WHERE priority = 'High' AND NOT completed ORDER BY line DESC"
+    assert [t.text for t in stream_query(query, compact)] == [t.text for t in execute_query(query, mdql)]
+    grouped = "SELECT section, COUNT(*) AS n, SUM(completed) AS done FROM todo.md GROUP BY section"
+    assert aggregate_query(grouped, compact) == aggregate_query(grouped, mdql) == [
+        {'section': 'Inbox', 'n': 4, 'done': 2}, {'section': 'Someday', 'n': 1, 'done': 0}]
+
+
+def test_checkbox_toggles_stay_in_memory(todo):
+    compact = CompactMDQL(todo)
+    line = compact.query(text_contains='piano')[0].line_number
+    compact.mark_complete(line)
+    assert compact.query(completed=True, section='Someday')[0].line_number == line
+    compact.mark_incomplete(line)
+    assert not compact.query(completed=True, section='Someday')
+    assert '- [ ] Learn piano' in open(todo).read()
+
+
+def test_deep_nesting_keeps_indents_and_parents(tmp_path):
+    path = tmp_path / 'deep.md'
+    depth = 100
+    lines = ["## Deep", ""] + [f"{'  ' * level}- [{'x' if level % 3 else ' '}] level {level}" for level in range(depth)]
+    path.write_text("\n".join(lines + ["- [ ] back to the top", ""]))
+    compact, mdql = CompactMDQL(str(path)), MDQL(str(path))
+    assert max(t.indent_level for t in mdql.tasks) == depth - 1
+    assert [fields(t) for t in compact.tasks] == [fields(t) for t in mdql.tasks]
+    assert [[c.line_number for c in t.children] for t in compact.tasks] == \
+           [[c.line_number for c in t.children] for t in mdql.tasks]
+    for level in (0, 63, 64, depth - 1):
+        assert [fields(t) for t in compact.query(indent_level=level)] == \
+               [fields(t) for t in mdql.query(indent_level=level)]
+    deepest = compact.query(indent_level=depth - 1)[0]
+    compact.mark_complete(deepest.line_number)
+    assert deepest.completed and deepest.indent_level == depth - 1
+
+
+def test_nesting_beyond_the_flags_field_is_refused():
+    store = TaskStore()
+    store.append(TaskItem('ok', False, 'Deep', 2, MAX_INDENT, 1))
+    assert store.indent_level(0) == MAX_INDENT
+    with pytest.raises(ValueError):
+        store.append(TaskItem('too deep', False, 'Deep', 2, MAX_INDENT + 1, 2))
+    assert len(store) == 1
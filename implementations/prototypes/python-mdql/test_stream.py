@@ -0,0 +1,96 @@
+"""Tests for streaming: MDQLStream and stream_query give what a full load does, lazily."""
+
+import pytest
+
+from mdql import MDQL, MDQLParser, MDQLStream, SectionMetadata, TaskItem
+from mdql_sql import execute_query, parse_mdql_query, stream_query
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+**Status:** Active
+
+- [ ] Call venue
+  - Ask about parking
+  - [x] Find the number
+    - [ ] Nested deeper
+- [x] Send invoice
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+  - [ ] Buy a keyboard
+
+## Errands
+
+- [ ] Buy stamps
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+def rows(tasks):
+    return [(t.line_number, t.text, t.completed, t.section, t.indent_level, t.parent_line, t.notes)
+            for t in tasks]
+
+
+def test_stream_yields_what_a_full_parse_does(todo):
+    stream = MDQLStream(todo)
+    assert rows(stream) == rows(MDQL(todo).tasks)
+    assert stream.sections == MDQL(todo).sections
+
+
+def test_items_are_complete_when_yielded(todo):
+    seen = []
+    for item in MDQLParser().iter_file(todo):
+        if isinstance(item, TaskItem):
+            # Notes and has_children are final; the section's metadata came first
+            seen.append((item.text, list(item.notes), item.has_children))
+        else:
+            assert isinstance(item, SectionMetadata)
+            seen.append(item.section_name)
+    assert seen[:3] == ['Todo', 'Inbox', ('Call venue', ['Ask about parking'], True)]
+    assert ('Find the number', [], True) in seen
+
+
+@pytest.mark.parametrize('where', [
+    "",
+    "WHERE completed = false",
+    "WHERE priority = 'High' AND indent_level > 0",
+    "WHERE status IS NULL",
+    "WHERE text LIKE '%buy%' OR has_notes",
+    "WHERE section IN ('Someday', 'Errands') ORDER BY text",
+    "WHERE completed = false ORDER BY indent_level DESC, line LIMIT 3",
+    "LIMIT 2",
+])
+def test_stream_query_matches_execute_query(todo, where):
+    query = parse_mdql_query(f"SELECT * FROM todo.md {where}")
+    assert rows(stream_query(query, todo)) == rows(execute_query(query, MDQL(todo)))
+
+
+def test_limit_stops_reading_the_file(todo):
+    read = []
+
+    class CountingStream(MDQLStream):
+        def __iter__(self):
+            for task in super().__iter__():
+                read.append(task.line_number)
+                yield task
+
+    result = list(stream_query("SELECT * FROM todo.md WHERE completed = false LIMIT 1", CountingStream(todo)))
+    assert [t.text for t in result] == ['Call venue']
+    # Nothing after the first match was handed on
+    assert read == [result[0].line_number]
+
+
+def test_parameters_in_streamed_queries(todo):
+    query = "SELECT * FROM todo.md WHERE section = ? LIMIT ?"
+    assert [t.text for t in stream_query(query, todo, params=('Someday', 1))] == ['Learn piano']
@@ -0,0 +1,155 @@
+"""Tests for mdql_text: index lookups return what a scan with the same matcher does."""
+
+import random
+
+import pytest
+
+from mdql import MDQL
+from mdql_cache import ParseCache
+from mdql_text import TextIndex, TrigramIndex, parse_match, regexp_literals, value_matcher
+
+
+WORDS = ['Call', 'venue', 'INVOICE', 'Invoices', 'piano', 'Stamps', 'café', 'CAFÉ', 'book', 'Room',
+         'e-mail', 'ORDER', 'cake', 'x', 'naïve', '42', 'under_score']
+
+
+@pytest.fixture
+def todo(tmp_path):
+    rng = random.Random(9)
+    lines = []
+    for section in ['Inbox', 'Someday', 'Errands']:
+        lines += [f"## {section}", ""]
+        for _ in range(80):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+            lines.append(f"- [{'x' if rng.random() < 0.3 else ' '}] {text}")
+            for _ in range(rng.choice([0, 0, 1, 2])):
+                lines.append(f"  - {rng.choice(WORDS)}, {rng.choice(WORDS)}!")
+        lines.append("")
+    path = tmp_path / 'todo.md'
+    path.write_text("\n".join(lines))
+    return str(path)
+
+
+def scan(mdql, field, kind, pattern):
+    matcher = value_matcher(kind, pattern)
+    return [t.line_number for t in mdql.tasks if matcher(getattr(t, field))]
+
+
+def indexed(mdql, field, kind, pattern):
+    return [t.line_number for t in mdql.query(**{f"{field}_{kind}": pattern})]
+
+
+CONTAINS = ['café', 'Café', 'CAFE', 'invoice', 'Invoices', 'ROOM', 'e-mail', 'mail', 'x', 'nue ca', 'er_sc', '!',
+            ', ', 'naï', 'nothing here']
+MATCH = ['invoice', 'INVOICE call', 'invoice*', 'café', '"call venue"', '"venue call" piano', 'e mail', 'ord*  x',
+         'under_score', '42', 'missing']
+
+
+@pytest.mark.parametrize('field', ['text', 'notes'])
+@pytest.mark.parametrize('needle', CONTAINS)
+def test_contains_matches_a_scan(todo, field, needle):
+    mdql = MDQL(todo)
+    assert indexed(mdql, field, 'contains', needle) == scan(mdql, field, 'contains', needle)
+
+
+@pytest.mark.parametrize('field', ['text', 'notes'])
+@pytest.mark.parametrize('query', MATCH)
+def test_match_matches_a_scan(todo, field, query):
+    mdql = MDQL(todo)
+    assert indexed(mdql, field, 'match', query) == scan(mdql, field, 'match', query)
+
+
+def test_word_index_answers_contains_and_match(todo):
+    index = TextIndex(MDQL(todo).tasks)
+    assert index.contains('text', '!!') is None
+    needles = {task.line_number for task in index.contains('text', 'voic')}
+    assert needles >= set(scan(MDQL(todo), 'text', 'contains', 'voic'))
+    assert [t.line_number for t in index.match('text', parse_match('"call venue"'))] == \
+        scan(MDQL(todo), 'text', 'match', '"call venue"')
+
+
+def test_index_follows_edits(todo):
+    rng = random.Random(4)
+    mdql = MDQL(todo)
+    mdql.query(text_match='café')    # build the indexes before editing
+    for step in range(120):
+        tasks = mdql.tasks
+        task = rng.choice(tasks)
+        op = rng.choice(['text', 'add', 'delete'])
+        if op == 'text':
+            mdql.update_text(task.line_number, ' '.join(rng.sample(WORDS, 2)))
+        elif op == 'add':
+            mdql.add_task(task.section, f"{rng.choice(WORDS)} {step}")
+        else:
+            mdql.delete(task.line_number)
+        if step % 20 == 0:
+            for query in MATCH:
+                assert indexed(mdql, 'text', 'match', query) == scan(mdql, 'text', 'match', query)
+            for needle in CONTAINS:
+                assert indexed(mdql, 'text', 'contains', needle) == scan(mdql, 'text', 'contains', needle)
+
+
+def test_cached_index_gives_the_same_results(todo, tmp_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    MDQL(todo, cache=cache).query(text_match='café', notes_match='room')
+    mdql = MDQL(todo, cache=cache)
+    assert cache.load(todo, kind='text') is not None
+    for query in MATCH:
+        assert indexed(mdql, 'notes', 'match', query) == scan(mdql, 'notes', 'match', query)
+
+
+LIKE = ['%café%', '%CAFÉ%', '%invoice', 'INVOICE%', '%voi_e%', 'c_ke%', '%', '_', '%_%', '%x%', '%e-m%il%',
+        '%er\\_sc%', 'piano', '%ORDER cake%', '%nai%']
+REGEXP = ['invoice', 'INVOICES?', 'caf[eé]', '^call', 'cake$', '.', '.*', '\\w+', '[a-z]{3}', '(venue|piano) call',
+          'venue|piano', 'ro+m', 'o+r', '\\d\\d', 'e\\-mail', 'CAFÉ|naïve', 'x.?x', '(?i)ORDER', 'under_sc']
+
+
+@pytest.mark.parametrize('field', ['text', 'notes'])
+@pytest.mark.parametrize('pattern', LIKE)
+def test_like_matches_a_scan(todo, field, pattern):
+    mdql = MDQL(todo)
+    assert indexed(mdql, field, 'like', pattern) == scan(mdql, field, 'like', pattern)
+
+
+@pytest.mark.parametrize('field', ['text', 'notes'])
+@pytest.mark.parametrize('pattern', REGEXP)
+def test_regexp_matches_a_scan(todo, field, pattern):
+    mdql = MDQL(todo)
+    assert indexed(mdql, field, 'regexp', pattern) == scan(mdql, field, 'regexp', pattern)
+
+
+@pytest.mark.parametrize('pattern, literals', [
+    ('invoice', ['invoice']), ('caf[eé]s', ['caf', 's']), ('ro+m', ['ro', 'm']), ('cakes?', ['cake']),
+    ('venue|piano', []), ('(venue|piano) call', [' call']), ('\\w+', []), ('a\\.b', ['a.b']), ('x{2,3}y', ['y']),
+])
+def test_regexp_literals_are_required_by_every_match(pattern, literals):
+    assert regexp_literals(pattern) == literals
+
+
+def test_trigram_candidates_are_a_superset(todo):
+    mdql = MDQL(todo)
+    index = TrigramIndex(mdql.tasks)
+    assert index.candidates('text', ['ca']) is None
+    for literal in ['café', 'CAFÉ', 'nvoi', 'venue ca']:
+        found = {t.line_number for t in index.candidates('text', [literal])}
+        assert found >= set(scan(mdql, 'text', 'contains', literal))
+
+
+def test_trigram_index_follows_edits(todo):
+    rng = random.Random(6)
+    mdql = MDQL(todo)
+    mdql.query(text_like='%café%')    # build the indexes before editing
+    for step in range(120):
+        task = rng.choice(mdql.tasks)
+        op = rng.choice(['text', 'add', 'delete'])
+        if op == 'text':
+            mdql.update_text(task.line_number, ' '.join(rng.sample(WORDS, 2)))
+        elif op == 'add':
+            mdql.add_task(task.section, f"{rng.choice(WORDS)} {step}")
+        else:
+            mdql.delete(task.line_number)
+        if step % 20 == 0:
+            for pattern in LIKE:
+                assert indexed(mdql, 'text', 'like', pattern) == scan(mdql, 'text', 'like', pattern)
+            for pattern in REGEXP:
+                assert indexed(mdql, 'text', 'regexp', pattern) == scan(mdql, 'text', 'regexp', pattern)
@@ -0,0 +1,108 @@
+"""Tests for write_atomic and MDQL.transaction()."""
+
+import os
+
+import pytest
+
+import mdql as mdql_module
+from mdql import MDQL, write_atomic
+
+
+TODO = """## Inbox
+
+- [ ] Call venue
+- [ ] Send invoice
+- [ ] Book room
+"""
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+def leftovers(path):
+    """Files write_atomic left next to path besides path itself."""
+    directory, name = os.path.split(path)
+    return [entry for entry in os.listdir(directory) if entry != name]
+
+
+def test_write_atomic_replaces_content_and_keeps_mode(todo):
+    os.chmod(todo, 0o640)
+    write_atomic(todo, "new\n")
+    assert open(todo).read() == "new\n"
+    assert os.stat(todo).st_mode & 0o777 == 0o640
+    assert leftovers(todo) == []
+
+
+def test_write_atomic_creates_a_missing_file(tmp_path):
+    path = str(tmp_path / 'fresh.md')
+    write_atomic(path, "hello\n")
+    assert open(path).read() == "hello\n"
+
+
+def test_failed_write_leaves_the_old_file(todo, monkeypatch):
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(mdql_module.os, 'replace', fail)
+    with pytest.raises(OSError, match='disk full'):
+        write_atomic(todo, "half written")
+    assert open(todo).read() == TODO
+    assert leftovers(todo) == []
+
+
+def test_transaction_writes_once_on_success(todo, monkeypatch):
+    writes = []
+    real = mdql_module.write_atomic
+    monkeypatch.setattr(mdql_module, 'write_atomic', lambda path, content: writes.append(path) or real(path, content))
+    mdql = MDQL(todo)
+    with mdql.transaction():
+        for task in mdql.query(completed=False):
+            mdql.mark_complete(task.line_number)
+        mdql.save()                       # deferred to the commit
+        assert writes == []
+        assert open(todo).read() == TODO
+    assert writes == [todo]
+    assert open(todo).read().count('- [x]') == 3
+
+
+def test_transaction_rolls_back_on_error(todo):
+    mdql = MDQL(todo)
+    with pytest.raises(RuntimeError):
+        with mdql.transaction():
+            mdql.mark_complete(mdql.query(text_contains='Call')[0].line_number)
+            mdql.add_task('Inbox', 'Never saved')
+            raise RuntimeError("abort")
+    assert open(todo).read() == TODO
+    assert [t.text for t in mdql.query(completed=False)] == ['Call venue', 'Send invoice', 'Book room']
+
+
+def test_failed_commit_rolls_back_memory(todo, monkeypatch):
+    mdql = MDQL(todo)
+
+    def fail(path, content):
+        raise OSError("read-only")
+
+    monkeypatch.setattr(mdql_module, 'write_atomic', fail)
+    with pytest.raises(OSError):
+        with mdql.transaction():
+            mdql.delete(mdql.query(text_contains='Book')[0].line_number)
+    assert len(mdql.tasks) == 3
+    assert open(todo).read() == TODO
+
+
+def test_rollback_and_nested_transactions(todo):
+    mdql = MDQL(todo)
+    with mdql.transaction():
+        mdql.mark_complete(mdql.query(text_contains='Call')[0].line_number)
+        with mdql.transaction():          # joins the outer one
+            mdql.mark_complete(mdql.query(text_contains='Send')[0].line_number)
+        assert open(todo).read() == TODO
+        mdql.rollback()
+        mdql.mark_complete(mdql.query(text_contains='Book')[0].line_number)
+    assert [t.text for t in MDQL(todo).query(completed=True)] == ['Book room']
+    with pytest.raises(ValueError):
+        mdql.rollback()
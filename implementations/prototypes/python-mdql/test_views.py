@@ -0,0 +1,183 @@
+"""Tests for mdql_views: span-delta refresh, updates from MDQL writes, reading views."""
+
+import os
+import pickle
+
+import pytest
+
+from mdql import MDQL
+from mdql_cache import CACHE_VERSION
+from mdql_sql import MDQLSyntaxError
+from mdql_views import SectionSummaryView, SelectView, ViewStore
+
+
+TODO = """# Todo
+
+## Inbox
+**Priority:** High
+
+- [ ] Call venue
+  - [ ] Find the number
+- [x] Send invoice
+
+## Someday
+**Priority:** Low
+
+- [ ] Learn piano
+- [ ] Paint fence
+
+## Errands
+**Priority:** High
+
+- [ ] Buy stamps
+"""
+
+OPEN_HIGH = "SELECT text, line FROM todo.md WHERE priority = 'High' AND completed = false"
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path, todo):
+    store = ViewStore(str(tmp_path / 'cache'))
+    store.create('open_high', OPEN_HIGH, todo)
+    store.create_summary('summary', todo)
+    return store
+
+
+def rebuilt(view):
+    """The rows of the same view built from scratch."""
+    if isinstance(view, SelectView):
+        fresh = SelectView('fresh', view.query_text, view.filepath)
+    else:
+        fresh = SectionSummaryView('fresh', view.filepath)
+    fresh.refresh()
+    return fresh.rows()
+
+
+def record_applies(store):
+    applied = []
+    apply = store.apply
+
+    def recording(saved):
+        updated = apply(saved)
+        applied.append((saved, [stats for _, stats in updated]))
+        return updated
+
+    store.apply = recording
+    return applied
+
+
+def test_refresh_parses_only_changed_sections(store, todo):
+    text = open(todo).read().replace('- [ ] Learn piano', '- [x] Learn piano')
+    with open(todo, 'w') as f:
+        f.write(text)
+    view, stats = store.refresh('summary')
+    assert (stats.parsed, stats.removed) == (1, 1)
+    assert view.rows() == rebuilt(view)
+
+
+def test_save_hands_edited_spans_to_views(store, todo):
+    applied = record_applies(store)
+    mdql = MDQL(todo, views=store)
+    mdql.mark_complete(mdql.query(text_contains='Call venue')[0].line_number)
+    mdql.add_task('Errands', 'Post letter')
+    mdql.save()
+
+    saved, stats = applied[0]
+    assert sorted(saved.changed) == [1, 3]
+    assert all(s.parsed == 2 and s.reused == 2 for s in stats)
+    for name in ('open_high', 'summary'):
+        view = store.load(name)
+        assert view.rows() == rebuilt(view)
+    assert [row['text'] for row in store.load('open_high').rows()] == [
+        'Find the number', 'Buy stamps', 'Post letter']
+
+
+def test_deleted_lines_shift_later_sections(store, todo):
+    mdql = MDQL(todo, views=store)
+    mdql.delete(mdql.query(text_contains='Learn piano')[0].line_number)
+    mdql.save()
+    mdql.update_text(mdql.query(text_contains='Buy stamps')[0].line_number, 'Buy more stamps')
+    mdql.save()
+    view = store.load('open_high')
+    assert view.rows() == rebuilt(view)
+    assert view.rows()[-1] == {'text': 'Buy more stamps', 'line': 18}
+
+
+def test_out_of_date_view_is_refreshed_from_the_file(store, todo):
+    with open(todo, 'a') as f:
+        f.write("- [ ] Appended elsewhere\n")
+    mdql = MDQL(todo, views=store)
+    mdql.mark_complete(mdql.query(text_contains='Buy stamps')[0].line_number)
+    mdql.save()
+    view = store.load('open_high')
+    assert view.rows() == rebuilt(view)
+    assert 'Appended elsewhere' in [row['text'] for row in view.rows()]
+
+
+def test_metadata_change_reaches_untouched_sections(store, todo, tmp_path):
+    # Two sections with the same name share metadata: the later one wins
+    path = tmp_path / 'dup.md'
+    path.write_text("## A\n**Priority:** High\n\n- [ ] one\n\n## B\n\n- [ ] two\n")
+    store.create('dup', "SELECT text FROM dup.md WHERE priority = 'High'", str(path))
+    mdql = MDQL(str(path), views=store)
+    mdql.add_task('A', 'three')
+    mdql.save()
+    view = store.load('dup')
+    assert view.rows() == rebuilt(view) == [{'text': 'one'}, {'text': 'three'}]
+
+
+def test_wal_checkpoint_updates_views(store, todo):
+    applied = record_applies(store)
+    with MDQL(todo, views=store, wal=True) as mdql:
+        mdql.add_task('Someday', 'Write novel')
+    assert applied and sorted(applied[-1][0].changed) == [2]
+    view = store.load('open_high')
+    assert view.rows() == rebuilt(view)
+    assert store.load('summary').totals['Someday'] == [3, 0]
+
+
+def test_select_reads_stored_rows(store):
+    view = store.load('open_high')
+    columns, rows = view.select("SELECT text AS task FROM open_high LIMIT 1")
+    assert columns == ['task']
+    assert rows == [{'task': 'Call venue'}]
+    assert view.select("SELECT * FROM open_high")[1] == view.rows()
+
+
+def test_select_rejects_filters_and_unknown_columns(store):
+    view = store.load('open_high')
+    with pytest.raises(MDQLSyntaxError):
+        view.select("SELECT text FROM open_high WHERE line > 3")
+    with pytest.raises(MDQLSyntaxError):
+        view.select("SELECT section FROM open_high")
+
+
+def test_store_knows_its_view_names(store):
+    assert 'open_high' in store
+    assert 'todo.md' not in store
+    assert store.names() == ['open_high', 'summary']
+
+
+@pytest.mark.parametrize('name', ['open_high', 'summary'])
+def test_view_in_an_older_format_is_rebuilt_and_refreshed(store, todo, name):
+    path = store._path(name)
+    with open(path, 'rb') as f:
+        entry = pickle.load(f)
+    entry['version'] = 'old'
+    with open(path, 'wb') as f:
+        pickle.dump(entry, f)
+    with open(todo, 'a') as f:
+        f.write("- [ ] Post a letter\n")
+
+    view = ViewStore(os.path.dirname(store.view_dir)).load(name)
+    assert view.rows() == rebuilt(view)
+    assert view.rows()
+    with open(path, 'rb') as f:
+        assert pickle.load(f)['version'] == CACHE_VERSION
@@ -0,0 +1,142 @@
+"""Tests for mdql_wal: replaying the log after crashes, torn writes and checkpoints."""
+
+import json
+import os
+
+import pytest
+
+from mdql import MDQL
+from mdql_cache import file_digest
+from mdql_wal import content_digest, wal_path
+
+
+TODO = """## Inbox
+
+- [ ] Call venue
+- [ ] Send invoice
+- [ ] Book room
+"""
+
+RECORDS = [
+    ['x', 3],
+    ['t', 4, 'Send the invoice'],
+    ['a', 'Inbox', 'Order cake', 0, False],
+    ['d', 5],
+]
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+def write_log(todo, records, base=None, holes=(), tail=b''):
+    """Write a log as a crashed writer would have left it."""
+    with open(wal_path(todo), 'wb') as f:
+        f.write(json.dumps({'base': base or file_digest(todo), 'holes': list(holes)}).encode() + b'\n')
+        for record in records:
+            f.write(json.dumps(record).encode() + b'\n')
+        f.write(tail)
+
+
+def visible(mdql):
+    return [(t.text, t.completed) for t in mdql.tasks]
+
+
+EXPECTED = [('Call venue', True), ('Send the invoice', False), ('Order cake', False)]
+
+
+def test_log_is_replayed_on_load(todo):
+    write_log(todo, RECORDS)
+    assert visible(MDQL(todo)) == EXPECTED
+    # A reader leaves the log for its owner
+    assert os.path.exists(wal_path(todo))
+
+
+def test_torn_last_record_is_dropped(todo):
+    write_log(todo, RECORDS[:2], tail=b'["a","Inbox","Order ca')
+    assert visible(MDQL(todo)) == [('Call venue', True), ('Send the invoice', False), ('Book room', False)]
+
+    with MDQL(todo, wal=True) as mdql:
+        assert len(mdql.tasks) == 3
+        # Repaired to its clean form before new records are appended
+        with open(wal_path(todo), 'rb') as f:
+            assert f.read().endswith(b'["t",4,"Send the invoice"]\n')
+    assert '- [x] Call venue\n- [ ] Send the invoice\n' in open(todo).read()
+
+
+OPERATIONS = {'x': 'mark_complete', 't': 'update_text', 'a': 'add_task', 'd': 'delete'}
+
+
+@pytest.mark.parametrize('cut', range(0, 200, 7))
+def test_log_truncated_anywhere_replays_a_prefix(todo, cut):
+    write_log(todo, RECORDS)
+    with open(wal_path(todo), 'rb') as f:
+        data = f.read()[:cut]
+    os.remove(wal_path(todo))
+    # The same edits made directly, up to the last whole record
+    expected = MDQL(todo)
+    for op, *args in RECORDS[:max(data.count(b'\n') - 1, 0)]:
+        getattr(expected, OPERATIONS[op])(*args)
+
+    with open(wal_path(todo), 'wb') as f:
+        f.write(data)
+    assert visible(MDQL(todo)) == visible(expected)
+
+
+def test_crash_mid_checkpoint_resumes_from_the_marker(todo):
+    # The checkpoint wrote the first two records into the file, then crashed
+    # before rewriting the log
+    original = file_digest(todo)
+    checkpointed = TODO.replace('- [ ] Call venue', '- [x] Call venue').replace('Send invoice', 'Send the invoice')
+    marker = ['ckpt', content_digest(checkpointed), 2, []]
+    with open(todo, 'w') as f:
+        f.write(checkpointed)
+    write_log(todo, RECORDS[:2] + [marker] + RECORDS[2:], base=original)
+    assert visible(MDQL(todo)) == EXPECTED
+
+
+def test_crash_before_checkpoint_write_ignores_the_marker(todo):
+    # The marker is logged, but the file was never replaced
+    marker = ['ckpt', content_digest('something else\n'), 2, []]
+    write_log(todo, RECORDS[:2] + [marker] + RECORDS[2:])
+    assert visible(MDQL(todo)) == EXPECTED
+
+
+def test_log_for_another_version_is_set_aside(todo):
+    write_log(todo, RECORDS, base='0' * 64)
+    assert visible(MDQL(todo)) == [('Call venue', False), ('Send invoice', False), ('Book room', False)]
+    with MDQL(todo, wal=True):
+        pass
+    assert os.path.exists(wal_path(todo) + '.stale')
+
+
+def test_holes_keep_logged_line_numbers_valid(todo):
+    # Line 3 was deleted and checkpointed; later records still count it
+    checkpointed = TODO.replace('- [ ] Call venue\n', '')
+    with open(todo, 'w') as f:
+        f.write(checkpointed)
+    write_log(todo, [['x', 4]], holes=[3])
+    assert visible(MDQL(todo)) == [('Send invoice', True), ('Book room', False)]
+
+
+def test_edits_survive_a_crash_without_close(todo):
+    mdql = MDQL(todo, wal=True)
+    mdql.mark_complete(3)
+    mdql.add_task('Inbox', 'Order cake')
+    mdql.save()                       # forces the log to disk
+    # Crash: stop the checkpointer without the final checkpoint close() does
+    mdql.wal.closed = True
+    mdql.wal.wakeup.set()
+    mdql._checkpointer.join()
+    mdql.wal.close_file()
+    mdql._owner.release()
+    assert open(todo).read() == TODO
+
+    with MDQL(todo, wal=True) as recovered:
+        assert visible(recovered) == [('Call venue', True), ('Send invoice', False),
+                                      ('Book room', False), ('Order cake', False)]
+    assert not os.path.exists(wal_path(todo))
+    assert '- [x] Call venue' in open(todo).read()
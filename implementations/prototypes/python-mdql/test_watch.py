@@ -0,0 +1,131 @@
+"""Tests for mdql_watch: watched sources end up equal to a fresh load after files change."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from mdql import MDQL
+from mdql_catalog import MDQLCatalog
+from mdql_server import QueryService
+from mdql_wal import WAL_SUFFIX
+from mdql_watch import FileWatcher, _libc, watch
+
+
+BACKENDS = ['poll', pytest.param('inotify', marks=pytest.mark.skipif(_libc is None, reason='no inotify'))]
+
+TODO = "## Inbox\n**Priority:** High\n\n- [ ] Call venue\n- [x] Send invoice\n"
+
+
+def rows(tasks):
+    return [(getattr(t, 'source_file', None), t.line_number, t.text, t.completed, t.section) for t in tasks]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def todo(tmp_path):
+    path = tmp_path / 'todo.md'
+    path.write_text(TODO)
+    return str(path)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_watched_file_matches_a_fresh_load(todo, backend):
+    mdql = MDQL(todo)
+    lock = threading.Lock()
+    watcher = watch(mdql, lock, backend=backend, poll_interval=0.02)
+    try:
+        for step in range(3):
+            with open(todo, 'a') as f:
+                f.write(f"- [ ] added {step}\n")
+
+            def current():
+                with lock:
+                    return rows(mdql.tasks) == rows(MDQL(todo).tasks)
+            assert wait_for(current)
+        # A save that replaces the file by rename is seen too
+        replacement = todo + '.tmp'
+        with open(replacement, 'w') as f:
+            f.write("## Later\n\n- [ ] Only task\n")
+        os.replace(replacement, todo)
+        assert wait_for(lambda: [t.text for t in mdql.tasks] == ['Only task'])
+    finally:
+        watcher.stop()
+    assert watcher.error is None
+    assert watcher.metrics.summary()['batches'] >= 1
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_watched_folder_matches_a_fresh_catalog(tmp_path, backend):
+    root = tmp_path / 'vault'
+    (root / 'sub').mkdir(parents=True)
+    for i in range(3):
+        (root / f"note-{i}.md").write_text(TODO)
+    catalog = MDQLCatalog(str(root), workers=1)
+    lock = threading.Lock()
+    watcher = watch(catalog, lock, backend=backend, poll_interval=0.02)
+    try:
+        with open(root / 'note-1.md', 'a') as f:
+            f.write("- [ ] appended\n")
+        (root / 'note-2.md').unlink()
+        (root / 'sub' / 'new.md').write_text(TODO.replace('Call venue', 'New task'))
+
+        def current():
+            with lock:
+                return rows(catalog.tasks) == rows(MDQLCatalog(str(root), workers=1).tasks)
+        assert wait_for(current)
+    finally:
+        watcher.stop()
+    assert watcher.error is None
+
+
+def test_targets(tmp_path, todo):
+    folder = tmp_path / 'notes'
+    (folder / '.hidden').mkdir(parents=True)
+    watcher = FileWatcher([todo, str(folder)], lambda paths: None, backend='poll')
+    assert watcher.target(todo) == todo
+    assert watcher.target(todo + WAL_SUFFIX) == todo
+    assert watcher.target(str(folder / 'a.md')) == str(folder / 'a.md')
+    assert watcher.target(str(folder / 'a.txt')) is None
+    assert watcher.target(str(folder / '.hidden' / 'a.md')) is None
+    assert watcher.target(str(tmp_path / 'other.md')) is None
+    watcher.stop()
+
+
+def test_callback_errors_are_kept(todo):
+    def fail(paths):
+        raise RuntimeError(sorted(paths))
+
+    watcher = FileWatcher([todo], fail, backend='poll', poll_interval=0.02).start()
+    try:
+        with open(todo, 'a') as f:
+            f.write("- [ ] more\n")
+        assert wait_for(lambda: watcher.metrics.summary()['errors'] == 1)
+    finally:
+        watcher.stop()
+    assert isinstance(watcher.error, RuntimeError)
+    assert watcher.error.args == ([todo],)
+
+
+def test_server_refreshes_before_the_next_query(tmp_path, todo):
+    service = QueryService(cache_dir=str(tmp_path / 'cache'), watch=True)
+    try:
+        query = {'file': todo, 'query': "SELECT text FROM todo.md WHERE completed = false"}
+        assert service.handle(query)['count'] == 1
+        with open(todo, 'a') as f:
+            f.write("- [ ] Book room\n")
+        assert wait_for(lambda: service.reloads == 1)
+        assert [row['text'] for row in service.handle(query)['rows']] == ['Call venue', 'Book room']
+        # The query found the source current, so it did not reload again
+        assert service.reloads == 1
+    finally:
+        service.close()